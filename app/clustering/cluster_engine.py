@@ -1,15 +1,38 @@
+import os
+import json
+import hashlib
 import logging
 import time
 import numpy as np
 from collections import Counter
+from contextlib import ExitStack
+
+from app.clustering.embedding_matrix import EmbeddingMatrix, MemmapEmbeddingStore
 
 logger = logging.getLogger(__name__)
 
 
+class ClusteringCancelled(Exception):
+    """Raised by ClusterEngine.run when its cancel_check reports a cancellation."""
+
+
 class ClusterEngine:
     """DBSCAN clustering engine for test steps."""
 
-    def run(self, step_ids, step_texts, similarity_threshold=0.80, model=None, progress_callback=None):
+    # Rows per block when building the thresholded graph from sparse (TF-IDF) embeddings
+    SPARSE_BLOCK_ROWS = 256
+
+    # Rows per tile when computing similarities from a compact EmbeddingMatrix
+    DENSE_TILE_ROWS = 2048
+
+    # Rows used to fit the dimension reduction projection
+    REDUCTION_FIT_SAMPLE = 10000
+    # Rows used to compare clusters against full dimension / float32 precision
+    AGREEMENT_SAMPLE = 2000
+
+    def run(self, step_ids, step_texts, similarity_threshold=0.80, model=None, progress_callback=None,
+            reduce_method=None, reduce_dim=256, precision="float32", out_of_core_dir=None,
+            checkpoint_dir=None, cancel_check=None, resource_governor=None):
         """Execute the full clustering pipeline.
 
         Args:
@@ -18,10 +41,35 @@ class ClusterEngine:
             similarity_threshold: cosine similarity threshold (0.5 - 0.95)
             model: BaseEmbeddingModel instance
             progress_callback: optional callback(phase, phase_name, phase_index, phase_progress, overall_progress, detail)
+            reduce_method: None, "pca" or "truncate" (Matryoshka-style prefix truncation)
+            reduce_dim: target dimension when reduce_method is set
+            precision: "float32", "float16" or "int8" storage for dense embeddings;
+                       compact forms are upcast tile by tile during similarity search
+            out_of_core_dir: if set, dense embeddings are appended to a memory-mapped
+                             store in this directory as they are encoded and read back
+                             tile by tile; an interrupted run resumes from its last checkpoint
+            checkpoint_dir: per-run directory for checkpoints. Embedding batches (when no
+                            out_of_core_dir is given) and DBSCAN labels are saved there, and a
+                            rerun with the same directory continues from them
+            cancel_check: optional callable returning True when the run should stop; checked
+                          between batches and phases, raises ClusteringCancelled
+            resource_governor: optional ResourceGovernor; model loading, embedding and
+                               clustering each run under its torch/BLAS thread limits
 
         Returns:
             dict with clustering results
         """
+        self._governor = resource_governor
+        self._phase_limits = ExitStack()
+        try:
+            return self._run_pipeline(step_ids, step_texts, similarity_threshold, model, progress_callback,
+                                      reduce_method, reduce_dim, precision, out_of_core_dir, checkpoint_dir,
+                                      cancel_check)
+        finally:
+            self._phase_limits.close()
+
+    def _run_pipeline(self, step_ids, step_texts, similarity_threshold, model, progress_callback,
+                      reduce_method, reduce_dim, precision, out_of_core_dir, checkpoint_dir, cancel_check):
         from app.clustering.preprocessor import preprocess
 
         if not step_texts:
@@ -30,9 +78,12 @@ class ClusterEngine:
                 "cluster_labels": {},
                 "total_clusters": 0,
                 "noise_count": 0,
+                "reduction": None,
+                "quantization": None,
             }
 
         total = len(step_texts)
+        self._cancel_check = cancel_check
 
         # Phase 1: Preprocess (0-10%)
         if progress_callback:
@@ -45,35 +96,62 @@ class ClusterEngine:
 
         if progress_callback:
             progress_callback("preprocessing", "文本预处理", 1, 100, 10, f"预处理完成 ({total} 条)")
+        self._check_cancelled()
 
         # Phase 2: Model loading (10-20%)
         if progress_callback:
             progress_callback("model_loading", "模型加载", 2, 0, 12, "加载嵌入模型...")
 
+        self._govern("model_loading")
         t0 = time.time()
-        # Trigger model loading (lazy load)
-        _ = model.model_name
+        # Blocks until weights are in memory; waits on an in-flight preload if there is one
+        model.load()
+        model.prepare(cleaned)
         load_time = time.time() - t0
         logger.info("Embedding model ready: %s (%.2fs)", model.model_name, load_time)
 
         if progress_callback:
             progress_callback("model_loading", "模型加载", 2, 100, 20, f"模型已就绪: {model.model_name}")
+        self._check_cancelled()
 
         # Phase 3: Embedding (20-70%)
         if progress_callback:
             progress_callback("embedding", "向量计算", 3, 0, 20, f"向量计算: 0/{total}")
 
+        self._govern("embedding")
         batch_size = 64
         all_embeddings = []
         t0 = time.time()
 
-        for i in range(0, total, batch_size):
+        fingerprint = self._corpus_fingerprint(model, step_ids, cleaned, precision)
+        store = None
+        if out_of_core_dir:
+            store = MemmapEmbeddingStore.open(out_of_core_dir, fingerprint, total, precision)
+        elif checkpoint_dir:
+            # Checkpoint store only: keep full precision and read it back into memory afterwards
+            store = MemmapEmbeddingStore.open(os.path.join(checkpoint_dir, "embeddings"), fingerprint, total,
+                                              "float32")
+        start = store.rows_done if store is not None else 0
+        if start and progress_callback:
+            progress_callback("embedding", "向量计算", 3, int(start / total * 100), 20 + int(start / total * 50),
+                              f"从检查点恢复: {start}/{total}")
+
+        for i in range(start, total, batch_size):
+            if store is not None and self._cancel_check is not None and self._cancel_check():
+                store.flush()  # keep what was encoded for the next run over this corpus
+            self._check_cancelled()
             batch = cleaned[i:i + batch_size]
             batch_t = time.time()
             batch_emb = model.encode(batch, batch_size=batch_size)
             batch_time = time.time() - batch_t
 
-            all_embeddings.append(batch_emb)
+            if store is not None and _is_sparse(batch_emb):
+                logger.info("Sparse embeddings are small enough to keep in memory, not using the on-disk store")
+                store = None
+            if store is not None:
+                store.append(batch_emb)
+            else:
+                all_embeddings.append(batch_emb)
             done = min(i + batch_size, total)
             phase_pct = int(done / total * 100)
             overall_pct = 20 + int(done / total * 50)
@@ -87,35 +165,96 @@ class ClusterEngine:
                 progress_callback("embedding", "向量计算", 3, phase_pct, overall_pct,
                                   f"向量计算: {done}/{total} ({phase_pct}%)")
 
-        embeddings = np.vstack(all_embeddings)
+        if store is not None and not out_of_core_dir:
+            store.flush()
+            embeddings = np.array(store.matrix().data, dtype=np.float32)
+            store = None
+            is_sparse = False
+        elif store is not None:
+            store.flush()
+            embeddings = store.matrix()
+            is_sparse = False
+        else:
+            is_sparse = _is_sparse(all_embeddings[0])
+            if is_sparse:
+                from scipy import sparse
+                embeddings = sparse.vstack(all_embeddings, format='csr')
+            else:
+                embeddings = np.vstack(all_embeddings)
+        del all_embeddings
         embed_time = time.time() - t0
-        logger.info("Embedding completed: %d texts in %.2fs (%.1f texts/sec)",
-                     total, embed_time, total / embed_time if embed_time > 0 else 0)
+        encoded = total - start
+        logger.info("Embedding completed: %d texts in %.2fs (%.1f texts/sec)%s",
+                     encoded, embed_time, encoded / embed_time if embed_time > 0 else 0,
+                     f", {start} reused from on-disk store" if start else "")
 
-        # Phase 4: Clustering (70-90%)
-        if progress_callback:
-            progress_callback("clustering", "聚类计算", 4, 0, 70, "计算余弦距离矩阵...")
-
-        t0 = time.time()
-        logger.info("Computing cosine distance matrix (%dx%d)...", total, total)
-        similarity_matrix = np.dot(embeddings, embeddings.T)
-        distance_matrix = 1 - similarity_matrix
-        distance_matrix = np.clip(distance_matrix, 0, 2)
-        dist_time = time.time() - t0
-        logger.info("Distance matrix computed in %.2fs", dist_time)
+        self._check_cancelled()
 
-        if progress_callback:
-            progress_callback("clustering", "聚类计算", 4, 50, 80, "运行 DBSCAN...")
-
-        eps = 1 - similarity_threshold
-        logger.info("Running DBSCAN: eps=%.4f, min_samples=2", eps)
+        # Phase 4: Clustering (70-90%)
+        self._govern("clustering")
+        reduction = None
+        if reduce_method and store is not None:
+            logger.info("Skipping dimension reduction for the on-disk embedding store")
+        elif reduce_method and not is_sparse:
+            if progress_callback:
+                progress_callback("clustering", "聚类计算", 4, 0, 70, f"向量降维 ({reduce_method})...")
+            embeddings, reduction = self._reduce_dimensions(embeddings, reduce_method, reduce_dim,
+                                                            similarity_threshold)
+        elif reduce_method:
+            logger.info("Skipping dimension reduction for sparse embeddings")
+
+        quantization = None
+        if precision != "float32" and not is_sparse and store is None:
+            matrix = EmbeddingMatrix.from_float32(embeddings, precision)
+            quantization = self._quantization_report(embeddings, matrix, similarity_threshold)
+            embeddings = matrix
+
+        labels = self._load_labels_checkpoint(checkpoint_dir, fingerprint, similarity_threshold, reduce_method,
+                                              reduce_dim)
+        if labels is None:
+            if progress_callback:
+                progress_callback("clustering", "聚类计算", 4, 0, 70, "计算余弦距离矩阵...")
+
+            t0 = time.time()
+            if is_sparse:
+                logger.info("Computing thresholded sparse similarity graph (%dx%d, nnz=%d)...",
+                            total, total, embeddings.nnz)
+                distance_matrix = self._sparse_distance_graph(embeddings, similarity_threshold, progress_callback)
+                logger.info("Sparse distance graph: %d edges (%.4f%% dense)",
+                            distance_matrix.nnz, 100.0 * distance_matrix.nnz / (total * total))
+            elif isinstance(embeddings, EmbeddingMatrix):
+                logger.info("Computing tiled %s similarity graph (%dx%d, %.1f MB stored)...",
+                            embeddings.precision, total, total, embeddings.nbytes / 1024 / 1024)
+                distance_matrix = self._tiled_distance_graph(embeddings, similarity_threshold, progress_callback)
+                logger.info("Tiled distance graph: %d edges", distance_matrix.nnz)
+            else:
+                logger.info("Computing cosine distance matrix (%dx%d)...", total, total)
+                similarity_matrix = np.dot(embeddings, embeddings.T)
+                distance_matrix = 1 - similarity_matrix
+                distance_matrix = np.clip(distance_matrix, 0, 2)
+            dist_time = time.time() - t0
+            logger.info("Distance matrix computed in %.2fs", dist_time)
 
-        t0 = time.time()
-        from sklearn.cluster import DBSCAN
-        clustering = DBSCAN(eps=eps, min_samples=2, metric='precomputed')
-        labels = clustering.fit_predict(distance_matrix)
-        dbscan_time = time.time() - t0
-        logger.info("DBSCAN completed in %.2fs", dbscan_time)
+            if progress_callback:
+                progress_callback("clustering", "聚类计算", 4, 50, 80, "运行 DBSCAN...")
+
+            eps = 1 - similarity_threshold
+            logger.info("Running DBSCAN: eps=%.4f, min_samples=2", eps)
+
+            t0 = time.time()
+            from sklearn.cluster import DBSCAN
+            if _is_sparse(distance_matrix):
+                from sklearn.neighbors import sort_graph_by_row_values
+                distance_matrix = sort_graph_by_row_values(distance_matrix, warn_when_not_sorted=False)
+            clustering = DBSCAN(eps=eps, min_samples=2, metric='precomputed')
+            labels = clustering.fit_predict(distance_matrix)
+            dbscan_time = time.time() - t0
+            logger.info("DBSCAN completed in %.2fs", dbscan_time)
+
+            self._save_labels_checkpoint(checkpoint_dir, fingerprint, similarity_threshold, reduce_method,
+                                         reduce_dim, labels)
+        elif progress_callback:
+            progress_callback("clustering", "聚类计算", 4, 50, 80, "从检查点恢复聚类结果")
 
         unique_labels = set(labels)
         unique_labels.discard(-1)
@@ -136,6 +275,8 @@ class ClusterEngine:
             progress_callback("clustering", "聚类计算", 4, 100, 90,
                               f"聚类完成: {total_clusters} 个簇, {noise_count} 个噪声步骤")
 
+        self._check_cancelled()
+
         # Phase 5: Extract labels and save (90-100%)
         if progress_callback:
             progress_callback("saving", "结果保存", 5, 0, 90, "提取簇标签...")
@@ -155,27 +296,258 @@ class ClusterEngine:
             "cluster_labels": cluster_labels,
             "total_clusters": total_clusters,
             "noise_count": noise_count,
+            "reduction": reduction,
+            "quantization": quantization,
+        }
+
+    def _govern(self, phase):
+        """Switch to the resource governor's thread limits for the given phase."""
+        self._phase_limits.close()
+        if self._governor is not None:
+            self._phase_limits.enter_context(self._governor.phase(phase))
+
+    def _check_cancelled(self):
+        if self._cancel_check is not None and self._cancel_check():
+            logger.info("Clustering cancelled")
+            raise ClusteringCancelled("聚类已取消")
+
+    @staticmethod
+    def _labels_checkpoint_key(fingerprint, similarity_threshold, reduce_method, reduce_dim):
+        return f"{fingerprint}|{similarity_threshold}|{reduce_method}|{reduce_dim if reduce_method else ''}"
+
+    def _load_labels_checkpoint(self, checkpoint_dir, fingerprint, similarity_threshold, reduce_method, reduce_dim):
+        """Return DBSCAN labels saved by an earlier attempt of this run, if they still apply."""
+        if not checkpoint_dir:
+            return None
+        meta_path = os.path.join(checkpoint_dir, "labels.json")
+        labels_path = os.path.join(checkpoint_dir, "labels.npy")
+        if not os.path.exists(meta_path) or not os.path.exists(labels_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("key") != self._labels_checkpoint_key(fingerprint, similarity_threshold, reduce_method,
+                                                            reduce_dim):
+            return None
+        logger.info("Resuming from DBSCAN labels checkpoint in %s", checkpoint_dir)
+        return np.load(labels_path)
+
+    def _save_labels_checkpoint(self, checkpoint_dir, fingerprint, similarity_threshold, reduce_method, reduce_dim,
+                                labels):
+        if not checkpoint_dir:
+            return
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        np.save(os.path.join(checkpoint_dir, "labels.npy"), labels)
+        with open(os.path.join(checkpoint_dir, "labels.json"), "w", encoding="utf-8") as f:
+            json.dump({"key": self._labels_checkpoint_key(fingerprint, similarity_threshold, reduce_method,
+                                                          reduce_dim)}, f)
+
+    @staticmethod
+    def _corpus_fingerprint(model, step_ids, texts, precision):
+        """Identify a model + corpus combination for the on-disk embedding store."""
+        digest = hashlib.sha1()
+        digest.update(f"{model.model_name}|{precision}|{len(texts)}".encode("utf-8"))
+        for step_id, text in zip(step_ids, texts):
+            digest.update(f"\x1e{step_id}\x1f{text}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _reduce_dimensions(self, embeddings, method, target_dim, similarity_threshold):
+        """Project dense embeddings to target_dim and re-normalize.
+
+        "pca" fits an uncentered PCA (truncated SVD) on a sample, which keeps dot
+        products, and therefore the cosine threshold, as close as possible to the
+        full-dimension ones. "truncate" keeps the leading dimensions, which is only
+        meaningful for Matryoshka-trained models.
+
+        Returns:
+            (reduced_embeddings, report dict) or (embeddings, None) if nothing to do
+        """
+        total, dim = embeddings.shape
+        if target_dim <= 0 or target_dim >= dim:
+            logger.info("Dimension reduction skipped: target %d >= embedding dim %d", target_dim, dim)
+            return embeddings, None
+
+        t0 = time.time()
+        rng = np.random.default_rng(0)
+
+        if method == "pca":
+            from sklearn.decomposition import TruncatedSVD
+            fit_idx = rng.choice(total, min(total, self.REDUCTION_FIT_SAMPLE), replace=False)
+            n_components = min(target_dim, len(fit_idx) - 1)
+            if n_components < 1:
+                return embeddings, None
+            svd = TruncatedSVD(n_components=n_components, algorithm='randomized', random_state=0)
+            svd.fit(embeddings[fit_idx])
+            projected = (embeddings @ svd.components_.T).astype(np.float32)
+        elif method == "truncate":
+            projected = np.ascontiguousarray(embeddings[:, :target_dim], dtype=np.float32)
+        else:
+            raise ValueError(f"Unknown dimension reduction method: {method}")
+
+        # Share of squared norm kept; rows are unit vectors so this is the variance retained
+        variance_retained = float(np.mean(np.sum(projected ** 2, axis=1)))
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        reduced = projected / np.maximum(norms, 1e-10)
+
+        sample_idx = np.sort(rng.choice(total, min(total, self.AGREEMENT_SAMPLE), replace=False))
+        agreement = self._cluster_agreement(embeddings[sample_idx], reduced[sample_idx], similarity_threshold)
+        report = {
+            "method": method,
+            "from_dim": int(dim),
+            "to_dim": int(reduced.shape[1]),
+            "variance_retained": round(variance_retained, 4),
+            "cluster_agreement": agreement,
+            "seconds": round(time.time() - t0, 2),
         }
+        logger.info("Dimension reduction %s: %d -> %d dims, variance retained %.3f, "
+                    "cluster agreement (ARI on sample) %s, %.2fs",
+                    method, dim, reduced.shape[1], variance_retained, agreement, report["seconds"])
+        return reduced, report
+
+    def _quantization_report(self, embeddings, matrix, similarity_threshold):
+        """Compare similarities from the quantized matrix against float32 on a sample of rows."""
+        total = embeddings.shape[0]
+        idx = np.sort(np.random.default_rng(0).choice(total, min(total, self.AGREEMENT_SAMPLE), replace=False))
+        exact_rows = embeddings[idx]
+        approx_rows = matrix.take(idx)
+        exact = exact_rows @ exact_rows.T
+        approx = approx_rows @ approx_rows.T
+        error = np.abs(exact - approx)
+
+        # Pairs whose side of the threshold changed, relative to the float32 neighbor pairs
+        exact_edges = exact >= similarity_threshold
+        flipped = np.count_nonzero(exact_edges != (approx >= similarity_threshold))
+
+        report = {
+            "precision": matrix.precision,
+            "float32_mb": round(embeddings.nbytes / 1024 / 1024, 1),
+            "stored_mb": round(matrix.nbytes / 1024 / 1024, 1),
+            "max_abs_error": round(float(error.max()), 5),
+            "mean_abs_error": round(float(error.mean()), 6),
+            "edge_flip_rate": round(float(flipped) / max(1, int(np.count_nonzero(exact_edges))), 5),
+            "cluster_agreement": self._cluster_agreement(exact_rows, approx_rows, similarity_threshold),
+        }
+        logger.info("Embeddings stored as %s: %.1f MB -> %.1f MB, similarity error max=%.5f mean=%.6f, "
+                    "edge flips %.4f, cluster agreement (ARI on sample) %s",
+                    report["precision"], report["float32_mb"], report["stored_mb"], report["max_abs_error"],
+                    report["mean_abs_error"], report["edge_flip_rate"], report["cluster_agreement"])
+        return report
+
+    def _cluster_agreement(self, reference, candidate, similarity_threshold):
+        """Adjusted Rand index between DBSCAN labels on two versions of the same sample rows."""
+        from sklearn.cluster import DBSCAN
+        from sklearn.metrics import adjusted_rand_score
+
+        if reference.shape[0] < 2:
+            return None
+        eps = 1 - similarity_threshold
+        label_sets = []
+        for vectors in (reference, candidate):
+            distance = np.clip(1 - np.dot(vectors, vectors.T), 0, 2)
+            label_sets.append(DBSCAN(eps=eps, min_samples=2, metric='precomputed').fit_predict(distance))
+        return round(float(adjusted_rand_score(label_sets[0], label_sets[1])), 4)
+
+    def _tiled_distance_graph(self, matrix, similarity_threshold, progress_callback=None):
+        """Build a CSR cosine distance graph from an EmbeddingMatrix, one tile pair at a time.
+
+        Only the upper triangle of tile pairs is computed and mirrored. Each tile is
+        upcast to float32 just before its product, so peak memory is a few tiles
+        rather than the N x N matrix.
+        """
+        from scipy import sparse
+
+        total = len(matrix)
+        tile = self.DENSE_TILE_ROWS
+        rows, cols, dists = [], [], []
+
+        for i in range(0, total, tile):
+            self._check_cancelled()
+            a = matrix.rows(i, i + tile)
+            for j in range(i, total, tile):
+                b = a if j == i else matrix.rows(j, j + tile)
+                sims = a @ b.T
+                r, c = np.nonzero(sims >= similarity_threshold)
+                d = np.maximum(1 - sims[r, c], 0).astype(np.float32)
+                rows.append(r + i)
+                cols.append(c + j)
+                dists.append(d)
+                if j != i:
+                    rows.append(c + j)
+                    cols.append(r + i)
+                    dists.append(d)
+
+            if progress_callback:
+                remaining = (total - min(i + tile, total)) / total
+                phase_pct = int((1 - remaining * remaining) * 50)
+                progress_callback("clustering", "聚类计算", 4, phase_pct, 70 + phase_pct // 5,
+                                  f"计算相似度图: {min(i + tile, total)}/{total}")
+
+        return sparse.csr_matrix(
+            (np.concatenate(dists), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(total, total)
+        )
+
+    def _sparse_distance_graph(self, embeddings, similarity_threshold, progress_callback=None):
+        """Build a CSR cosine distance graph keeping only pairs with similarity >= threshold.
+
+        Rows are processed in blocks of SPARSE_BLOCK_ROWS so the full N x N similarity
+        matrix is never materialized. Exact-duplicate pairs are stored as explicit zeros,
+        which DBSCAN treats as neighbors.
+        """
+        from scipy import sparse
+
+        total = embeddings.shape[0]
+        embeddings_t = embeddings.T.tocsr()
+        rows, cols, dists = [], [], []
+
+        for start in range(0, total, self.SPARSE_BLOCK_ROWS):
+            self._check_cancelled()
+            block = (embeddings[start:start + self.SPARSE_BLOCK_ROWS] @ embeddings_t).tocoo()
+            keep = block.data >= similarity_threshold
+            rows.append(block.row[keep] + start)
+            cols.append(block.col[keep])
+            dists.append(np.maximum(1 - block.data[keep], 0).astype(np.float32))
+
+            done = min(start + self.SPARSE_BLOCK_ROWS, total)
+            if progress_callback:
+                phase_pct = int(done / total * 50)
+                progress_callback("clustering", "聚类计算", 4, phase_pct, 70 + phase_pct // 5,
+                                  f"计算相似度图: {done}/{total}")
+
+        return sparse.csr_matrix(
+            (np.concatenate(dists), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(total, total)
+        )
 
     def _extract_labels(self, labels, embeddings, texts):
         """Extract representative text for each cluster."""
-        unique_labels = set(labels)
-        unique_labels.discard(-1)
         cluster_labels = {}
 
-        for cid in unique_labels:
-            cid_int = int(cid)
-            mask = labels == cid
-            cluster_embeddings = embeddings[mask]
-            cluster_texts = [texts[i] for i in range(len(texts)) if labels[i] == cid]
-
-            if not cluster_texts:
+        # Group row indices by label once instead of scanning all rows per cluster
+        order = np.argsort(labels, kind='stable')
+        sorted_labels = labels[order]
+        boundaries = np.flatnonzero(np.diff(sorted_labels)) + 1
+        for indices in np.split(order, boundaries):
+            if len(indices) == 0:
+                continue
+            cid_int = int(labels[indices[0]])
+            if cid_int == -1:
                 continue
 
-            centroid = cluster_embeddings.mean(axis=0)
+            if isinstance(embeddings, EmbeddingMatrix):
+                cluster_embeddings = embeddings.take(indices)
+            else:
+                cluster_embeddings = embeddings[indices]
+            centroid = np.asarray(cluster_embeddings.mean(axis=0)).ravel()
             centroid_norm = centroid / (np.linalg.norm(centroid) + 1e-10)
-            similarities = np.dot(cluster_embeddings, centroid_norm)
+            similarities = np.asarray(cluster_embeddings @ centroid_norm).ravel()
             best_idx = int(np.argmax(similarities))
-            cluster_labels[cid_int] = cluster_texts[best_idx]
+            cluster_labels[cid_int] = texts[indices[best_idx]]
 
         return cluster_labels
+
+
+def _is_sparse(matrix):
+    return hasattr(matrix, "tocsr")
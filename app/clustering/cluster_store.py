@@ -1,15 +1,47 @@
 import logging
-from collections import Counter
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from app.config import Config
+from app.database import bump_data_version
 
 logger = logging.getLogger(__name__)
 
+# Steps kept per cluster sample: enough for 10 siblings after excluding the step itself
+SAMPLE_SIZE = 11
+
+# Clusters per statement when loading samples, well under SQLite's variable limit
+_SAMPLE_BATCH = 500
+
 
 class ClusterStore:
     """Persist and query cluster results in the database."""
 
-    @staticmethod
-    def save_results(db, step_ids, labels, cluster_labels, threshold):
-        """Save clustering results to database.
+    # (database file, history_id, cluster_id) -> first SAMPLE_SIZE steps of the
+    # cluster by step id, least recently used first. A history's results never
+    # change after it is saved; deleting or re-importing cases invalidates.
+    _samples = OrderedDict()
+    _samples_lock = threading.Lock()
+
+    # database file -> (data version it was read at or None, current
+    # cluster_history record as a dict or None). Dropped whenever this process
+    # saves, activates, deletes or marks stale a history, or a clustering job
+    # ends; callers that read the data version anyway also catch other processes.
+    _current = {}
+    _current_generation = 0
+    _current_lock = threading.Lock()
+
+    @classmethod
+    def save_results(cls, db, step_ids, labels, cluster_labels, threshold,
+                     model_type=None, model_name=None, elapsed_seconds=None,
+                     progress_callback=None):
+        """Save clustering results as a new history record and make it current.
+
+        Earlier history records keep their results; only rows left over from
+        before cluster history existed (history_id IS NULL) are removed.
+        Commits once at the end, so a failed save leaves the previous
+        current result in place.
 
         Args:
             db: sqlite3 connection
@@ -17,42 +49,67 @@ class ClusterStore:
             labels: numpy array of cluster assignments (-1 = noise)
             cluster_labels: dict of cluster_id -> label text
             threshold: similarity threshold used
+            model_type, model_name, elapsed_seconds: recorded in cluster_history
+            progress_callback: optional clustering progress callback
+
+        Returns:
+            id of the new cluster_history record
         """
-        db.execute("DELETE FROM cluster_results")
-        db.execute("DELETE FROM cluster_info")
+        def report(phase_progress, overall_progress, detail):
+            if progress_callback:
+                progress_callback("saving", "结果保存", 5, phase_progress, overall_progress, detail)
+
+        unique_labels = set(int(l) for l in labels)
+        unique_labels.discard(-1)
+        label_counts = Counter(int(l) for l in labels)
+
+        db.execute("UPDATE cluster_history SET is_current = 0")
+        cursor = db.execute(
+            "INSERT INTO cluster_history (run_time, model_type, model_name, similarity_threshold, "
+            "total_steps, total_clusters, noise_count, elapsed_seconds, is_current) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)",
+            (datetime.now().isoformat(), model_type, model_name, threshold,
+             len(step_ids), len(unique_labels), label_counts.get(-1, 0), elapsed_seconds)
+        )
+        history_id = cursor.lastrowid
+
+        report(70, 97, "保存聚类结果到数据库...")
+
+        db.execute("DELETE FROM cluster_results WHERE history_id IS NULL")
+        db.execute("DELETE FROM cluster_info WHERE history_id IS NULL")
 
         for i, step_id in enumerate(step_ids):
             cid = int(labels[i])
             clabel = cluster_labels.get(cid, "")
             db.execute(
-                "INSERT INTO cluster_results (step_id, cluster_id, cluster_label, similarity_threshold) "
-                "VALUES (?, ?, ?, ?)",
-                (int(step_id), cid, clabel, threshold)
+                "INSERT INTO cluster_results (step_id, cluster_id, cluster_label, similarity_threshold, history_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (int(step_id), cid, clabel, threshold, history_id)
             )
 
-        # Compute and save cluster info
-        unique_labels = set(int(l) for l in labels)
-        unique_labels.discard(-1)
-        label_counts = Counter(int(l) for l in labels)
+        report(90, 99, "保存簇信息...")
 
         for cid in unique_labels:
             step_count = label_counts[cid]
             case_ids = db.execute(
                 "SELECT DISTINCT ts.case_id FROM cluster_results cr "
                 "JOIN test_steps ts ON cr.step_id = ts.id "
-                "WHERE cr.cluster_id = ?",
-                (cid,)
+                "WHERE cr.cluster_id = ? AND cr.history_id = ?",
+                (cid, history_id)
             ).fetchall()
             case_count = len(case_ids)
 
             db.execute(
-                "INSERT INTO cluster_info (cluster_id, label, step_count, case_count, threshold) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (cid, cluster_labels.get(cid, ""), step_count, case_count, threshold)
+                "INSERT INTO cluster_info (cluster_id, label, step_count, case_count, threshold, history_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cid, cluster_labels.get(cid, ""), step_count, case_count, threshold, history_id)
             )
 
+        bump_data_version(db)
         db.commit()
-        logger.info("Saved cluster results: %d clusters", len(unique_labels))
+        cls.invalidate_current_history()
+        logger.info("Saved cluster results: %d clusters (history_id=%d)", len(unique_labels), history_id)
+        return history_id
 
     @staticmethod
     def get_cluster_list(db):
@@ -77,24 +134,167 @@ class ClusterStore:
         ).fetchall()
         return [dict(r) for r in rows]
 
-    @staticmethod
-    def get_sibling_steps(db, step_id, limit=10):
-        """Return other steps in the same cluster as the given step."""
+    @classmethod
+    def get_sibling_steps(cls, db, step_id, limit=10, history_id=None, database=None):
+        """Return other steps in the same cluster as the given step.
+
+        Looks the step up in history_id, or in the current history when not given.
+        database is the connection's file path, looked up when not given.
+        """
+        database = database or cls._database_key(db)
+        if history_id is None:
+            current = cls.get_current_history(db, database)
+            history_id = current['id'] if current else None
+
         cluster_row = db.execute(
-            "SELECT cluster_id FROM cluster_results WHERE step_id = ?",
-            (step_id,)
+            "SELECT cluster_id FROM cluster_results WHERE history_id IS ? AND step_id = ?",
+            (history_id, step_id)
         ).fetchone()
-
         if not cluster_row or cluster_row['cluster_id'] < 0:
             return []
 
-        rows = db.execute(
-            "SELECT ts.case_id, tc.title as case_title, ts.step_no, ts.operation "
-            "FROM cluster_results cr "
-            "JOIN test_steps ts ON cr.step_id = ts.id "
-            "JOIN test_cases tc ON ts.case_id = tc.id "
-            "WHERE cr.cluster_id = ? AND cr.step_id != ? "
-            "LIMIT ?",
-            (cluster_row['cluster_id'], step_id, limit)
-        ).fetchall()
-        return [dict(r) for r in rows]
+        cluster_id = cluster_row['cluster_id']
+        if limit < SAMPLE_SIZE:
+            samples = cls.get_cluster_samples(db, history_id, [cluster_id], database)[cluster_id]
+        else:
+            samples = cls._query_cluster_samples(db, history_id, [cluster_id], limit + 1).get(cluster_id, [])
+        return cls.siblings_from_samples(samples, step_id, limit)
+
+    @classmethod
+    def get_current_history(cls, db, database=None, data_version=None):
+        """Return the current cluster_history record as a dict, or None when there is none.
+
+        Cached per database and served without touching the database; treat
+        the dict as read-only. Changes made in this process invalidate the
+        cache, and the job queue invalidates it when a job run in a worker
+        process ends. Callers that have read the data version already (the
+        conditional GET endpoints, for their ETag) pass it as data_version:
+        the cached record is then used only if it was read at that version,
+        which also picks up changes by other processes such as cli.py.
+        database is the connection's file path, looked up when not given.
+        """
+        database = database or cls._database_key(db)
+        with cls._current_lock:
+            cached = cls._current.get(database)
+            if cached is not None and (data_version is None or cached[0] == data_version):
+                return cached[1]
+            generation = cls._current_generation
+
+        row = db.execute(
+            "SELECT * FROM cluster_history WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        record = dict(row) if row else None
+        with cls._current_lock:
+            # Not cached if invalidated meanwhile: the row read may be outdated already
+            if generation == cls._current_generation:
+                cls._current[database] = (data_version, record)
+        return record
+
+    @classmethod
+    def invalidate_current_history(cls):
+        """Drop the cached current history records.
+
+        Call after a history is saved, activated or deleted, or marked stale.
+        """
+        with cls._current_lock:
+            cls._current.clear()
+            cls._current_generation += 1
+
+    @staticmethod
+    def siblings_from_samples(samples, step_id, limit=10):
+        """Siblings of step_id from its cluster's sample: the sample without the step itself."""
+        return [
+            {k: s[k] for k in ("case_id", "case_title", "step_no", "operation")}
+            for s in samples if s["step_id"] != step_id
+        ][:limit]
+
+    @classmethod
+    def get_cluster_samples(cls, db, history_id, cluster_ids, database=None):
+        """Return {cluster_id: first SAMPLE_SIZE steps by step id} for the given clusters.
+
+        Cached per database and history; clusters not cached yet are loaded
+        together in one query. Noise (negative cluster ids) maps to [].
+        database is the connection's file path, looked up when not given.
+        """
+        database = database or cls._database_key(db)
+        wanted = {cid for cid in cluster_ids if cid is not None and cid >= 0}
+        result = {cid: [] for cid in cluster_ids if cid is not None and cid < 0}
+
+        with cls._samples_lock:
+            for cid in wanted:
+                samples = cls._samples.get((database, history_id, cid))
+                if samples is not None:
+                    cls._samples.move_to_end((database, history_id, cid))
+                    result[cid] = samples
+        missing = sorted(wanted - result.keys())
+        if not missing:
+            return result
+
+        loaded = cls._query_cluster_samples(db, history_id, missing, SAMPLE_SIZE)
+        with cls._samples_lock:
+            for cid in missing:
+                samples = loaded.get(cid, [])
+                cls._samples[(database, history_id, cid)] = samples
+                result[cid] = samples
+            while len(cls._samples) > Config.CLUSTER_SAMPLE_CACHE_SIZE:
+                cls._samples.popitem(last=False)
+        return result
+
+    @classmethod
+    def invalidate_samples(cls, history_id=None):
+        """Drop cached cluster samples of one history, or of all histories.
+
+        Call after cases or steps are deleted or re-imported (samples name them)
+        and when a history is deleted.
+        """
+        with cls._samples_lock:
+            if history_id is None:
+                cls._samples.clear()
+                return
+            for key in [k for k in cls._samples if k[1] == history_id]:
+                del cls._samples[key]
+
+    @staticmethod
+    def _query_cluster_samples(db, history_id, cluster_ids, per_cluster):
+        """First per_cluster steps by step id of each cluster, in one query per batch of clusters.
+
+        For each cluster a correlated subquery reads the per_cluster-th step id
+        off the covering (history_id, cluster_id, step_id) index, and the join
+        takes the index range up to it, so a cluster costs about per_cluster
+        index reads however large it is. (Ranking with ROW_NUMBER() would read
+        every step of every cluster before filtering.)
+        """
+        samples = {}
+        history_clause = "IS NULL" if history_id is None else "= ?"
+        history_params = [] if history_id is None else [history_id]
+        for start in range(0, len(cluster_ids), _SAMPLE_BATCH):
+            batch = cluster_ids[start:start + _SAMPLE_BATCH]
+            values = ','.join(['(?)'] * len(batch))
+            rows = db.execute(
+                f"WITH wanted(cluster_id) AS (VALUES {values}) "
+                "SELECT cr.cluster_id, cr.step_id, ts.case_id, tc.title as case_title, ts.step_no, ts.operation "
+                "FROM wanted w "
+                f"JOIN cluster_results cr ON cr.history_id {history_clause} AND cr.cluster_id = w.cluster_id "
+                "  AND cr.step_id <= IFNULL(("
+                "    SELECT last.step_id FROM cluster_results last "
+                f"    WHERE last.history_id {history_clause} AND last.cluster_id = w.cluster_id "
+                "    ORDER BY last.step_id LIMIT 1 OFFSET ?), 9223372036854775807) "
+                "JOIN test_steps ts ON ts.id = cr.step_id "
+                "JOIN test_cases tc ON tc.id = ts.case_id "
+                "ORDER BY cr.cluster_id, cr.step_id",
+                list(batch) + history_params + history_params + [per_cluster - 1]
+            ).fetchall()
+            for r in rows:
+                samples.setdefault(r['cluster_id'], []).append({
+                    "step_id": r['step_id'],
+                    "case_id": r['case_id'],
+                    "case_title": r['case_title'],
+                    "step_no": r['step_no'],
+                    "operation": r['operation'],
+                })
+        return samples
+
+    @staticmethod
+    def _database_key(db):
+        """File path of the connection's main database, to keep caches of different databases apart."""
+        return db.execute("PRAGMA database_list").fetchone()[2]
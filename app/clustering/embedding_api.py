@@ -1,7 +1,6 @@
 import logging
 import time
 import numpy as np
-import requests
 from app.clustering.embedding_base import BaseEmbeddingModel
 
 logger = logging.getLogger(__name__)
@@ -49,6 +48,8 @@ class OnlineAPIEmbeddingModel(BaseEmbeddingModel):
 
     def _call_api(self, texts, max_retries=3):
         """Call embedding API with retry logic."""
+        import requests
+
         url = f"{self._api_url}/embeddings"
         headers = {
             "Authorization": f"Bearer {self._api_key}",
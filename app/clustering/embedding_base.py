@@ -25,3 +25,19 @@ class BaseEmbeddingModel(ABC):
     def model_name(self):
         """Human-readable model name for display."""
         ...
+
+    def load(self):
+        """Load model weights into memory. No-op for models without weights."""
+        pass
+
+    def prepare(self, texts):
+        """Adapt the model to the corpus about to be encoded. No-op for pretrained models."""
+        pass
+
+    def warm_up(self):
+        """Run a tiny encode so lazy kernel initialization happens up front."""
+        pass
+
+    def memory_bytes(self):
+        """Approximate resident size of the loaded model, used for the cache budget."""
+        return 0
@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 import numpy as np
 from app.clustering.embedding_base import BaseEmbeddingModel
@@ -12,19 +13,24 @@ class BuiltinEmbeddingModel(BaseEmbeddingModel):
     def __init__(self, model_path):
         self._model_path = model_path
         self._model = None
+        self._load_lock = threading.Lock()
 
     def _ensure_loaded(self):
-        if self._model is None:
-            logger.info("Loading built-in model from %s", self._model_path)
-            t0 = time.time()
-            from sentence_transformers import SentenceTransformer
-            self._model = SentenceTransformer(self._model_path)
-            load_time = time.time() - t0
+        if self._model is not None:
+            return
+        # Single-flight: a caller arriving mid-load waits instead of loading a second copy
+        with self._load_lock:
+            if self._model is None:
+                logger.info("Loading built-in model from %s", self._model_path)
+                t0 = time.time()
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self._model_path)
+                load_time = time.time() - t0
 
-            device = str(self._model.device) if hasattr(self._model, 'device') else 'unknown'
-            dim = self._model.get_sentence_embedding_dimension()
-            logger.info("Built-in model loaded in %.2fs, device=%s, dim=%d",
-                         load_time, device, dim)
+                device = str(self._model.device) if hasattr(self._model, 'device') else 'unknown'
+                dim = self._model.get_sentence_embedding_dimension()
+                logger.info("Built-in model loaded in %.2fs, device=%s, dim=%d",
+                             load_time, device, dim)
 
     def encode(self, texts, batch_size=32):
         self._ensure_loaded()
@@ -72,6 +78,20 @@ class BuiltinEmbeddingModel(BaseEmbeddingModel):
         self._ensure_loaded()
         return self._model.get_sentence_embedding_dimension()
 
+    def load(self):
+        self._ensure_loaded()
+
+    def warm_up(self):
+        self._ensure_loaded()
+        t0 = time.time()
+        self._model.encode(["预热"], show_progress_bar=False, normalize_embeddings=True)
+        logger.info("Built-in model warm-up encode finished in %.2fs", time.time() - t0)
+
+    def memory_bytes(self):
+        if self._model is None:
+            return 0
+        return sum(p.numel() * p.element_size() for p in self._model.parameters())
+
     @property
     def model_name(self):
         return "bge-large-zh-v1.5 (built-in)"
@@ -0,0 +1,199 @@
+"""Compact and on-disk storage for dense embedding matrices."""
+
+import os
+import json
+import shutil
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+class EmbeddingMatrix:
+    """Row-major embedding matrix stored as float32, float16 or per-row scaled int8.
+
+    Callers read rows through rows()/take(), which upcast only the requested
+    rows to float32, so similarity kernels can work tile by tile without ever
+    materializing the full float32 matrix.
+    """
+
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales  # float32 per-row scale for int8, else None
+
+    @classmethod
+    def from_float32(cls, embeddings, precision="float32"):
+        """Quantize a float32 (n, dim) array to the given precision."""
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown embedding precision: {precision}")
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if precision == "float32":
+            return cls(embeddings)
+        if precision == "float16":
+            return cls(embeddings.astype(np.float16))
+
+        # int8: symmetric per-vector scale so each row uses the full [-127, 127] range
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        data = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        return cls(data, scales)
+
+    @property
+    def precision(self):
+        return str(self.data.dtype)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def _upcast(self, data, scales):
+        tile = np.asarray(data, dtype=np.float32)
+        if scales is not None:
+            tile = tile * scales[:, None]
+        return tile
+
+    def rows(self, start, stop):
+        """Return rows [start, stop) as a float32 array."""
+        scales = self.scales[start:stop] if self.scales is not None else None
+        return self._upcast(self.data[start:stop], scales)
+
+    def take(self, indices):
+        """Return the given rows as a float32 array."""
+        scales = self.scales[indices] if self.scales is not None else None
+        return self._upcast(self.data[indices], scales)
+
+
+class MemmapEmbeddingStore:
+    """On-disk, append-only embedding matrix that survives interrupted runs.
+
+    Batches are quantized to `precision` and written into .npy memmaps under
+    `directory` as they are produced. progress.json records how many rows are
+    durable and the fingerprint of the corpus and model they belong to, so a
+    later run over the same corpus resumes after the last checkpoint (or skips
+    encoding entirely when every row is present).
+    """
+
+    CHECKPOINT_ROWS = 4096
+
+    def __init__(self, directory, fingerprint, total, precision="float32"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown embedding precision: {precision}")
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.total = total
+        self.precision = precision
+        self.rows_done = 0
+        self._data = None
+        self._scales = None
+        self._unflushed = 0
+        self._resume()
+
+    @classmethod
+    def open(cls, base_dir, fingerprint, total, precision="float32"):
+        """Open the store for this fingerprint, removing stores left by other corpora."""
+        os.makedirs(base_dir, exist_ok=True)
+        name = fingerprint[:16]
+        for entry in os.listdir(base_dir):
+            path = os.path.join(base_dir, entry)
+            if entry != name and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info("Removed stale embedding store %s", path)
+        return cls(os.path.join(base_dir, name), fingerprint, total, precision)
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "progress.json")
+
+    @property
+    def _data_path(self):
+        return os.path.join(self.directory, "embeddings.npy")
+
+    @property
+    def _scales_path(self):
+        return os.path.join(self.directory, "scales.npy")
+
+    def _resume(self):
+        meta = None
+        if os.path.exists(self._meta_path):
+            try:
+                with open(self._meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+
+        usable = (
+            meta is not None
+            and meta.get("fingerprint") == self.fingerprint
+            and meta.get("total") == self.total
+            and meta.get("precision") == self.precision
+            and os.path.exists(self._data_path)
+            and (self.precision != "int8" or os.path.exists(self._scales_path))
+        )
+        if not usable:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+
+        self._data = np.load(self._data_path, mmap_mode="r+")
+        if self.precision == "int8":
+            self._scales = np.load(self._scales_path, mmap_mode="r+")
+        self.rows_done = int(meta.get("rows_done", 0))
+        logger.info("Resuming embedding store %s: %d/%d rows already encoded",
+                    self.directory, self.rows_done, self.total)
+
+    def _create(self, dim):
+        os.makedirs(self.directory, exist_ok=True)
+        dtype = np.float32 if self.precision == "float32" else np.dtype(self.precision)
+        self._data = np.lib.format.open_memmap(self._data_path, mode="w+", dtype=dtype, shape=(self.total, dim))
+        if self.precision == "int8":
+            self._scales = np.lib.format.open_memmap(self._scales_path, mode="w+", dtype=np.float32,
+                                                     shape=(self.total,))
+        logger.info("Created %s embedding store %s (%d x %d)", self.precision, self.directory, self.total, dim)
+
+    def append(self, embeddings):
+        """Quantize and write the next batch of float32 rows."""
+        chunk = EmbeddingMatrix.from_float32(embeddings, self.precision)
+        if self._data is None:
+            self._create(chunk.shape[1])
+
+        start, stop = self.rows_done, self.rows_done + len(chunk)
+        self._data[start:stop] = chunk.data
+        if self._scales is not None:
+            self._scales[start:stop] = chunk.scales
+        self.rows_done = stop
+        self._unflushed += len(chunk)
+
+        if self._unflushed >= self.CHECKPOINT_ROWS or self.rows_done >= self.total:
+            self.flush()
+
+    def flush(self):
+        """Make the rows written so far durable and record the checkpoint."""
+        if self._data is None:
+            return
+        self._data.flush()
+        if self._scales is not None:
+            self._scales.flush()
+        meta = {
+            "fingerprint": self.fingerprint,
+            "total": self.total,
+            "precision": self.precision,
+            "rows_done": self.rows_done,
+        }
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+        self._unflushed = 0
+
+    def matrix(self):
+        """Return an EmbeddingMatrix view over the on-disk rows."""
+        return EmbeddingMatrix(self._data, self._scales)
@@ -1,49 +1,213 @@
 """Lightweight TF-IDF based embedding model for testing without sentence-transformers."""
 
+import os
+import json
+import random
 import logging
+import threading
+from datetime import datetime
+
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
 from app.clustering.embedding_base import BaseEmbeddingModel
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_FEATURES = 20000
+DEFAULT_REFIT_DRIFT = 0.05
+DRIFT_SAMPLE_SIZE = 5000
+
 
 class TfidfEmbeddingModel(BaseEmbeddingModel):
     """Uses TF-IDF vectors as a lightweight alternative to neural embeddings.
     Suitable for testing and environments where sentence-transformers is not installed.
+
+    encode() returns L2-normalized scipy CSR matrices rather than dense arrays:
+    char n-gram vectors are almost entirely zeros, so ClusterEngine keeps them
+    sparse end to end.
+
+    The fitted vocabulary and IDF weights are persisted in state_dir and reused
+    by later runs, so vectors stay comparable across runs. prepare() refits only
+    when the out-of-vocabulary n-gram rate of the corpus has drifted more than
+    refit_drift above the rate measured at fit time.
+
+    One instance is shared by concurrent jobs. prepare() binds the vocabulary
+    it settled on to the calling thread, and encode() on that thread keeps
+    using it even if another job refits meanwhile, so a run never mixes
+    vectors of two vocabularies. A refit builds a new vectorizer rather than
+    refitting the shared one in place.
     """
 
-    def __init__(self):
-        self._vectorizer = TfidfVectorizer(
+    def __init__(self, max_features=DEFAULT_MAX_FEATURES, state_dir=None, refit_drift=DEFAULT_REFIT_DRIFT):
+        self._max_features = max_features
+        self._vectorizer = self._new_vectorizer()
+        self._fitted = False
+        self._dimension = max_features
+        self._state_dir = state_dir
+        self._refit_drift = refit_drift
+        self._state_loaded = False
+        self._version = 0
+        self._baseline_oov = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()  # vectorizer and version bound by prepare() on this thread
+
+    def _new_vectorizer(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        return TfidfVectorizer(
             analyzer='char_wb',
             ngram_range=(2, 4),
-            max_features=512,
+            max_features=self._max_features,
             sublinear_tf=True,
+            dtype=np.float32,
         )
-        self._fitted = False
-        self._dimension = 512
 
-    def encode(self, texts, batch_size=32):
+    @property
+    def _state_path(self):
+        if not self._state_dir:
+            return None
+        return os.path.join(self._state_dir, f"tfidf_vocab_{self._max_features}.json")
+
+    def load(self):
+        """Restore the persisted vocabulary, if any, from state_dir."""
+        with self._lock:
+            self._load_state()
+
+    def _load_state(self):
+        if self._state_loaded:
+            return
+        self._state_loaded = True
+        path = self._state_path
+        if not path or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            vectorizer = self._new_vectorizer()
+            vectorizer.vocabulary_ = {k: int(v) for k, v in state["vocabulary"].items()}
+            vectorizer.idf_ = np.asarray(state["idf"], dtype=np.float64)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable TF-IDF vocabulary %s: %s", path, e)
+            return
+
+        self._vectorizer = vectorizer
+        self._fitted = True
+        self._dimension = len(vectorizer.vocabulary_)
+        self._version = int(state.get("version", 1))
+        self._baseline_oov = float(state.get("baseline_oov", 0.0))
+        logger.info("Loaded TF-IDF vocabulary v%d (%d features, fitted %s on %d texts)",
+                    self._version, self._dimension, state.get("fitted_at", "?"), state.get("n_docs", 0))
+
+    def _save_state(self, n_docs):
+        path = self._state_path
+        if not path:
+            return
+        os.makedirs(self._state_dir, exist_ok=True)
+        state = {
+            "version": self._version,
+            "fitted_at": datetime.now().isoformat(),
+            "n_docs": n_docs,
+            "max_features": self._max_features,
+            "baseline_oov": self._baseline_oov,
+            "vocabulary": {k: int(v) for k, v in self._vectorizer.vocabulary_.items()},
+            "idf": self._vectorizer.idf_.tolist(),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info("Saved TF-IDF vocabulary v%d to %s", self._version, path)
+
+    def _oov_ratio(self, texts):
+        """Fraction of n-gram occurrences in (a sample of) texts missing from the vocabulary."""
+        if len(texts) > DRIFT_SAMPLE_SIZE:
+            texts = random.Random(0).sample(list(texts), DRIFT_SAMPLE_SIZE)
+        analyzer = self._vectorizer.build_analyzer()
+        vocabulary = self._vectorizer.vocabulary_
+        total = missing = 0
+        for text in texts:
+            for gram in analyzer(text):
+                total += 1
+                if gram not in vocabulary:
+                    missing += 1
+        return missing / total if total else 0.0
+
+    def _saved_version(self):
+        """Version of the persisted vocabulary, which another process may have refitted since it was loaded."""
+        path = self._state_path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return int(json.load(f).get("version", 0))
+        except (OSError, ValueError):
+            return 0
+
+    def _fit(self, texts):
+        """Fit a new vocabulary on texts and make it the shared one. Caller holds _lock."""
+        vectorizer = self._new_vectorizer()
+        matrix = vectorizer.fit_transform(texts)
+        self._vectorizer = vectorizer
+        self._fitted = True
+        self._dimension = matrix.shape[1]
+        self._version = max(self._version, self._saved_version()) + 1
+        self._baseline_oov = self._oov_ratio(texts)
+        logger.info("TF-IDF vocabulary v%d fitted: %d features from %d texts (baseline OOV %.3f)",
+                    self._version, self._dimension, len(texts), self._baseline_oov)
+
+    def prepare(self, texts):
+        """Reuse the persisted vocabulary for this corpus, refitting only on drift.
+
+        The vocabulary chosen is what encode() uses on this thread from now on.
+        """
         if not texts:
-            return np.array([]).reshape(0, self._dimension)
+            return
+        with self._lock:
+            self._load_state()
+            drift = self._oov_ratio(texts) - self._baseline_oov if self._fitted else None
+            if drift is not None and drift <= self._refit_drift:
+                logger.info("Reusing TF-IDF vocabulary v%d (drift %.3f <= %.3f)",
+                            self._version, drift, self._refit_drift)
+            else:
+                if drift is not None:
+                    logger.info("TF-IDF corpus drift %.3f exceeds %.3f, refitting vocabulary",
+                                drift, self._refit_drift)
+                self._fit(texts)
+                self._save_state(len(texts))
+            self._local.vectorizer = (self._vectorizer, self._version)
+
+    def _bound(self):
+        """(vectorizer, version) to encode with on this thread; the vectorizer is None if nothing is fitted."""
+        bound = getattr(self._local, "vectorizer", None)
+        if bound is not None:
+            return bound
+        with self._lock:
+            self._load_state()
+            return (self._vectorizer if self._fitted else None), self._version
 
-        if not self._fitted:
-            matrix = self._vectorizer.fit_transform(texts)
-            self._fitted = True
-            self._dimension = matrix.shape[1]
-        else:
-            matrix = self._vectorizer.transform(texts)
+    def encode(self, texts, batch_size=32):
+        from scipy import sparse
 
-        result = matrix.toarray().astype(np.float32)
+        vectorizer, _ = self._bound()
+        if not texts:
+            dimension = len(vectorizer.vocabulary_) if vectorizer is not None else self._dimension
+            return sparse.csr_matrix((0, dimension), dtype=np.float32)
 
-        # L2 normalize
-        norms = np.linalg.norm(result, axis=1, keepdims=True)
-        result = result / np.maximum(norms, 1e-10)
+        if vectorizer is None:
+            # Not prepared and nothing persisted: fit a throwaway vocabulary on
+            # what we are given (e.g. a test probe), leaving the shared one unset
+            return self._new_vectorizer().fit_transform(texts).tocsr()
 
-        return result
+        # TfidfVectorizer already L2-normalizes rows (norm='l2')
+        return vectorizer.transform(texts).tocsr()
 
     def get_dimension(self):
-        return self._dimension
+        vectorizer, _ = self._bound()
+        return len(vectorizer.vocabulary_) if vectorizer is not None else self._dimension
+
+    @property
+    def vocabulary_version(self):
+        """Version of the vocabulary this thread encodes with; vectors are comparable only within one version."""
+        return self._bound()[1]
 
     @property
     def model_name(self):
@@ -0,0 +1,740 @@
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from app.database import connect
+from app.clustering.cluster_store import ClusterStore
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "cancelled", "error")
+
+
+class JobQueueFull(Exception):
+    """Raised by ClusterJobQueue.submit when max_queued jobs are already waiting."""
+
+
+class _WorkerChannel:
+    """Child end of the pipe between a job worker process and its supervisor thread.
+
+    Also serves as the queue of a QueueHandler, so log records emitted in the
+    worker are handled by the parent's logging setup.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    def send(self, kind, payload):
+        with self._lock:
+            self._conn.send((kind, payload))
+
+    def put_nowait(self, record):
+        self.send("log", record)
+
+
+def _model_status():
+    """Preload state and cached models of this process's ModelManager."""
+    from app.clustering.model_manager import ModelManager
+    return {**ModelManager.get_status(), "cached_models": ModelManager.cached_models()}
+
+
+def _process_rss_mb():
+    """Resident memory of this process in MB, or None where it cannot be read."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                        "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage",
+                        "PeakPagefileUsage")]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return None
+            return counters.WorkingSetSize / (1024 * 1024)
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _worker_main(runner, worker_init, runner_config, tasks, conn, cancel_event):
+    """Entry point of a clustering worker process.
+
+    Runs the jobs, model preloads and model tests received over tasks one at a time until
+    told to stop, keeping its ModelManager (and the models it loaded) across
+    jobs. Reports over conn; after each job, its resident memory comes
+    before the job's outcome.
+    """
+    from app.clustering.cluster_engine import ClusteringCancelled
+    from app.clustering.model_manager import ModelManager
+
+    channel = _WorkerChannel(conn)
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [logging.handlers.QueueHandler(channel)]
+    root_logger.setLevel(logging.DEBUG)
+
+    def progress_callback(*args):
+        channel.send("progress", args)
+
+    try:
+        if worker_init is not None:
+            worker_init(runner_config)
+        while True:
+            try:
+                kind, payload = tasks.recv()
+            except EOFError:
+                break
+            if kind == "stop":
+                break
+            if kind == "preload":
+                ModelManager.preload(payload, background=False)
+            elif kind == "test":
+                try:
+                    channel.send("tested", ModelManager.test(payload))
+                except Exception as e:
+                    logger.error("Model test failed in worker process: %s", e, exc_info=True)
+                    channel.send("error", str(e))
+            elif kind == "run":
+                job_id, params = payload
+                try:
+                    outcome = ("completed", runner(runner_config, job_id, params, progress_callback,
+                                                   cancel_event.is_set))
+                except ClusteringCancelled:
+                    outcome = ("cancelled", None)
+                except Exception as e:
+                    logger.error("Clustering job #%d failed in worker process: %s", job_id, e, exc_info=True)
+                    outcome = ("error", str(e))
+                channel.send("memory", _process_rss_mb())
+                channel.send(*outcome)
+            channel.send("models", _model_status())
+    finally:
+        tasks.close()
+        conn.close()
+
+
+class _Worker:
+    """Parent side of a long-lived clustering worker process.
+
+    A reader thread handles everything the worker sends: log records go to
+    this process's logging, progress to the running job's callback, model
+    status is kept for /api/settings/model-status, and a job's outcome wakes
+    run(). The worker exits when stopped or when the parent goes away.
+    """
+
+    def __init__(self, runner, worker_init, runner_config, generation):
+        ctx = multiprocessing.get_context("spawn")
+        child_tasks, self._tasks = ctx.Pipe(duplex=False)
+        self._messages, child_conn = ctx.Pipe(duplex=False)
+        self.cancel_event = ctx.Event()
+        self.generation = generation
+        self.model_status = None
+        self.jobs_run = 0
+        self.rss_mb = None  # resident memory reported after the last job
+        self._progress_callback = None
+        self._outcome = None
+        self._done = threading.Event()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(runner, worker_init, runner_config, child_tasks, child_conn, self.cancel_event),
+            name="cluster-worker",
+            daemon=True
+        )
+        self.process.start()
+        child_tasks.close()
+        child_conn.close()
+        threading.Thread(target=self._read_loop, name=f"cluster-worker-{self.pid}", daemon=True).start()
+        logger.info("Started clustering worker process %d", self.pid)
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def is_alive(self):
+        return self.process.is_alive() and not self._tasks.closed
+
+    def _read_loop(self):
+        while True:
+            try:
+                kind, payload = self._messages.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "log":
+                logging.getLogger(payload.name).handle(payload)
+            elif kind == "progress":
+                callback = self._progress_callback
+                if callback is not None:
+                    callback(*payload)
+            elif kind == "models":
+                self.model_status = payload
+            elif kind == "memory":
+                self.rss_mb = payload
+            else:
+                self._outcome = (kind, payload)
+                self._done.set()
+        self._messages.close()
+        self._done.set()  # worker gone: wake a run() still waiting for an outcome
+
+    def preload(self, config):
+        """Have the worker load and warm up a model after whatever it is doing now."""
+        self.model_status = {"status": "loading", "model_name": "", "load_seconds": 0, "error": None,
+                             "cached_models": (self.model_status or {}).get("cached_models", [])}
+        self._send(("preload", config))
+
+    def _send(self, task):
+        try:
+            self._tasks.send(task)
+            return True
+        except OSError:
+            return False
+
+    def test_model(self, config):
+        """Have the worker load config's model and encode a probe.
+
+        Returns (kind, payload): ("tested", result dict), ("error", message),
+        or (None, None) if the worker died first.
+        """
+        self._outcome = None
+        self._done.clear()
+        if not self._send(("test", config)):
+            return None, None
+        while not self._done.wait(0.2):
+            if not self.process.is_alive():
+                self._done.wait(5)
+                break
+        return self._outcome or (None, None)
+
+    def run(self, job_id, params, progress_callback, cancel_event, grace_seconds):
+        """Run one job in the worker and return its outcome as (kind, payload).
+
+        kind is "completed", "cancelled" or "error", or None if the worker died
+        without reporting. Cancellation is forwarded to the worker; one that
+        still runs grace_seconds later is terminated.
+        """
+        self.jobs_run += 1
+        self.cancel_event.clear()
+        self._outcome = None
+        self._done.clear()
+        self._progress_callback = progress_callback
+        cancelled_at = None
+        try:
+            if not self._send(("run", (job_id, params))):
+                return None, None
+            while not self._done.wait(0.2):
+                if cancel_event.is_set() and cancelled_at is None:
+                    self.cancel_event.set()
+                    cancelled_at = time.time()
+                if cancelled_at and time.time() - cancelled_at > grace_seconds:
+                    logger.warning("Worker for clustering job #%d ignored cancellation, terminating", job_id)
+                    self.stop(terminate=True)
+                    return "cancelled", None
+                if not self.process.is_alive():
+                    # Let the reader drain what the worker sent before it exited
+                    self._done.wait(5)
+                    break
+        finally:
+            self._progress_callback = None
+        return self._outcome or (None, None)
+
+    def stop(self, terminate=False):
+        """Stop the worker process: ask it to exit, or terminate it right away."""
+        if not terminate and self._send(("stop", None)):
+            self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self._tasks.close()
+
+
+class ClusterJobQueue:
+    """FIFO queue of clustering jobs, persisted in the cluster_jobs table.
+
+    At most max_concurrent jobs run at once. Each job is supervised by a
+    background thread; with use_processes the work itself runs in a worker
+    process, so heavy numpy/sklearn work does not compete with request
+    handling for the GIL. Workers are long-lived and keep their loaded models
+    across jobs; one is replaced after a job was cancelled (it may have been
+    stopped midway), when it died, and when it has run worker_max_jobs jobs
+    or is left holding more than worker_max_rss_mb of memory after a job, so
+    the peak memory of a large run is given back at the cost of loading the
+    model again. A worker reports progress and log records over a pipe and
+    writes its results through its own database connection.
+    Queued jobs survive a restart; a job that was running when the server
+    stopped goes back to the head of the queue and resumes from its checkpoints.
+    Live progress of queued and running jobs is kept in memory only; every
+    change bumps a version number that wait_for_change() blocks on, so
+    listeners are woken only when there is something new to report.
+
+    runner(runner_config, job_id, params, progress_callback, cancel_check) does
+    the work and returns the job result dict; it raises ClusteringCancelled when
+    cancelled. In worker processes it must be a picklable module-level function,
+    and worker_init(runner_config) is called first to set up process-wide state.
+    """
+
+    KEEP_FINISHED = 50  # finished jobs kept in memory; older ones are read back from the database
+    CANCEL_GRACE_SECONDS = 30  # a worker that ignores cancellation this long is terminated
+
+    def __init__(self, runner):
+        self._runner = runner
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        self._db_path = None
+        self._max_concurrent = 1
+        self._max_queued = 0  # 0 = unlimited
+        self._runner_config = {}
+        self._worker_init = None
+        self._use_processes = False
+        self._jobs = OrderedDict()  # job id -> state, in submission order
+        self._cancel_events = {}
+        self._workers = []  # live worker processes
+        self._idle_workers = []  # those not running a job
+        self._worker_generation = 0  # bumped by configure(); older workers are not reused
+        self._preload_config = None  # model each new worker preloads
+        self._worker_max_jobs = 0  # jobs a worker runs before it is replaced (0 = unlimited)
+        self._worker_max_rss_mb = 0  # memory a worker may keep after a job (0 = unlimited)
+
+    def _connect(self):
+        return connect(self._db_path, timeout=30)
+
+    @property
+    def use_processes(self):
+        return self._use_processes
+
+    def configure(self, db_path, max_concurrent=1, max_queued=0, runner_config=None, use_processes=False,
+                  worker_init=None, worker_max_jobs=0, worker_max_rss_mb=0):
+        """Point the queue at a database and start the jobs persisted there."""
+        with self._lock:
+            self._worker_max_jobs = max(0, int(worker_max_jobs))
+            self._worker_max_rss_mb = max(0, int(worker_max_rss_mb))
+            self._db_path = db_path
+            self._runner_config = dict(runner_config or {})
+            self._use_processes = bool(use_processes)
+            self._worker_init = worker_init
+            self._max_concurrent = max(1, int(max_concurrent))
+            self._max_queued = max(0, int(max_queued))
+            self._worker_generation += 1
+            stale_workers, self._idle_workers = self._idle_workers, []
+            self._workers = [w for w in self._workers if w not in stale_workers]
+            running_here = [jid for jid, s in self._jobs.items() if s["status"] == "running"]
+            self._jobs = OrderedDict((jid, self._jobs[jid]) for jid in running_here)
+
+            conn = self._connect()
+            try:
+                placeholders = ",".join("?" * len(running_here))
+                interrupted = conn.execute(
+                    "UPDATE cluster_jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+                    + (f" AND id NOT IN ({placeholders})" if running_here else ""),
+                    running_here
+                ).rowcount
+                conn.commit()
+                rows = conn.execute(
+                    "SELECT * FROM cluster_jobs WHERE status = 'queued' ORDER BY id"
+                ).fetchall()
+            finally:
+                conn.close()
+
+            for row in rows:
+                self._jobs[row['id']] = self._state_from_row(row)
+            if interrupted:
+                logger.info("Requeued %d clustering job(s) interrupted by the last shutdown", interrupted)
+            if rows:
+                logger.info("Clustering job queue restored: %d queued job(s)", len(rows))
+            self._dispatch()
+        for worker in stale_workers:
+            worker.stop()
+
+    @staticmethod
+    def _new_state(job_id, params, created_at):
+        return {
+            "job_id": job_id,
+            "params": params,
+            "status": "queued",  # queued | running | completed | cancelled | error
+            "created_at": created_at,
+            "started_at": None,
+            "finished_at": None,
+            "progress": "排队中...",
+            "phase": None,
+            "phase_name": "",
+            "phase_index": 0,
+            "total_phases": 5,
+            "phase_progress": 0,
+            "overall_progress": 0,
+            "detail": "",
+            "elapsed_seconds": 0,
+            "start_time": None,
+            "result": None,
+            "error": None,
+        }
+
+    def _state_from_row(self, row):
+        state = self._new_state(row['id'], json.loads(row['params'] or "{}"), row['created_at'])
+        state["status"] = row['status']
+        state["started_at"] = row['started_at']
+        state["finished_at"] = row['finished_at']
+        state["elapsed_seconds"] = row['elapsed_seconds'] or 0
+        state["result"] = json.loads(row['result']) if row['result'] else None
+        state["error"] = row['error']
+        if row['status'] != "queued":
+            state["progress"] = ""
+        if row['status'] == "completed":
+            state["overall_progress"] = 100
+        return state
+
+    def submit(self, params):
+        """Queue a job and return its id."""
+        with self._lock:
+            queued = sum(1 for s in self._jobs.values() if s["status"] == "queued")
+            if self._max_queued and queued >= self._max_queued:
+                raise JobQueueFull(f"排队任务已达上限 ({self._max_queued})")
+
+            created_at = datetime.now().isoformat()
+            conn = self._connect()
+            try:
+                job_id = conn.execute(
+                    "INSERT INTO cluster_jobs (params, status, created_at) VALUES (?, 'queued', ?)",
+                    (json.dumps(params), created_at)
+                ).lastrowid
+                conn.commit()
+            finally:
+                conn.close()
+
+            self._jobs[job_id] = self._new_state(job_id, params, created_at)
+            self._notify()
+            self._dispatch()
+            return job_id
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop. Returns its status, or None if not active."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None or state["status"] in TERMINAL_STATUSES:
+                return None
+            if state["status"] == "queued":
+                self._finish(state, "cancelled")
+                return "cancelled"
+            state["progress"] = "正在取消..."
+            state["detail"] = "正在取消..."
+            self._cancel_events[job_id].set()
+            self._notify()
+            return "cancelling"
+
+    def _dispatch(self):
+        """Start queued jobs in FIFO order while below the concurrency limit. Caller holds _lock."""
+        running = sum(1 for s in self._jobs.values() if s["status"] == "running")
+        for job_id, state in self._jobs.items():
+            if running >= self._max_concurrent:
+                break
+            if state["status"] != "queued":
+                continue
+
+            state["status"] = "running"
+            state["progress"] = "启动中..."
+            state["start_time"] = time.time()
+            state["started_at"] = datetime.now().isoformat()
+            self._cancel_events[job_id] = threading.Event()
+            self._write(job_id, "UPDATE cluster_jobs SET status = 'running', started_at = ? WHERE id = ?",
+                        (state["started_at"], job_id))
+            threading.Thread(
+                target=self._execute,
+                args=(job_id,),
+                name=f"cluster-job-{job_id}",
+                daemon=True
+            ).start()
+            running += 1
+            self._notify()
+            logger.info("Clustering job #%d started (%d running)", job_id, running)
+
+    def _execute(self, job_id):
+        # Imported here so the web process does not load numpy until a job runs
+        from app.clustering.cluster_engine import ClusteringCancelled
+
+        with self._lock:
+            state = self._jobs[job_id]
+            cancel_event = self._cancel_events[job_id]
+
+        def progress_callback(phase, phase_name, phase_index, phase_progress, overall_progress, detail):
+            with self._lock:
+                state["phase"] = phase
+                state["phase_name"] = phase_name
+                state["phase_index"] = phase_index
+                state["phase_progress"] = phase_progress
+                state["overall_progress"] = overall_progress
+                state["detail"] = detail
+                state["progress"] = detail
+                state["elapsed_seconds"] = time.time() - state["start_time"]
+                self._notify()
+
+        result, error = None, None
+        try:
+            if self._use_processes:
+                status, result, error = self._run_in_process(job_id, state["params"], progress_callback,
+                                                             cancel_event)
+            else:
+                result = self._runner(self._runner_config, job_id, state["params"], progress_callback,
+                                      cancel_event.is_set)
+                status = "completed"
+        except ClusteringCancelled:
+            logger.info("Clustering job #%d cancelled", job_id)
+            status = "cancelled"
+        except Exception as e:
+            logger.error("Clustering job #%d failed: %s", job_id, e, exc_info=True)
+            status, error = "error", str(e)
+
+        # The job may have saved a new current history, possibly in a worker
+        # process, before it ended; drop this process's cached one before
+        # listeners learn the job has finished
+        ClusterStore.invalidate_current_history()
+        with self._lock:
+            self._finish(state, status, result, error)
+            self._dispatch()
+
+    def _run_in_process(self, job_id, params, progress_callback, cancel_event):
+        """Run one job in a worker process and relay its messages. Returns (status, result, error)."""
+        worker = self._take_worker()
+        logger.info("Clustering job #%d running in worker process %d", job_id, worker.pid)
+        kind, payload = worker.run(job_id, params, progress_callback, cancel_event, self.CANCEL_GRACE_SECONDS)
+
+        if kind is None:
+            worker.stop(terminate=True)
+            self._retire_worker(worker)
+            raise RuntimeError(f"聚类工作进程异常退出 (exit code {worker.process.exitcode})")
+        if kind == "cancelled":
+            # A cancelled job may have left the worker mid-way through anything; start over
+            worker.stop()
+            self._retire_worker(worker)
+            logger.info("Clustering job #%d cancelled", job_id)
+            return "cancelled", None, None
+        self._release_worker(worker)
+        if kind == "completed":
+            return "completed", payload, None
+        return "error", None, payload
+
+    def _take_worker(self):
+        """An idle worker process of the current configuration, or a newly started one."""
+        with self._lock:
+            while self._idle_workers:
+                worker = self._idle_workers.pop()
+                if worker.is_alive():
+                    return worker
+                self._workers.remove(worker)
+            return self._start_worker()
+
+    def _start_worker(self):
+        """Start a worker process, preloading the configured model. Caller holds _lock."""
+        worker = _Worker(self._runner, self._worker_init, self._runner_config, self._worker_generation)
+        if self._preload_config is not None:
+            worker.preload(self._preload_config)
+        self._workers.append(worker)
+        return worker
+
+    def _release_worker(self, worker):
+        """Return a worker after a job.
+
+        It stays for the next job unless the queue was reconfigured or the
+        worker reached its job or memory bound.
+        """
+        with self._lock:
+            recycle = self._recycle_reason(worker)
+            keep = (recycle is None and worker.is_alive() and worker.generation == self._worker_generation
+                    and len(self._idle_workers) < self._max_concurrent)
+            if keep:
+                self._idle_workers.append(worker)
+                return
+        if recycle:
+            logger.info("Replacing clustering worker process %d: %s", worker.pid, recycle)
+        worker.stop()
+        self._retire_worker(worker)
+
+    def _recycle_reason(self, worker):
+        """Why a worker should be replaced after its last job, or None. Caller holds _lock."""
+        if self._worker_max_jobs and worker.jobs_run >= self._worker_max_jobs:
+            return f"ran {worker.jobs_run} jobs"
+        if self._worker_max_rss_mb and worker.rss_mb is not None and worker.rss_mb > self._worker_max_rss_mb:
+            return f"holding {worker.rss_mb:.0f} MB"
+        return None
+
+    def _retire_worker(self, worker):
+        """Forget a stopped worker; with preloading on, start its replacement so the model is ready again."""
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            if (self._preload_config is not None and worker.generation == self._worker_generation
+                    and not self._idle_workers):
+                self._idle_workers.append(self._start_worker())
+
+    def preload(self, model_config):
+        """Preload a model in the worker processes, which are the ones clustering uses.
+
+        Starts an idle worker for it when none is running. Workers started
+        later preload it too.
+        """
+        with self._lock:
+            self._preload_config = dict(model_config)
+            if not self._workers:
+                self._idle_workers.append(self._start_worker())
+                return
+            for worker in self._workers:
+                worker.preload(self._preload_config)
+
+    def test_model(self, model_config):
+        """Test a model in an idle worker process, which keeps it loaded for clustering.
+
+        Returns the dict of ModelManager.test(); raises RuntimeError when the
+        test fails or the worker dies.
+        """
+        worker = self._take_worker()
+        kind, payload = worker.test_model(model_config)
+        if kind is None:
+            worker.stop(terminate=True)
+            self._retire_worker(worker)
+            raise RuntimeError(f"聚类工作进程异常退出 (exit code {worker.process.exitcode})")
+        self._release_worker(worker)
+        if kind == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    def model_status(self):
+        """Preload state and cached models reported by a worker process, or None when no worker runs."""
+        with self._lock:
+            for worker in self._workers:
+                if worker.model_status is not None:
+                    return dict(worker.model_status)
+        return None
+
+    def _finish(self, state, status, result=None, error=None):
+        """Record a job's final state. Caller holds _lock."""
+        state["status"] = status
+        state["result"] = result
+        state["error"] = error
+        state["progress"] = ""
+        state["detail"] = ""
+        state["finished_at"] = datetime.now().isoformat()
+        if state["start_time"]:
+            state["elapsed_seconds"] = time.time() - state["start_time"]
+        if status == "completed":
+            state["overall_progress"] = 100
+        self._notify()
+        self._cancel_events.pop(state["job_id"], None)
+        self._write(
+            state["job_id"],
+            "UPDATE cluster_jobs SET status = ?, finished_at = ?, elapsed_seconds = ?, result = ?, error = ? "
+            "WHERE id = ?",
+            (status, state["finished_at"], state["elapsed_seconds"],
+             json.dumps(result) if result is not None else None, error, state["job_id"])
+        )
+
+        finished = [jid for jid, s in self._jobs.items() if s["status"] in TERMINAL_STATUSES]
+        for jid in finished[:-self.KEEP_FINISHED]:
+            del self._jobs[jid]
+
+    def _notify(self):
+        """Record a state change and wake wait_for_change() callers. Caller holds _lock."""
+        self._version += 1
+        self._changed.notify_all()
+
+    def wait_for_change(self, since_version, timeout):
+        """Block until the queue state changes after since_version, or timeout seconds pass.
+
+        Returns the current version; it equals since_version on timeout.
+        """
+        with self._lock:
+            self._changed.wait_for(lambda: self._version != since_version, timeout=timeout)
+            return self._version
+
+    def _write(self, job_id, sql, params):
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(sql, params)
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error("Failed to persist clustering job #%d: %s", job_id, e)
+
+    def _snapshot(self, state):
+        """Public copy of a job state, with its position in the queue."""
+        job = {k: v for k, v in state.items() if k != "start_time"}
+        job["elapsed_seconds"] = round(job["elapsed_seconds"] or 0, 1)
+        job["queue_position"] = None
+        if state["status"] == "queued":
+            queued = [jid for jid, s in self._jobs.items() if s["status"] == "queued"]
+            job["queue_position"] = queued.index(state["job_id"]) + 1
+        return job
+
+    def get(self, job_id):
+        """Return the state of a job, or None if it does not exist."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is not None:
+                return self._snapshot(state)
+
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM cluster_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return self._snapshot(self._state_from_row(row))
+
+    def latest(self):
+        """Return the job the single-task status view should show.
+
+        That is the oldest running job, or else the most recently submitted one.
+        """
+        with self._lock:
+            for state in self._jobs.values():
+                if state["status"] == "running":
+                    return self._snapshot(state)
+            if self._jobs:
+                return self._snapshot(next(reversed(self._jobs.values())))
+
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM cluster_jobs ORDER BY id DESC LIMIT 1").fetchone()
+        finally:
+            conn.close()
+        return self._snapshot(self._state_from_row(row)) if row else None
+
+    def list_jobs(self, limit=20):
+        """Return the most recent jobs, newest first."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM cluster_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+
+        with self._lock:
+            return [
+                self._snapshot(self._jobs[r['id']]) if r['id'] in self._jobs else
+                self._snapshot(self._state_from_row(r))
+                for r in rows
+            ]
+
+    def active_job_ids(self):
+        """Ids of queued and running jobs."""
+        with self._lock:
+            return [jid for jid, s in self._jobs.items() if s["status"] not in TERMINAL_STATUSES]
+
+    def counts(self):
+        """Number of queued and running jobs."""
+        with self._lock:
+            statuses = [s["status"] for s in self._jobs.values()]
+        return {"queued": statuses.count("queued"), "running": statuses.count("running")}
@@ -1,34 +1,192 @@
+import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
 
+def build_model_config(settings, builtin_model_path):
+    """Assemble a ModelManager config dict from stored settings.
+
+    Args:
+        settings: dict of setting key -> value (as stored in the settings table)
+        builtin_model_path: path of the bundled model directory
+    """
+    return {
+        "model_type": settings.get("model_type") or "builtin",
+        "model_path": settings.get("model_path", ""),
+        "api_url": settings.get("api_url", ""),
+        "api_key": settings.get("api_key", ""),
+        "api_model_name": settings.get("api_model_name", ""),
+        "tfidf_max_features": settings.get("tfidf_max_features", ""),
+        "builtin_model_path": builtin_model_path,
+    }
+
+
 class ModelManager:
-    """Singleton-like manager that holds the current embedding model."""
+    """Keeps recently used embedding models loaded, keyed by their config.
+
+    Models are held in an LRU cache bounded by a model count and a memory
+    budget. Entries idle for longer than idle_timeout are released by a
+    background sweeper, except while pinned by a running job (see use_model).
+    """
+
+    _models = OrderedDict()  # config key -> {"model", "config", "last_used", "pins"}
+    _current_key = None
+    _lock = threading.RLock()
+
+    max_models = 2
+    max_bytes = 0  # 0 = unlimited
+    idle_timeout = 0  # seconds, 0 = never
+    _sweeper = None
+
+    # Where TF-IDF models persist their fitted vocabulary, and when they refit it
+    tfidf_state_dir = None
+    tfidf_refit_drift = 0.05
+
+    # Background preload state, exposed through /api/settings/model-status
+    _preload_thread = None
+    _preload_state = {
+        "status": "idle",  # idle | loading | ready | error
+        "model_name": "",
+        "load_seconds": 0,
+        "error": None,
+    }
+
+    @classmethod
+    def configure(cls, max_models=2, max_bytes=0, idle_timeout=0, tfidf_state_dir=None, tfidf_refit_drift=0.05):
+        """Set cache limits and start the idle sweeper if needed."""
+        with cls._lock:
+            cls.tfidf_state_dir = tfidf_state_dir
+            cls.tfidf_refit_drift = tfidf_refit_drift
+            cls.max_models = max(1, int(max_models))
+            cls.max_bytes = max(0, int(max_bytes))
+            cls.idle_timeout = max(0, int(idle_timeout))
+            if cls.idle_timeout and (cls._sweeper is None or not cls._sweeper.is_alive()):
+                cls._sweeper = threading.Thread(target=cls._sweep_loop, name="model-sweeper", daemon=True)
+                cls._sweeper.start()
 
-    _instance = None
-    _current_config = {}
+    @staticmethod
+    def _config_key(config):
+        return json.dumps(config, sort_keys=True)
 
     @classmethod
     def get_model(cls, config=None):
-        """Get the current model. If config differs from current, recreate.
+        """Get a cached model for config, creating it on a cache miss.
+
+        Without config, return the most recently requested model.
 
         Args:
             config: dict with keys: model_type, model_path, api_url, api_key,
                     api_model_name, builtin_model_path
         """
-        if config and config != cls._current_config:
-            cls._instance = cls.create_model(config)
-            cls._current_config = config.copy()
+        with cls._lock:
+            key = cls._config_key(config) if config else cls._current_key
+            entry = cls._models.get(key) if key else None
+
+            if entry is None:
+                if not config:
+                    raise RuntimeError("No embedding model configured. Please go to Settings to configure a model.")
+                entry = {
+                    "model": cls.create_model(config),
+                    "config": config.copy(),
+                    "last_used": time.time(),
+                    "pins": 0,
+                }
+                cls._models[key] = entry
+                logger.info("Model cache miss, created %s (%d cached)",
+                            entry["model"].model_name, len(cls._models))
 
-        if cls._instance is None:
-            if config:
-                cls._instance = cls.create_model(config)
-                cls._current_config = config.copy()
-            else:
-                raise RuntimeError("No embedding model configured. Please go to Settings to configure a model.")
+            cls._models.move_to_end(key)
+            entry["last_used"] = time.time()
+            cls._current_key = key
+            cls._enforce_budget()
+            return entry["model"]
 
-        return cls._instance
+    @classmethod
+    @contextmanager
+    def use_model(cls, config):
+        """Pin a cached model for the duration of a job so the sweeper leaves it alone."""
+        model = cls.get_model(config)
+        key = cls._config_key(config)
+        with cls._lock:
+            entry = cls._models.get(key)
+            if entry is not None:
+                entry["pins"] += 1
+        try:
+            yield model
+        finally:
+            with cls._lock:
+                if entry is not None:
+                    entry["pins"] -= 1
+                    entry["last_used"] = time.time()
+                cls._enforce_budget()
+
+    @classmethod
+    def _enforce_budget(cls):
+        """Evict least recently used, unpinned models until within limits. Caller holds _lock."""
+        def over_budget():
+            if len(cls._models) > cls.max_models:
+                return True
+            if cls.max_bytes:
+                return sum(e["model"].memory_bytes() for e in cls._models.values()) > cls.max_bytes
+            return False
+
+        for key in list(cls._models.keys()):
+            if not over_budget():
+                break
+            entry = cls._models[key]
+            if key == cls._current_key or entry["pins"] > 0:
+                continue
+            cls._evict(key, "LRU budget")
+
+    @classmethod
+    def _evict(cls, key, reason):
+        entry = cls._models.pop(key)
+        if key == cls._current_key:
+            cls._current_key = None
+        logger.info("Evicted %s from model cache (%s, %.0f MB)",
+                    entry["model"].model_name, reason, entry["model"].memory_bytes() / 1024 / 1024)
+
+    @classmethod
+    def evict_idle(cls):
+        """Release models that have not been used for idle_timeout seconds."""
+        if not cls.idle_timeout:
+            return
+        now = time.time()
+        with cls._lock:
+            for key, entry in list(cls._models.items()):
+                if entry["pins"] == 0 and now - entry["last_used"] > cls.idle_timeout:
+                    cls._evict(key, "idle")
+            cls._enforce_budget()
+
+    @classmethod
+    def _sweep_loop(cls):
+        while True:
+            time.sleep(max(5, min(60, cls.idle_timeout // 4 or 60)))
+            try:
+                cls.evict_idle()
+            except Exception as e:
+                logger.error("Model cache sweep failed: %s", e, exc_info=True)
+
+    @classmethod
+    def cached_models(cls):
+        """Return a summary of the models currently held in the cache."""
+        now = time.time()
+        with cls._lock:
+            return [
+                {
+                    "model_name": e["model"].model_name,
+                    "model_type": e["config"].get("model_type", ""),
+                    "memory_mb": round(e["model"].memory_bytes() / 1024 / 1024, 1),
+                    "idle_seconds": round(now - e["last_used"], 1),
+                    "current": key == cls._current_key,
+                }
+                for key, e in cls._models.items()
+            ]
 
     @classmethod
     def create_model(cls, config):
@@ -63,15 +221,106 @@ class ModelManager:
             return OnlineAPIEmbeddingModel(api_url, api_key, api_model_name)
 
         elif model_type == "tfidf":
-            from app.clustering.embedding_tfidf import TfidfEmbeddingModel
-            return TfidfEmbeddingModel()
+            from app.clustering.embedding_tfidf import TfidfEmbeddingModel, DEFAULT_MAX_FEATURES
+            max_features = int(config.get("tfidf_max_features") or DEFAULT_MAX_FEATURES)
+            return TfidfEmbeddingModel(
+                max_features=max_features,
+                state_dir=cls.tfidf_state_dir,
+                refit_drift=cls.tfidf_refit_drift,
+            )
 
         else:
             raise ValueError(f"Unknown model type: {model_type}")
 
+    @classmethod
+    def test(cls, config):
+        """Encode a sample text with config's model; returns its dimension and name.
+
+        The model is loaded through the cache, so a successful test leaves it
+        ready for clustering in this process.
+        """
+        if config["model_type"] == "tfidf":
+            # Cheap to build, and a probe encode needs no vocabulary of the cached instance
+            model = cls.create_model(config)
+        else:
+            model = cls.get_model(config)
+        result = model.encode(["This is a test sentence."])
+        dim = result.shape[1] if len(result.shape) > 1 else len(result[0])
+        return {"dimension": int(dim), "model_name": model.model_name}
+
+    @classmethod
+    def preload(cls, config, background=True):
+        """Load and warm up the configured model in a background thread.
+
+        Loading is single-flight: a clustering run that calls get_model()/load()
+        while the preload is in progress waits for it instead of loading a second copy.
+        With background=False the model is loaded in the calling thread.
+        """
+        with cls._lock:
+            cls._preload_state = {
+                "status": "loading",
+                "model_name": "",
+                "load_seconds": 0,
+                "error": None,
+            }
+            if background:
+                cls._preload_thread = threading.Thread(
+                    target=cls._preload_worker,
+                    args=(config.copy(),),
+                    name="model-preload",
+                    daemon=True
+                )
+                cls._preload_thread.start()
+        if not background:
+            cls._preload_worker(config.copy())
+
+    @classmethod
+    def _preload_worker(cls, config):
+        t0 = time.time()
+        try:
+            model = cls.get_model(config)
+            logger.info("Preloading embedding model: %s", model.model_name)
+            model.load()
+            model.warm_up()
+            load_seconds = time.time() - t0
+            with cls._lock:
+                if cls._models.get(cls._config_key(config), {}).get("model") is not model:
+                    # Evicted or released while loading; this instance is already stale
+                    return
+                cls._enforce_budget()
+                cls._preload_state = {
+                    "status": "ready",
+                    "model_name": model.model_name,
+                    "load_seconds": round(load_seconds, 2),
+                    "error": None,
+                }
+            logger.info("Embedding model preloaded and warmed up in %.2fs", load_seconds)
+        except Exception as e:
+            logger.error("Model preload failed: %s", e, exc_info=True)
+            with cls._lock:
+                cls._preload_state = {
+                    "status": "error",
+                    "model_name": "",
+                    "load_seconds": round(time.time() - t0, 2),
+                    "error": str(e),
+                }
+
+    @classmethod
+    def get_status(cls):
+        """Return a copy of the background preload state."""
+        with cls._lock:
+            return dict(cls._preload_state)
+
     @classmethod
     def release(cls):
-        """Release the model from memory."""
-        cls._instance = None
-        cls._current_config = {}
-        logger.info("Model released from memory")
+        """Release all cached models from memory."""
+        with cls._lock:
+            cls._models.clear()
+            cls._current_key = None
+            cls._preload_state = {
+                "status": "idle",
+                "model_name": "",
+                "load_seconds": 0,
+                "error": None,
+            }
+        logger.info("All cached models released from memory")
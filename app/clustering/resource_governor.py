@@ -0,0 +1,180 @@
+"""CPU thread limits for torch and BLAS while a clustering job runs."""
+
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus():
+    """Number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+class ResourceGovernor:
+    """Caps the threads torch and the BLAS libraries use during each clustering phase.
+
+    reserve_cores are kept free for request handling; the remaining cores
+    (or `threads`, if set lower) form the job's thread budget. Embedding runs
+    with torch intra-op threads and BLAS threads set to the budget (and a
+    single torch inter-op thread), the similarity/DBSCAN phase with the BLAS
+    thread count picked by the probe benchmark when auto_tune is on, and
+    every other phase single-threaded.
+    Limits are applied through threadpoolctl and torch.set_num_threads and
+    restored when the phase ends.
+    """
+
+    PROBE_THREADS = (1, 2, 4, 8, 16, 32)
+    PROBE_SHAPE = (1024, 4096, 384)  # tile rows x block rows x embedding dim, as in the tiled similarity graph
+    PROBE_TOLERANCE = 1.10  # use the fewest threads within 10% of the fastest
+
+    _interop_limited = False
+
+    def __init__(self, threads=0, reserve_cores=1, auto_tune=False, tune_path=None):
+        cpus = available_cpus()
+        budget = max(1, cpus - max(0, int(reserve_cores)))
+        if threads and int(threads) > 0:
+            budget = min(budget, int(threads))
+        self.cpus = cpus
+        self.budget = budget
+        self.auto_tune = auto_tune
+        self.tune_path = tune_path
+        self._blas_threads = None
+
+    @classmethod
+    def from_settings(cls, settings, reserve_cores=1, tune_path=None):
+        """Build a governor from the settings table (cpu_threads, cpu_reserve_cores, cpu_auto_tune)."""
+        reserve = settings.get("cpu_reserve_cores")
+        return cls(
+            threads=int(settings.get("cpu_threads") or 0),
+            reserve_cores=int(reserve) if reserve not in (None, "") else reserve_cores,
+            auto_tune=settings.get("cpu_auto_tune") == "1",
+            tune_path=tune_path,
+        )
+
+    def threads_for(self, phase):
+        """(torch threads, BLAS threads) for a clustering phase."""
+        if phase in ("model_loading", "embedding"):
+            return self.budget, self.budget
+        if phase == "clustering":
+            return 1, self.blas_threads()
+        return 1, 1
+
+    def blas_threads(self):
+        """BLAS threads for the similarity/DBSCAN phase: tuned if auto_tune is on, else the budget."""
+        if self._blas_threads is None:
+            self._blas_threads = self._tuned_blas_threads() if self.auto_tune else self.budget
+        return self._blas_threads
+
+    @contextmanager
+    def phase(self, name):
+        """Apply this phase's thread limits for the duration of the with-block."""
+        torch_threads, blas_threads = self.threads_for(name)
+        torch = sys.modules.get("torch")  # only limit torch if a model already imported it
+        previous_torch = None
+        if torch is not None:
+            self._limit_torch_interop(torch)
+            previous_torch = torch.get_num_threads()
+            torch.set_num_threads(torch_threads)
+
+        limiter = _blas_limits(blas_threads)
+        try:
+            logger.debug("Phase %s: torch threads=%s, BLAS threads=%d",
+                         name, torch_threads if torch is not None else "-", blas_threads)
+            yield
+        finally:
+            if limiter is not None:
+                limiter.restore_original_limits()
+            if previous_torch is not None:
+                torch.set_num_threads(previous_torch)
+
+    @classmethod
+    def _limit_torch_interop(cls, torch):
+        """Use a single inter-op thread; torch only allows this once per process."""
+        if cls._interop_limited:
+            return
+        cls._interop_limited = True
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            logger.debug("torch inter-op threads already fixed for this process")
+
+    def _tuned_blas_threads(self):
+        """Return the cached probe result for this machine, running the probe on first use."""
+        import numpy as np
+
+        cached = self._load_tuning()
+        if cached is not None:
+            return cached
+
+        candidates = sorted({t for t in self.PROBE_THREADS if t < self.budget} | {self.budget})
+        rows, block, dim = self.PROBE_SHAPE
+        rng = np.random.default_rng(0)
+        a = rng.standard_normal((rows, dim), dtype=np.float32)
+        b = rng.standard_normal((block, dim), dtype=np.float32)
+
+        timings = {}
+        for threads in candidates:
+            limiter = _blas_limits(threads)
+            try:
+                np.dot(a, b.T)  # warm up the thread pool
+                best = float("inf")
+                for _ in range(3):
+                    t0 = time.perf_counter()
+                    np.dot(a, b.T)
+                    best = min(best, time.perf_counter() - t0)
+                timings[threads] = best
+            finally:
+                if limiter is not None:
+                    limiter.restore_original_limits()
+
+        fastest = min(timings.values())
+        chosen = min(t for t, secs in timings.items() if secs <= fastest * self.PROBE_TOLERANCE)
+        logger.info("CPU probe: BLAS threads %s -> %s ms, using %d",
+                    list(timings), [round(s * 1000, 1) for s in timings.values()], chosen)
+        self._save_tuning(chosen, timings)
+        return chosen
+
+    def _load_tuning(self):
+        if not self.tune_path or not os.path.exists(self.tune_path):
+            return None
+        try:
+            with open(self.tune_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("cpus") != self.cpus or state.get("budget") != self.budget:
+            return None
+        return int(state["blas_threads"])
+
+    def _save_tuning(self, blas_threads, timings):
+        if not self.tune_path:
+            return
+        os.makedirs(os.path.dirname(self.tune_path), exist_ok=True)
+        state = {
+            "cpus": self.cpus,
+            "budget": self.budget,
+            "blas_threads": blas_threads,
+            "timings_ms": {str(t): round(s * 1000, 2) for t, s in timings.items()},
+            "tuned_at": datetime.now().isoformat(),
+        }
+        tmp_path = self.tune_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.tune_path)
+
+
+def _blas_limits(threads):
+    """Limit BLAS/OpenMP thread pools to `threads`; returns the limiter to restore, or None."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return None
+    return threadpool_limits(limits=threads)
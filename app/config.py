@@ -20,5 +20,84 @@ class Config:
     DEFAULT_SIMILARITY_THRESHOLD = 0.80
     MIN_SAMPLES = 2
 
+    # Load and warm up the configured embedding model in the background at startup.
+    # Overridden by the "preload_model" setting when it is set.
+    PRELOAD_MODEL = False
+
+    # Embedding model cache: how many models stay loaded, their combined size
+    # budget (0 = unlimited) and how long an unused model stays resident (0 = forever)
+    MODEL_CACHE_MAX_MODELS = 2
+    MODEL_CACHE_MAX_MB = 4096
+    MODEL_IDLE_TIMEOUT_SECONDS = 1800
+
+    # Persisted TF-IDF vocabulary; refit when the corpus out-of-vocabulary
+    # n-gram rate rises more than TFIDF_REFIT_DRIFT above the rate at fit time
+    TFIDF_STATE_DIR = os.path.join(BASE_DIR, "data", "tfidf")
+    TFIDF_REFIT_DRIFT = 0.05
+
+    # Memory-mapped embedding store used when the "out_of_core" setting is on
+    EMBEDDING_STORE_DIR = os.path.join(BASE_DIR, "data", "embeddings")
+
+    # Clustering job queue: jobs running at once, and how many may wait (0 = unlimited)
+    CLUSTER_MAX_CONCURRENT_JOBS = 1
+    CLUSTER_MAX_QUEUED_JOBS = 20
+
+    # Run clustering jobs in a long-lived worker process that keeps its loaded
+    # models between jobs, instead of a thread inside the web server process.
+    # The worker is replaced after a cancelled job or a crash.
+    CLUSTER_WORKER_PROCESS = True
+
+    # Replace the worker after this many jobs, or after a job that leaves it
+    # holding more than this much memory (embedding buffers, numpy/sklearn
+    # arenas), so a large run's peak is returned to the system. The new worker
+    # loads the model again. 0 = no limit.
+    CLUSTER_WORKER_MAX_JOBS = 20
+    CLUSTER_WORKER_MAX_RSS_MB = 4096
+
+    # /api/cluster/events: minimum seconds between progress events (changes in
+    # between are coalesced) and keep-alive interval while nothing changes
+    CLUSTER_EVENTS_MIN_INTERVAL = 0.5
+    CLUSTER_EVENTS_KEEPALIVE = 15
+
+    # Open /api/cluster/events streams allowed at once. Each holds a server
+    # worker thread for as long as it is open; clients over the limit get a
+    # 503 and poll /api/cluster/status instead. run.py --headless lowers it
+    # to leave at least half of the waitress threads for other requests.
+    CLUSTER_EVENTS_MAX_STREAMS = 4
+
+    # Per-job checkpoints (embedding batches, DBSCAN labels). A job interrupted
+    # by a server restart is requeued at startup and resumes from them.
+    CLUSTER_CHECKPOINTS = True
+    CHECKPOINT_DIR = os.path.join(BASE_DIR, "data", "checkpoints")
+
+    # Clustering thread limits: cores kept free for request handling unless the
+    # "cpu_reserve_cores" setting says otherwise, and where the probe result is kept
+    CPU_RESERVE_CORES = 1
+    CPU_TUNE_PATH = os.path.join(BASE_DIR, "data", "cpu_tune.json")
+
+    # run.py listen address; --headless serves with waitress using SERVER_THREADS
+    # worker threads and at most SERVER_CONNECTION_LIMIT open connections.
+    # Each open /api/cluster/events stream holds one worker thread.
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 5000
+    SERVER_THREADS = 8
+    SERVER_CONNECTION_LIMIT = 200
+
+    # SQLite connections: idle connections kept for reuse between requests,
+    # prepared statements cached per connection, page cache per connection
+    # and how much of the database file is memory-mapped
+    SQLITE_POOL_SIZE = 8
+    SQLITE_CACHED_STATEMENTS = 256
+    SQLITE_CACHE_SIZE_KB = 16384
+    SQLITE_MMAP_SIZE_MB = 256
+
+    # Sample steps cached per (history, cluster) for case detail siblings;
+    # oldest clusters are dropped beyond this many
+    CLUSTER_SAMPLE_CACHE_SIZE = 4096
+
+    # Serialized cluster list/detail/summary/history responses kept in memory,
+    # keyed by URL and data version; least recently used dropped beyond this size
+    RESPONSE_CACHE_MAX_MB = 64
+
     SECRET_KEY = "testcase-cluster-tool-secret-key"
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
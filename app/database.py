@@ -1,8 +1,10 @@
 import os
 import sqlite3
 import logging
+import threading
+from datetime import datetime
 
-from flask import g, current_app
+from app.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +59,18 @@ CREATE TABLE IF NOT EXISTS cluster_info (
     PRIMARY KEY (cluster_id, history_id)
 );
 
+CREATE TABLE IF NOT EXISTS cluster_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    params TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    elapsed_seconds REAL,
+    result TEXT,
+    error TEXT
+);
+
 CREATE TABLE IF NOT EXISTS settings (
     key TEXT PRIMARY KEY,
     value TEXT
@@ -68,6 +82,7 @@ CREATE INDEX IF NOT EXISTS idx_cluster_results_cluster_id ON cluster_results(clu
 CREATE INDEX IF NOT EXISTS idx_cluster_results_history ON cluster_results(history_id);
 CREATE INDEX IF NOT EXISTS idx_cluster_info_history ON cluster_info(history_id);
 CREATE INDEX IF NOT EXISTS idx_cluster_history_current ON cluster_history(is_current);
+CREATE INDEX IF NOT EXISTS idx_cluster_jobs_status ON cluster_jobs(status);
 """
 
 MIGRATION_SQL = """
@@ -78,36 +93,189 @@ ALTER TABLE cluster_info ADD COLUMN history_id INTEGER REFERENCES cluster_histor
 """
 
 
+def connect(db_path, timeout=5.0, check_same_thread=True, cached_statements=None, cache_size_kb=None,
+            mmap_size_mb=None):
+    """Open a connection with Row results, a larger statement cache and the performance pragmas.
+
+    The statement cache, page cache and memory map sizes default to the
+    SQLITE_* values of Config.
+    """
+    if cached_statements is None:
+        cached_statements = Config.SQLITE_CACHED_STATEMENTS
+    if cache_size_kb is None:
+        cache_size_kb = Config.SQLITE_CACHE_SIZE_KB
+    if mmap_size_mb is None:
+        mmap_size_mb = Config.SQLITE_MMAP_SIZE_MB
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread,
+                           cached_statements=cached_statements)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL; only the last commits can be lost on power failure
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_size_kb)}")
+    conn.execute(f"PRAGMA mmap_size={int(mmap_size_mb) * 1024 * 1024}")
+    return conn
+
+
+class ConnectionPool:
+    """Reuses tuned connections across requests instead of opening one per request.
+
+    A request checks a connection out in get_db() and returns it at teardown,
+    so a connection is only ever used by one thread at a time. Connections are
+    not tied to a thread: the development server starts a thread per request,
+    so per-thread connections would never be reused there. Up to max_idle
+    connections per database are kept open between requests.
+    init_db() configures it from the app config.
+    """
+
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self.connect_options = {}  # cached_statements, cache_size_kb, mmap_size_mb for connect()
+        self._idle = {}  # db path -> [connection], most recently returned last
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "reused": 0, "closed": 0, "in_use": 0}
+
+    def configure(self, max_idle, **connect_options):
+        """Set the idle limit and the connect() options of new connections; idle connections are closed."""
+        with self._lock:
+            self.max_idle = max_idle
+            self.connect_options = connect_options
+        self.close_all()
+
+    def acquire(self, db_path):
+        with self._lock:
+            idle = self._idle.get(db_path)
+            conn = idle.pop() if idle else None
+            self._stats["in_use"] += 1
+            if conn is not None:
+                self._stats["reused"] += 1
+                return conn
+            self._stats["opened"] += 1
+        try:
+            return connect(db_path, check_same_thread=False, **self.connect_options)
+        except Exception:
+            with self._lock:
+                self._stats["opened"] -= 1
+                self._stats["in_use"] -= 1
+            raise
+
+    def release(self, db_path, conn):
+        if conn.in_transaction:
+            conn.rollback()  # never hand the next request an open transaction
+        with self._lock:
+            self._stats["in_use"] -= 1
+            idle = self._idle.setdefault(db_path, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+            self._stats["closed"] += 1
+        conn.close()
+
+    def close_all(self):
+        """Close every idle connection (connections in use are closed when returned)."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self._stats["closed"] += sum(len(conns) for conns in idle.values())
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "idle": sum(len(conns) for conns in self._idle.values()),
+                "max_idle": self.max_idle,
+                "cached_statements": self.connect_options.get("cached_statements", Config.SQLITE_CACHED_STATEMENTS),
+            }
+
+
+pool = ConnectionPool(max_idle=Config.SQLITE_POOL_SIZE)
+
+
 def get_db():
+    # Flask is imported here so the CLI can use this module without it
+    from flask import g, current_app
+
     if 'db' not in g:
-        g.db = sqlite3.connect(current_app.config['DATABASE_PATH'])
-        g.db.row_factory = sqlite3.Row
-        g.db.execute("PRAGMA journal_mode=WAL")
-        g.db.execute("PRAGMA foreign_keys=ON")
+        g.db_path = current_app.config['DATABASE_PATH']
+        g.db = pool.acquire(g.db_path)
     return g.db
 
 
 def close_db(e=None):
+    from flask import g
+
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        pool.release(g.pop('db_path'), db)
 
 
 def init_db(app):
     db_path = app.config['DATABASE_PATH']
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    pool.configure(
+        max_idle=app.config['SQLITE_POOL_SIZE'],
+        cached_statements=app.config['SQLITE_CACHED_STATEMENTS'],
+        cache_size_kb=app.config['SQLITE_CACHE_SIZE_KB'],
+        mmap_size_mb=app.config['SQLITE_MMAP_SIZE_MB'],
+    )
+    # Registered first so the connection used for the schema goes back to the pool too
+    app.teardown_appcontext(close_db)
     with app.app_context():
-        db = get_db()
-        db.executescript(SCHEMA_SQL)
-        # Run migrations for existing databases
-        _run_migrations(db)
-        db.commit()
+        init_schema(get_db())
         logger.info("Database initialized at %s", db_path)
-    app.teardown_appcontext(close_db)
 
 
-def _run_migrations(db):
-    """Apply schema migrations for existing databases."""
+def init_schema(db):
+    """Apply the schema migrations this database has not seen yet.
+
+    Takes a plain sqlite3 connection so tools that run without the Flask app
+    (cli.py) can prepare a database the same way init_db does. Each applied
+    migration is recorded in schema_version; a database already at
+    SCHEMA_VERSION costs a single query.
+    """
+    current = _schema_version(db)
+    if current >= SCHEMA_VERSION:
+        logger.debug("Database schema is current (version %d)", current)
+        return
+
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT NOT NULL)"
+    )
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            migrate(db)
+            db.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now().isoformat())
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.error("Schema migration %d (%s) failed", version, description, exc_info=True)
+            raise
+        logger.info("Applied schema migration %d: %s", version, description)
+
+
+def _schema_version(db):
+    table = db.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='schema_version'"
+    ).fetchone()
+    if not table:
+        return 0
+    return db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def _migrate_baseline(db):
+    """Version 1: SCHEMA_SQL, plus the cluster history columns for databases created before it.
+
+    The columns are added first: SCHEMA_SQL indexes them.
+    """
     # Check if cluster_history table exists
     table_check = db.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='cluster_history'"
@@ -142,6 +310,300 @@ def _run_migrations(db):
         except Exception:
             pass
 
+    db.executescript(SCHEMA_SQL)
+
+
+def _migrate_history_indexes(db):
+    """Version 2: composite indexes for queries scoped to one clustering history.
+
+    Cluster detail, siblings and export look up (history_id, cluster_id) and
+    read step_id; case detail and the case export join on (history_id, step_id)
+    and read the cluster id and label; cluster lists order a history's clusters
+    by step_count. The single-column history and case_id indexes are prefixes
+    of these and are dropped.
+    """
+    db.execute("CREATE INDEX IF NOT EXISTS idx_cluster_results_history_cluster "
+               "ON cluster_results(history_id, cluster_id, step_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_cluster_results_history_step "
+               "ON cluster_results(history_id, step_id, cluster_id, cluster_label)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_cluster_info_history_size "
+               "ON cluster_info(history_id, step_count DESC)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_test_steps_case_step ON test_steps(case_id, step_no)")
+    db.execute("DROP INDEX IF EXISTS idx_cluster_results_history")
+    db.execute("DROP INDEX IF EXISTS idx_cluster_info_history")
+    db.execute("DROP INDEX IF EXISTS idx_test_steps_case_id")
+
+
+def _migrate_fulltext_search(db):
+    """Version 3: FTS5 trigram indexes over case titles and step operations.
+
+    The trigram tokenizer matches any substring of three or more characters,
+    so Chinese text needs no word segmentation. Both are external-content
+    tables (the text is not stored twice) kept in sync by triggers;
+    test_cases_fts is keyed by the test_cases rowid, test_steps_fts by
+    test_steps.id. test_cases has no INTEGER PRIMARY KEY, so a manual VACUUM
+    can renumber its rowids; run INSERT INTO test_cases_fts (test_cases_fts)
+    VALUES ('rebuild') after one.
+    """
+    db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS test_cases_fts USING fts5("
+               "title, content='test_cases', content_rowid='rowid', tokenize='trigram')")
+    db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS test_steps_fts USING fts5("
+               "operation, content='test_steps', content_rowid='id', tokenize='trigram')")
+    db.executescript("""
+        CREATE TRIGGER IF NOT EXISTS test_cases_fts_insert AFTER INSERT ON test_cases BEGIN
+            INSERT INTO test_cases_fts (rowid, title) VALUES (new.rowid, new.title);
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_cases_fts_delete AFTER DELETE ON test_cases BEGIN
+            INSERT INTO test_cases_fts (test_cases_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_cases_fts_update AFTER UPDATE OF title ON test_cases BEGIN
+            INSERT INTO test_cases_fts (test_cases_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            INSERT INTO test_cases_fts (rowid, title) VALUES (new.rowid, new.title);
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_steps_fts_insert AFTER INSERT ON test_steps BEGIN
+            INSERT INTO test_steps_fts (rowid, operation) VALUES (new.id, new.operation);
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_steps_fts_delete AFTER DELETE ON test_steps BEGIN
+            INSERT INTO test_steps_fts (test_steps_fts, rowid, operation) VALUES ('delete', old.id, old.operation);
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_steps_fts_update AFTER UPDATE OF operation ON test_steps BEGIN
+            INSERT INTO test_steps_fts (test_steps_fts, rowid, operation) VALUES ('delete', old.id, old.operation);
+            INSERT INTO test_steps_fts (rowid, operation) VALUES (new.id, new.operation);
+        END;
+    """)
+    db.execute("INSERT INTO test_cases_fts (test_cases_fts) VALUES ('rebuild')")
+    db.execute("INSERT INTO test_steps_fts (test_steps_fts) VALUES ('rebuild')")
+
+
+def _migrate_denormalized_counts(db):
+    """Version 4: test_cases.step_count and per-source totals in source_stats.
+
+    Triggers keep both current on every insert and delete, whichever code path
+    runs it (imports, the delete endpoints, ON DELETE CASCADE): a step changes
+    its case's step_count, and that change is carried into its source's row.
+    Cases without a source file are counted under source_file ''. A source's
+    row is removed with its last case; last_import_time is the most recent
+    import into that source.
+    """
+    cols = [row[1] for row in db.execute("PRAGMA table_info(test_cases)").fetchall()]
+    if 'step_count' not in cols:
+        db.execute("ALTER TABLE test_cases ADD COLUMN step_count INTEGER NOT NULL DEFAULT 0")
+    db.execute("CREATE TABLE IF NOT EXISTS source_stats ("
+               "source_file TEXT PRIMARY KEY, case_count INTEGER NOT NULL DEFAULT 0, "
+               "step_count INTEGER NOT NULL DEFAULT 0, last_import_time TEXT)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_test_cases_step_count ON test_cases(step_count, id)")
+    db.executescript("""
+        CREATE TRIGGER IF NOT EXISTS test_steps_count_insert AFTER INSERT ON test_steps BEGIN
+            UPDATE test_cases SET step_count = step_count + 1 WHERE id = new.case_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_steps_count_delete AFTER DELETE ON test_steps BEGIN
+            UPDATE test_cases SET step_count = step_count - 1 WHERE id = old.case_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS test_steps_count_move AFTER UPDATE OF case_id ON test_steps BEGIN
+            UPDATE test_cases SET step_count = step_count - 1 WHERE id = old.case_id;
+            UPDATE test_cases SET step_count = step_count + 1 WHERE id = new.case_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS source_stats_case_insert AFTER INSERT ON test_cases BEGIN
+            INSERT INTO source_stats (source_file, case_count, step_count, last_import_time)
+            VALUES (COALESCE(new.source_file, ''), 1, new.step_count, new.import_time)
+            ON CONFLICT(source_file) DO UPDATE SET
+                case_count = case_count + 1,
+                step_count = step_count + excluded.step_count,
+                last_import_time = MAX(COALESCE(last_import_time, ''), COALESCE(excluded.last_import_time, ''));
+        END;
+        CREATE TRIGGER IF NOT EXISTS source_stats_case_delete AFTER DELETE ON test_cases BEGIN
+            UPDATE source_stats SET case_count = case_count - 1, step_count = step_count - old.step_count
+            WHERE source_file = COALESCE(old.source_file, '');
+            DELETE FROM source_stats WHERE source_file = COALESCE(old.source_file, '') AND case_count <= 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS source_stats_case_steps AFTER UPDATE OF step_count ON test_cases BEGIN
+            UPDATE source_stats SET step_count = step_count + new.step_count - old.step_count
+            WHERE source_file = COALESCE(new.source_file, '');
+        END;
+        CREATE TRIGGER IF NOT EXISTS source_stats_case_move AFTER UPDATE OF source_file ON test_cases
+        WHEN COALESCE(old.source_file, '') != COALESCE(new.source_file, '') BEGIN
+            UPDATE source_stats SET case_count = case_count - 1, step_count = step_count - old.step_count
+            WHERE source_file = COALESCE(old.source_file, '');
+            DELETE FROM source_stats WHERE source_file = COALESCE(old.source_file, '') AND case_count <= 0;
+            INSERT INTO source_stats (source_file, case_count, step_count, last_import_time)
+            VALUES (COALESCE(new.source_file, ''), 1, new.step_count, new.import_time)
+            ON CONFLICT(source_file) DO UPDATE SET
+                case_count = case_count + 1,
+                step_count = step_count + excluded.step_count;
+        END;
+    """)
+
+    # Backfill from the existing rows
+    db.execute("UPDATE test_cases SET step_count = "
+               "(SELECT COUNT(*) FROM test_steps WHERE test_steps.case_id = test_cases.id)")
+    db.execute("DELETE FROM source_stats")
+    db.execute("INSERT INTO source_stats (source_file, case_count, step_count, last_import_time) "
+               "SELECT COALESCE(source_file, ''), COUNT(*), SUM(step_count), MAX(import_time) "
+               "FROM test_cases GROUP BY COALESCE(source_file, '')")
+
+
+def _migrate_sort_indexes(db):
+    """Version 5: (column, id) indexes for every case browse sort order.
+
+    Keyset pagination seeks to the row after a cursor's (value, id) in one of
+    these instead of sorting the table and skipping OFFSET rows; step_count
+    has its index from version 4 and id is the primary key.
+    """
+    db.execute("CREATE INDEX IF NOT EXISTS idx_test_cases_title ON test_cases(title, id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_test_cases_source ON test_cases(source_file, id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_test_cases_import_time ON test_cases(import_time, id)")
+
+
+# json_each() over an extra_fields column, skipping NULL or malformed JSON
+_EXTRA_FIELDS_EACH = "json_each(CASE WHEN json_valid({0}) THEN {0} ELSE '{{}}' END)"
+
+
+def _migrate_extra_field_registry(db):
+    """Version 6: registry of extra_fields keys and a key/value table for faceted keys.
+
+    extra_field_keys counts, per scope ('case' or 'step'), how many rows carry
+    each key; triggers keep it current on insert and delete, so listing the
+    keys no longer parses every stored blob. Case keys marked faceted are
+    copied into case_field_values (one row per case and key), whose primary
+    key serves both value filters and facet counts.
+    """
+    db.execute("CREATE TABLE IF NOT EXISTS extra_field_keys ("
+               "scope TEXT NOT NULL, key TEXT NOT NULL, row_count INTEGER NOT NULL DEFAULT 0, "
+               "faceted INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (scope, key))")
+    db.execute("CREATE TABLE IF NOT EXISTS case_field_values ("
+               "key TEXT NOT NULL, value TEXT, "
+               "case_id TEXT NOT NULL REFERENCES test_cases(id) ON DELETE CASCADE, "
+               "PRIMARY KEY (key, value, case_id)) WITHOUT ROWID")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_case_field_values_case ON case_field_values(case_id)")
+
+    new_each = _EXTRA_FIELDS_EACH.format("new.extra_fields")
+    old_each = _EXTRA_FIELDS_EACH.format("old.extra_fields")
+    db.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS extra_field_keys_case_insert AFTER INSERT ON test_cases BEGIN
+            INSERT INTO extra_field_keys (scope, key, row_count)
+            SELECT 'case', j.key, 1 FROM {new_each} j WHERE true
+            ON CONFLICT(scope, key) DO UPDATE SET row_count = row_count + 1;
+            INSERT OR IGNORE INTO case_field_values (key, value, case_id)
+            SELECT j.key, j.value, new.id FROM {new_each} j
+            JOIN extra_field_keys k ON k.scope = 'case' AND k.key = j.key AND k.faceted = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS extra_field_keys_case_delete AFTER DELETE ON test_cases BEGIN
+            UPDATE extra_field_keys SET row_count = row_count - 1
+            WHERE scope = 'case' AND key IN (SELECT j.key FROM {old_each} j);
+        END;
+        CREATE TRIGGER IF NOT EXISTS extra_field_keys_step_insert AFTER INSERT ON test_steps BEGIN
+            INSERT INTO extra_field_keys (scope, key, row_count)
+            SELECT 'step', j.key, 1 FROM {new_each} j WHERE true
+            ON CONFLICT(scope, key) DO UPDATE SET row_count = row_count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS extra_field_keys_step_delete AFTER DELETE ON test_steps BEGIN
+            UPDATE extra_field_keys SET row_count = row_count - 1
+            WHERE scope = 'step' AND key IN (SELECT j.key FROM {old_each} j);
+        END;
+    """)
+
+    # Rebuild the counts from existing rows, keeping faceted flags
+    db.execute("UPDATE extra_field_keys SET row_count = 0")
+    for scope, table in (("case", "test_cases"), ("step", "test_steps")):
+        db.execute(
+            "INSERT INTO extra_field_keys (scope, key, row_count) "
+            f"SELECT ?, j.key, COUNT(*) FROM {table} t, {_EXTRA_FIELDS_EACH.format('t.extra_fields')} j "
+            "WHERE true GROUP BY j.key "
+            "ON CONFLICT(scope, key) DO UPDATE SET row_count = excluded.row_count",
+            (scope,)
+        )
+
+
+def _migrate_history_stale_flag(db):
+    """Version 7: cluster_history.stale, set when cases a history clustered are deleted.
+
+    Its cluster_info step and case counts then no longer match its results.
+    """
+    cols = [row[1] for row in db.execute("PRAGMA table_info(cluster_history)").fetchall()]
+    if 'stale' not in cols:
+        db.execute("ALTER TABLE cluster_history ADD COLUMN stale INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_data_version(db):
+    """Version 8: data_version, a single counter bumped by every data change.
+
+    Triggers bump it on imported, deleted or edited cases and on cluster
+    history inserts, updates (activation, the stale flag) and deletes, so
+    changes made by the clustering worker process and cli.py count too.
+    Responses built from this data are cached under the counter's value.
+    It starts at the creation time in seconds: a database deleted and
+    created again never repeats a version a client already holds. Version 9
+    replaces the triggers with one bump per write transaction.
+    """
+    db.execute("CREATE TABLE IF NOT EXISTS data_version ("
+               "id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    db.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, CAST(strftime('%s', 'now') AS INTEGER))")
+    db.executescript("""
+        CREATE TRIGGER IF NOT EXISTS data_version_case_insert AFTER INSERT ON test_cases BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_case_delete AFTER DELETE ON test_cases BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_case_update
+        AFTER UPDATE OF title, extra_fields, source_file ON test_cases BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_history_insert AFTER INSERT ON cluster_history BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_history_delete AFTER DELETE ON cluster_history BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_history_update AFTER UPDATE ON cluster_history BEGIN
+            UPDATE data_version SET version = version + 1;
+        END;
+    """)
+
+
+def _migrate_data_version_per_write(db):
+    """Version 9: drop the row-level data_version triggers.
+
+    They bumped the counter once per row, so a 20k-case import ran 20k extra
+    UPDATEs inside its transaction where one bump suffices. The code paths
+    that write cases or cluster history call bump_data_version() once per
+    transaction instead.
+    """
+    for trigger in ("data_version_case_insert", "data_version_case_delete", "data_version_case_update",
+                    "data_version_history_insert", "data_version_history_delete",
+                    "data_version_history_update"):
+        db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+# (version, description, function), in order. Migrations must be safe to
+# re-run: one interrupted before it was recorded runs again at next startup.
+MIGRATIONS = [
+    (1, "baseline schema", _migrate_baseline),
+    (2, "composite indexes for history-scoped queries", _migrate_history_indexes),
+    (3, "full-text search over case titles and step operations", _migrate_fulltext_search),
+    (4, "denormalized step and per-source counts", _migrate_denormalized_counts),
+    (5, "indexes for keyset pagination of cases", _migrate_sort_indexes),
+    (6, "extra field key registry and faceted case fields", _migrate_extra_field_registry),
+    (7, "stale flag for cluster history", _migrate_history_stale_flag),
+    (8, "data version counter", _migrate_data_version),
+    (9, "data version bumped once per write", _migrate_data_version_per_write),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_data_version(db):
+    """Current value of the data_version counter; any change to cases or cluster history raises it."""
+    return db.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+
+def bump_data_version(db):
+    """Raise the data_version counter, inside the transaction that changes cases or cluster history.
+
+    Call it once per such transaction, before its commit, from every code
+    path that writes them (the clustering worker process and cli.py included).
+    """
+    db.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+
 
 def get_setting(key, default=None):
     db = get_db()
@@ -0,0 +1,100 @@
+"""Flask application factory: the web server, not the headless CLI, imports this."""
+import os
+import sys
+import logging
+from flask import Flask, jsonify
+
+from app.config import Config
+from app.logger import setup_logging
+from app.database import init_db, get_db
+from app.routes import register_blueprints
+from app.routes.response_cache import init_response_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _get_resource_path(relative_path):
+    """Get path to bundled resource, works for dev and PyInstaller."""
+    if getattr(sys, 'frozen', False):
+        # PyInstaller puts data files in _internal/ (PyInstaller 6+)
+        base = sys._MEIPASS
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+        base = os.path.dirname(base)  # project root
+    return os.path.join(base, relative_path)
+
+
+def create_app(config_override=None):
+    template_dir = _get_resource_path(os.path.join('app', 'templates'))
+    static_dir = _get_resource_path('static')
+
+    app = Flask(
+        __name__,
+        template_folder=template_dir,
+        static_folder=static_dir,
+        static_url_path='/static'
+    )
+
+    app.config.from_object(Config)
+    if config_override:
+        app.config.update(config_override)
+
+    setup_logging(app)
+    init_db(app)
+    init_response_cache(app)
+    register_blueprints(app)
+    _start_cluster_jobs(app)
+    _start_model_preload(app)
+
+    @app.errorhandler(404)
+    def not_found(e):
+        if 'api' in str(getattr(e, 'description', '')):
+            return jsonify({"success": False, "error": "Not found"}), 404
+        return jsonify({"success": False, "error": "Page not found"}), 404
+
+    @app.errorhandler(500)
+    def internal_error(e):
+        logger.error("Internal server error: %s", e, exc_info=True)
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+    return app
+
+
+def _start_model_preload(app):
+    """Apply model cache limits and kick off background loading if preloading is enabled.
+
+    The model is preloaded where clustering runs: in the clustering worker
+    process when CLUSTER_WORKER_PROCESS is on, not in the web process.
+    """
+    from app.clustering.model_manager import ModelManager, build_model_config
+    from app.routes.cluster_routes import preload_model
+
+    ModelManager.configure(
+        max_models=app.config.get('MODEL_CACHE_MAX_MODELS', 2),
+        max_bytes=app.config.get('MODEL_CACHE_MAX_MB', 0) * 1024 * 1024,
+        idle_timeout=app.config.get('MODEL_IDLE_TIMEOUT_SECONDS', 0),
+        tfidf_state_dir=app.config.get('TFIDF_STATE_DIR'),
+        tfidf_refit_drift=app.config.get('TFIDF_REFIT_DRIFT', 0.05),
+    )
+
+    with app.app_context():
+        settings = {r['key']: r['value'] for r in get_db().execute("SELECT key, value FROM settings").fetchall()}
+
+    preload = settings.get('preload_model')
+    enabled = app.config.get('PRELOAD_MODEL', False) if preload in (None, '') else preload == '1'
+    if not enabled:
+        return
+
+    model_config = build_model_config(settings, app.config['BUILTIN_MODEL_PATH'])
+    logger.info("Starting background preload of %s model", model_config['model_type'])
+    preload_model(model_config)
+
+
+def _start_cluster_jobs(app):
+    """Start the clustering job queue, resuming jobs queued or interrupted before the last shutdown."""
+    from app.routes.cluster_routes import start_job_queue
+
+    try:
+        start_job_queue(app.config)
+    except Exception as e:
+        logger.error("Failed to start clustering job queue: %s", e, exc_info=True)
@@ -0,0 +1,146 @@
+import json
+import logging
+from datetime import datetime
+
+from app.database import bump_data_version
+from app.clustering.cluster_store import ClusterStore
+
+logger = logging.getLogger(__name__)
+
+
+class CaseStore:
+    """Persist imported test cases in the database and delete them."""
+
+    @classmethod
+    def save_cases(cls, db, valid_cases, source_file):
+        """Insert validated cases, replacing existing cases with the same ID (incremental import).
+
+        Replaced cases are deleted the way delete_cases() deletes them, so
+        histories that clustered their steps are marked stale. Commits once.
+
+        Args:
+            db: sqlite3 connection
+            valid_cases: list of (TestCase, list[TestStep]) tuples from DataValidator
+            source_file: file name recorded as the cases' source
+
+        Returns:
+            tuple: (cases_imported, steps_imported)
+        """
+        now = datetime.now().isoformat()
+        cases_imported = 0
+        steps_imported = 0
+
+        cls._mark_for_delete(db)
+        db.executemany("INSERT OR IGNORE INTO temp.delete_case_ids (id) VALUES (?)",
+                       [(case.id,) for case, _ in valid_cases])
+        try:
+            replaced = cls._delete_marked_rows(db)
+
+            for case, steps in valid_cases:
+                # A case listed twice in the file: the later row replaces the earlier one
+                db.execute("DELETE FROM test_cases WHERE id = ?", (case.id,))
+
+                db.execute(
+                    "INSERT INTO test_cases (id, title, extra_fields, source_file, import_time) VALUES (?, ?, ?, ?, ?)",
+                    (case.id, case.title, json.dumps(case.extra_fields, ensure_ascii=False), source_file, now)
+                )
+                cases_imported += 1
+
+                for step in steps:
+                    db.execute(
+                        "INSERT INTO test_steps (case_id, step_no, operation, extra_fields) VALUES (?, ?, ?, ?)",
+                        (case.id, step.step_no, step.operation,
+                         json.dumps(step.extra_fields, ensure_ascii=False))
+                    )
+                    steps_imported += 1
+
+            # Clear stale cluster results (without history)
+            db.execute("DELETE FROM cluster_results WHERE history_id IS NULL")
+            db.execute("DELETE FROM cluster_info WHERE history_id IS NULL")
+            bump_data_version(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        # Re-imported cases get new step ids; cached cluster samples name the old ones
+        ClusterStore.invalidate_samples()
+        if replaced['stale_histories']:
+            ClusterStore.invalidate_current_history()
+
+        logger.info("Import completed: %s, cases=%d, steps=%d (replaced %d cases, stale histories %s)",
+                    source_file, cases_imported, steps_imported, replaced['deleted_cases'],
+                    replaced['stale_histories'])
+        return cases_imported, steps_imported
+
+    @classmethod
+    def delete_cases(cls, db, case_ids):
+        """Delete the given cases with their steps and cluster results. See _delete_marked."""
+        cls._mark_for_delete(db)
+        db.executemany("INSERT OR IGNORE INTO temp.delete_case_ids (id) VALUES (?)", [(cid,) for cid in case_ids])
+        return cls._delete_marked(db)
+
+    @classmethod
+    def delete_source(cls, db, source_file):
+        """Delete every case imported from source_file. See _delete_marked."""
+        cls._mark_for_delete(db)
+        db.execute("INSERT INTO temp.delete_case_ids (id) SELECT id FROM test_cases WHERE source_file = ?",
+                   (source_file,))
+        return cls._delete_marked(db)
+
+    @staticmethod
+    def _mark_for_delete(db):
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS delete_case_ids (id TEXT PRIMARY KEY)")
+        db.execute("DELETE FROM temp.delete_case_ids")
+
+    @classmethod
+    def _delete_marked(cls, db):
+        """Delete the cases listed in temp.delete_case_ids in one transaction.
+
+        Set-based: no per-case statements and no id lists bound as SQL
+        variables. Steps go through ON DELETE CASCADE. History records that
+        clustered any of the deleted steps are marked stale, since their
+        cluster_info counts no longer match their results.
+
+        Returns:
+            dict: deleted_cases, deleted_steps, deleted_results and
+            stale_histories (ids of the history records marked stale)
+        """
+        try:
+            result = cls._delete_marked_rows(db)
+            bump_data_version(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        ClusterStore.invalidate_samples()
+        if result['stale_histories']:
+            ClusterStore.invalidate_current_history()
+        return result
+
+    @staticmethod
+    def _delete_marked_rows(db):
+        """The statements of _delete_marked, inside the caller's transaction."""
+        marked = "SELECT id FROM temp.delete_case_ids"
+        counts = db.execute(
+            f"SELECT COUNT(*) as cases, COALESCE(SUM(step_count), 0) as steps FROM test_cases WHERE id IN ({marked})"
+        ).fetchone()
+        affected_histories = (
+            "SELECT DISTINCT cr.history_id FROM test_steps ts "
+            "JOIN cluster_results cr ON cr.step_id = ts.id "
+            f"WHERE ts.case_id IN ({marked}) AND cr.history_id IS NOT NULL"
+        )
+        stale = [r['history_id'] for r in db.execute(affected_histories).fetchall()]
+        db.execute(f"UPDATE cluster_history SET stale = 1 WHERE id IN ({affected_histories})")
+
+        deleted_results = db.execute(
+            f"DELETE FROM cluster_results WHERE step_id IN (SELECT id FROM test_steps WHERE case_id IN ({marked}))"
+        ).rowcount
+        db.execute(f"DELETE FROM test_cases WHERE id IN ({marked})")
+        db.execute("DELETE FROM temp.delete_case_ids")
+        return {
+            "deleted_cases": counts['cases'],
+            "deleted_steps": counts['steps'],
+            "deleted_results": deleted_results,
+            "stale_histories": sorted(stale),
+        }
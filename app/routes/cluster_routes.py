@@ -1,266 +1,426 @@
+import os
 import json
+import shutil
 import logging
 import threading
 import time
-from datetime import datetime
-from collections import Counter
 
-from flask import Blueprint, request, jsonify, current_app
-from app.database import get_db
+from flask import Blueprint, Response, request, jsonify, current_app
+from app.database import get_db, connect, bump_data_version
+from app.clustering.cluster_store import ClusterStore
+from app.clustering.job_queue import ClusterJobQueue, JobQueueFull
+from app.routes.response_cache import conditional_get
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('cluster_api', __name__, url_prefix='/api/cluster')
 
-# Module-level state for background clustering task
-_task_state = {
-    "status": "idle",  # idle | running | completed | error
-    "progress": "",
-    "phase": None,
-    "phase_name": "",
-    "phase_index": 0,
-    "total_phases": 5,
-    "phase_progress": 0,
-    "overall_progress": 0,
-    "detail": "",
-    "elapsed_seconds": 0,
-    "start_time": None,
-    "result": None,
-    "error": None,
-}
-_task_lock = threading.Lock()
-
-
-def _update_progress(phase, phase_name, phase_index, phase_progress, overall_progress, detail):
-    """Callback for cluster engine to update progress."""
-    with _task_lock:
-        _task_state["phase"] = phase
-        _task_state["phase_name"] = phase_name
-        _task_state["phase_index"] = phase_index
-        _task_state["phase_progress"] = phase_progress
-        _task_state["overall_progress"] = overall_progress
-        _task_state["detail"] = detail
-        if _task_state["start_time"]:
-            _task_state["elapsed_seconds"] = time.time() - _task_state["start_time"]
-
-
-def _run_clustering(app_config, db_path, similarity_threshold):
-    """Run clustering in background thread."""
-    import sqlite3
-    import numpy as np
-
-    global _task_state
+def _run_clustering(app_config, job_id, params, progress_callback, cancel_check):
+    """Run one clustering job (called by the job queue, normally in a worker process).
 
+    Embedding batches and DBSCAN labels are checkpointed under
+    CHECKPOINT_DIR/<job_id>; the directory is removed once the job finishes,
+    fails or is cancelled, so a job requeued after a restart resumes from it.
+
+    Returns:
+        dict with the job result; raises ClusteringCancelled when cancelled
+    """
+    from app.clustering.cluster_engine import ClusteringCancelled
+
+    similarity_threshold = float(params["similarity_threshold"])
+    start_time = time.time()
+
+    checkpoint_dir = None
+    if app_config.get('CLUSTER_CHECKPOINTS'):
+        checkpoint_dir = os.path.join(app_config['CHECKPOINT_DIR'], str(job_id))
+
+    conn = None
     try:
-        with _task_lock:
-            _task_state["status"] = "running"
-            _task_state["progress"] = "加载步骤数据..."
-            _task_state["start_time"] = time.time()
-            _task_state["error"] = None
-            _task_state["overall_progress"] = 0
+        progress_callback(None, "", 0, 0, 0, "加载步骤数据...")
 
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = connect(app_config['DATABASE_PATH'])
 
         rows = conn.execute(
             "SELECT id, operation FROM test_steps ORDER BY id"
         ).fetchall()
 
         if not rows:
-            with _task_lock:
-                _task_state["status"] = "error"
-                _task_state["error"] = "未找到测试步骤，请先导入数据。"
-            conn.close()
-            return
+            raise ValueError("未找到测试步骤，请先导入数据。")
 
         step_ids = [r['id'] for r in rows]
         step_texts = [r['operation'] for r in rows]
 
         # Load model
-        from app.clustering.model_manager import ModelManager
+        from app.clustering.model_manager import ModelManager, build_model_config
+        from app.clustering.resource_governor import ResourceGovernor
         settings = {}
         for row in conn.execute("SELECT key, value FROM settings").fetchall():
             settings[row['key']] = row['value']
 
-        model_config = {
-            "model_type": settings.get("model_type", "builtin"),
-            "model_path": settings.get("model_path", ""),
-            "api_url": settings.get("api_url", ""),
-            "api_key": settings.get("api_key", ""),
-            "api_model_name": settings.get("api_model_name", ""),
-            "builtin_model_path": app_config['BUILTIN_MODEL_PATH'],
-        }
-        model = ModelManager.get_model(model_config)
+        model_config = build_model_config(settings, app_config['BUILTIN_MODEL_PATH'])
+        governor = ResourceGovernor.from_settings(
+            settings,
+            reserve_cores=app_config['CPU_RESERVE_CORES'],
+            tune_path=app_config['CPU_TUNE_PATH'],
+        )
+        logger.info("CPU budget: %d of %d cores for clustering", governor.budget, governor.cpus)
 
         # Run clustering with progress callback
         from app.clustering.cluster_engine import ClusterEngine
         engine = ClusterEngine()
-        result = engine.run(
-            step_ids, step_texts,
-            similarity_threshold=similarity_threshold,
-            model=model,
-            progress_callback=_update_progress
-        )
+        with ModelManager.use_model(model_config) as model:
+            result = engine.run(
+                step_ids, step_texts,
+                similarity_threshold=similarity_threshold,
+                model=model,
+                progress_callback=progress_callback,
+                reduce_method=settings.get("reduce_method") or None,
+                reduce_dim=int(settings.get("reduce_dim") or 256),
+                precision=settings.get("embedding_precision") or "float32",
+                out_of_core_dir=app_config['EMBEDDING_STORE_DIR'] if settings.get("out_of_core") == "1" else None,
+                checkpoint_dir=checkpoint_dir,
+                cancel_check=cancel_check,
+                resource_governor=governor,
+            )
 
-        labels = result["labels"]
-        cluster_labels = result["cluster_labels"]
+        if cancel_check():
+            raise ClusteringCancelled("聚类已取消")
 
         # Phase 5 continued: Save to database
-        _update_progress("saving", "结果保存", 5, 60, 96, "保存聚类结果...")
-
-        # Create history record
-        run_time = datetime.now().isoformat()
-        model_type = settings.get("model_type", "builtin")
-        model_name = model.model_name
-        elapsed = time.time() - _task_state["start_time"]
-
-        # Clear is_current on all history records
-        conn.execute("UPDATE cluster_history SET is_current = 0")
-
-        cursor = conn.execute(
-            "INSERT INTO cluster_history (run_time, model_type, model_name, similarity_threshold, "
-            "total_steps, total_clusters, noise_count, elapsed_seconds, is_current) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)",
-            (run_time, model_type, model_name, similarity_threshold,
-             len(step_ids), result["total_clusters"], result["noise_count"], elapsed)
+        progress_callback("saving", "结果保存", 5, 60, 96, "保存聚类结果...")
+
+        history_id = ClusterStore.save_results(
+            conn, step_ids, result["labels"], result["cluster_labels"], similarity_threshold,
+            model_type=settings.get("model_type", "builtin"),
+            model_name=model.model_name,
+            elapsed_seconds=time.time() - start_time,
+            progress_callback=progress_callback,
         )
-        history_id = cursor.lastrowid
-
-        _update_progress("saving", "结果保存", 5, 70, 97, "保存聚类结果到数据库...")
-
-        # Delete old current results (without history_id or with old current flag)
-        conn.execute("DELETE FROM cluster_results WHERE history_id IS NULL")
-        conn.execute("DELETE FROM cluster_info WHERE history_id IS NULL")
-
-        # Save results with history_id
-        for i, step_id in enumerate(step_ids):
-            cid = int(labels[i])
-            clabel = cluster_labels.get(cid, "")
-            conn.execute(
-                "INSERT INTO cluster_results (step_id, cluster_id, cluster_label, similarity_threshold, history_id) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (int(step_id), cid, clabel, similarity_threshold, history_id)
-            )
 
-        _update_progress("saving", "结果保存", 5, 90, 99, "保存簇信息...")
+        logger.info("Clustering completed: %d clusters, %d noise steps, threshold=%.2f, elapsed=%.1fs",
+                     result["total_clusters"], result["noise_count"], similarity_threshold,
+                     time.time() - start_time)
+
+        return {
+            "total_clusters": result["total_clusters"],
+            "noise_count": result["noise_count"],
+            "total_steps": len(step_ids),
+            "threshold": similarity_threshold,
+            "history_id": history_id,
+            "reduction": result.get("reduction"),
+            "quantization": result.get("quantization"),
+        }
 
-        # Compute and save cluster info
-        unique_labels = set(int(l) for l in labels)
-        unique_labels.discard(-1)
-        label_counts = Counter(int(l) for l in labels)
+    finally:
+        if conn is not None:
+            conn.close()
+        if checkpoint_dir:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+def _init_worker(app_config):
+    """Set up a clustering worker process the way create_app sets up the web process.
+
+    It gets the same model cache limits, so switching between models keeps both loaded.
+    """
+    from app.clustering.model_manager import ModelManager
+    ModelManager.configure(
+        max_models=app_config.get('MODEL_CACHE_MAX_MODELS', 2),
+        max_bytes=app_config.get('MODEL_CACHE_MAX_MB', 0) * 1024 * 1024,
+        idle_timeout=app_config.get('MODEL_IDLE_TIMEOUT_SECONDS', 0),
+        tfidf_state_dir=app_config['TFIDF_STATE_DIR'],
+        tfidf_refit_drift=app_config['TFIDF_REFIT_DRIFT'],
+    )
 
-        for cid in unique_labels:
-            step_count = label_counts[cid]
-            case_ids_in_cluster = conn.execute(
-                "SELECT DISTINCT ts.case_id FROM cluster_results cr "
-                "JOIN test_steps ts ON cr.step_id = ts.id "
-                "WHERE cr.cluster_id = ? AND cr.history_id = ?",
-                (cid, history_id)
-            ).fetchall()
-            case_count = len(case_ids_in_cluster)
 
-            conn.execute(
-                "INSERT INTO cluster_info (cluster_id, label, step_count, case_count, threshold, history_id) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (cid, cluster_labels.get(cid, ""), step_count, case_count, similarity_threshold, history_id)
-            )
+_job_queue = ClusterJobQueue(_run_clustering)
 
-        conn.commit()
-        conn.close()
-
-        noise_count = int((labels == -1).sum())
-        total_clusters = len(unique_labels)
-
-        with _task_lock:
-            _task_state["status"] = "completed"
-            _task_state["progress"] = ""
-            _task_state["overall_progress"] = 100
-            _task_state["detail"] = ""
-            _task_state["result"] = {
-                "total_clusters": total_clusters,
-                "noise_count": noise_count,
-                "total_steps": len(step_ids),
-                "threshold": similarity_threshold,
-                "history_id": history_id,
-            }
-            _task_state["elapsed_seconds"] = elapsed
+# Open /api/cluster/events streams, each holding a server worker thread
+_event_streams = 0
+_event_streams_lock = threading.Lock()
 
-        logger.info("Clustering completed: %d clusters, %d noise steps, threshold=%.2f, elapsed=%.1fs",
-                     total_clusters, noise_count, similarity_threshold, elapsed)
 
-    except Exception as e:
-        logger.error("Clustering failed: %s", e, exc_info=True)
-        with _task_lock:
-            _task_state["status"] = "error"
-            _task_state["error"] = str(e)
+def start_job_queue(config):
+    """Point the clustering job queue at this app's database and start persisted jobs.
+
+    Jobs left running by the previous shutdown are requeued and resume from their
+    checkpoints; checkpoint directories of jobs that are no longer active are removed.
+    """
+    app_config = {
+        'BUILTIN_MODEL_PATH': config['BUILTIN_MODEL_PATH'],
+        'DATABASE_PATH': config['DATABASE_PATH'],
+        'EMBEDDING_STORE_DIR': config['EMBEDDING_STORE_DIR'],
+        'CHECKPOINT_DIR': config['CHECKPOINT_DIR'],
+        'CLUSTER_CHECKPOINTS': config.get('CLUSTER_CHECKPOINTS', True),
+        'TFIDF_STATE_DIR': config.get('TFIDF_STATE_DIR'),
+        'TFIDF_REFIT_DRIFT': config.get('TFIDF_REFIT_DRIFT', 0.05),
+        'CPU_RESERVE_CORES': config.get('CPU_RESERVE_CORES', 1),
+        'CPU_TUNE_PATH': config.get('CPU_TUNE_PATH'),
+        'MODEL_CACHE_MAX_MODELS': config.get('MODEL_CACHE_MAX_MODELS', 2),
+        'MODEL_CACHE_MAX_MB': config.get('MODEL_CACHE_MAX_MB', 0),
+        'MODEL_IDLE_TIMEOUT_SECONDS': config.get('MODEL_IDLE_TIMEOUT_SECONDS', 0),
+    }
+
+    base_dir = config['CHECKPOINT_DIR']
+    if os.path.isdir(base_dir):
+        active = {str(job_id) for job_id in _job_queue.active_job_ids()}
+        # Jobs about to be requeued from the database are active too
+        conn = connect(config['DATABASE_PATH'])
+        try:
+            active.update(str(r[0]) for r in conn.execute(
+                "SELECT id FROM cluster_jobs WHERE status IN ('queued', 'running')"
+            ).fetchall())
+        finally:
+            conn.close()
+        for entry in os.listdir(base_dir):
+            path = os.path.join(base_dir, entry)
+            if entry not in active and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info("Removed stale clustering checkpoint %s", path)
+
+    _job_queue.configure(
+        config['DATABASE_PATH'],
+        max_concurrent=config.get('CLUSTER_MAX_CONCURRENT_JOBS', 1),
+        max_queued=config.get('CLUSTER_MAX_QUEUED_JOBS', 0),
+        runner_config=app_config,
+        use_processes=config.get('CLUSTER_WORKER_PROCESS', True),
+        worker_init=_init_worker,
+        worker_max_jobs=config.get('CLUSTER_WORKER_MAX_JOBS', 0),
+        worker_max_rss_mb=config.get('CLUSTER_WORKER_MAX_RSS_MB', 0),
+    )
+
+
+def preload_model(model_config):
+    """Preload a model where clustering runs: in the worker processes, or else in this process."""
+    if _job_queue.use_processes:
+        _job_queue.preload(model_config)
+        return
+    from app.clustering.model_manager import ModelManager
+    ModelManager.preload(model_config)
+
+
+def test_model(model_config):
+    """Load a model and encode a probe where clustering runs, so a tested model is ready for it."""
+    if _job_queue.use_processes:
+        return _job_queue.test_model(model_config)
+    from app.clustering.model_manager import ModelManager
+    return ModelManager.test(model_config)
+
+
+def model_status():
+    """Preload state and cached models of the process clustering runs in."""
+    from app.clustering.model_manager import ModelManager
+    if not _job_queue.use_processes:
+        return {**ModelManager.get_status(), "cached_models": ModelManager.cached_models()}
+    status = _job_queue.model_status()
+    if status is None:
+        # No worker process started yet
+        status = {"status": "idle", "model_name": "", "load_seconds": 0, "error": None, "cached_models": []}
+    return status
+
+
+def _status_payload(job):
+    """Flatten a job state into the /status response shape."""
+    params = job.get("params") or {}
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "similarity_threshold": params.get("similarity_threshold"),
+        "queue_position": job["queue_position"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "progress": job["progress"],
+        "phase": job["phase"],
+        "phase_name": job["phase_name"],
+        "phase_index": job["phase_index"],
+        "total_phases": job["total_phases"],
+        "phase_progress": job["phase_progress"],
+        "overall_progress": job["overall_progress"],
+        "detail": job["detail"],
+        "elapsed_seconds": job["elapsed_seconds"],
+        "result": job["result"],
+        "error": job["error"],
+    }
 
 
 @bp.route('/run', methods=['POST'])
 def run_clustering():
-    """Trigger clustering in background thread."""
-    with _task_lock:
-        if _task_state["status"] == "running":
-            return jsonify({"success": False, "error": "聚类正在执行中，请勿重复操作"}), 409
-
+    """Queue a clustering job; it starts as soon as a job slot is free."""
     data = request.get_json() or {}
     threshold = float(data.get('similarity_threshold', 0.80))
 
     if threshold < 0.5 or threshold > 0.95:
         return jsonify({"success": False, "error": "阈值必须在 0.5 到 0.95 之间"}), 400
 
-    app_config = {
-        'BUILTIN_MODEL_PATH': current_app.config['BUILTIN_MODEL_PATH'],
-        'DATABASE_PATH': current_app.config['DATABASE_PATH'],
-    }
-    db_path = current_app.config['DATABASE_PATH']
-
-    with _task_lock:
-        _task_state["status"] = "running"
-        _task_state["progress"] = "启动中..."
-        _task_state["phase"] = None
-        _task_state["phase_name"] = ""
-        _task_state["phase_index"] = 0
-        _task_state["phase_progress"] = 0
-        _task_state["overall_progress"] = 0
-        _task_state["detail"] = ""
-        _task_state["elapsed_seconds"] = 0
-        _task_state["start_time"] = time.time()
-        _task_state["result"] = None
-        _task_state["error"] = None
-
-    t = threading.Thread(
-        target=_run_clustering,
-        args=(app_config, db_path, threshold),
-        daemon=True
-    )
-    t.start()
+    try:
+        job_id = _job_queue.submit({"similarity_threshold": threshold})
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 409
 
-    logger.info("Clustering started with threshold=%.2f", threshold)
-    return jsonify({"success": True, "status": "started"})
+    job = _job_queue.get(job_id)
+    logger.info("Clustering job #%d queued with threshold=%.2f", job_id, threshold)
+    return jsonify({
+        "success": True,
+        "status": "started" if job["status"] == "running" else job["status"],
+        "job_id": job_id,
+        "queue_position": job["queue_position"],
+    })
+
+
+@bp.route('/cancel', methods=['POST'])
+def cancel_clustering():
+    """Cancel a job (the given job_id, or else the running one).
+
+    A queued job is dropped at once; a running job stops at its next batch or phase boundary.
+    """
+    data = request.get_json(silent=True) or {}
+    job_id = data.get('job_id') or request.args.get('job_id', type=int)
+    if not job_id:
+        latest = _job_queue.latest()
+        job_id = latest["job_id"] if latest and latest["status"] == "running" else None
+    if not job_id:
+        return jsonify({"success": False, "error": "当前没有正在执行的聚类任务"}), 409
+    return _cancel_job(int(job_id))
+
+
+@bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    return _cancel_job(job_id)
+
+
+def _cancel_job(job_id):
+    status = _job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({"success": False, "error": "该聚类任务不在排队或执行中"}), 409
+    logger.info("Cancellation requested for clustering job #%d", job_id)
+    return jsonify({"success": True, "job_id": job_id, "status": status})
+
+
+def _current_status(job_id=None):
+    """Status of a job (or of the latest one) with queue counts, as served by /status and /events.
+
+    Returns None when job_id is given but no such job exists.
+    """
+    job = _job_queue.get(job_id) if job_id else _job_queue.latest()
+    if job_id and job is None:
+        return None
+
+    counts = _job_queue.counts()
+    if job is None:
+        payload = {
+            "job_id": None,
+            "status": "idle",
+            "progress": "",
+            "phase": None,
+            "phase_name": "",
+            "phase_index": 0,
+            "total_phases": 5,
+            "phase_progress": 0,
+            "overall_progress": 0,
+            "detail": "",
+            "elapsed_seconds": 0,
+            "result": None,
+            "error": None,
+        }
+    else:
+        payload = _status_payload(job)
+    payload.update(success=True, queued_jobs=counts["queued"], running_jobs=counts["running"])
+    return payload
 
 
 @bp.route('/status', methods=['GET'])
 def cluster_status():
-    """Return clustering progress/result."""
-    with _task_lock:
-        return jsonify({
-            "success": True,
-            "status": _task_state["status"],
-            "progress": _task_state["progress"],
-            "phase": _task_state["phase"],
-            "phase_name": _task_state["phase_name"],
-            "phase_index": _task_state["phase_index"],
-            "total_phases": _task_state["total_phases"],
-            "phase_progress": _task_state["phase_progress"],
-            "overall_progress": _task_state["overall_progress"],
-            "detail": _task_state["detail"],
-            "elapsed_seconds": round(_task_state.get("elapsed_seconds", 0), 1),
-            "result": _task_state["result"],
-            "error": _task_state["error"],
-        })
+    """Return progress/result of a job (?job_id=), or of the latest job."""
+    payload = _current_status(request.args.get('job_id', type=int))
+    if payload is None:
+        return jsonify({"success": False, "error": "聚类任务未找到"}), 404
+    return jsonify(payload)
+
+
+@bp.route('/events', methods=['GET'])
+def cluster_events():
+    """Server-Sent Events stream of /status payloads for a job (?job_id=), or the latest job.
+
+    An event is sent only when the job queue state changes, at most one per
+    CLUSTER_EVENTS_MIN_INTERVAL seconds (changes in between are coalesced into
+    the next event), with a comment line as keep-alive while nothing happens.
+    A stream for a given job ends after the event reporting it finished.
+    At most CLUSTER_EVENTS_MAX_STREAMS streams are open at once; past that
+    the request gets a 503 naming the /status URL to poll instead.
+    """
+    global _event_streams
+
+    job_id = request.args.get('job_id', type=int)
+    if job_id and _job_queue.get(job_id) is None:
+        return jsonify({"success": False, "error": "聚类任务未找到"}), 404
+
+    max_streams = current_app.config.get('CLUSTER_EVENTS_MAX_STREAMS', 4)
+    with _event_streams_lock:
+        full = _event_streams >= max_streams
+        if not full:
+            _event_streams += 1
+    if full:
+        # Every stream holds a server thread until it closes; past the limit
+        # clients poll instead of starving other requests of threads
+        logger.info("Refused clustering event stream: %d streams open", max_streams)
+        poll_url = f"/api/cluster/status?job_id={job_id}" if job_id else "/api/cluster/status"
+        response = jsonify({"success": False, "error": "进度推送连接数已达上限，请轮询任务状态", "poll": poll_url})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    def release():
+        global _event_streams
+        with _event_streams_lock:
+            _event_streams -= 1
+
+    min_interval = current_app.config.get('CLUSTER_EVENTS_MIN_INTERVAL', 0.5)
+    keepalive = current_app.config.get('CLUSTER_EVENTS_KEEPALIVE', 15)
+
+    def stream():
+        version = None
+        while True:
+            new_version = _job_queue.wait_for_change(version, timeout=keepalive)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+
+            payload = _current_status(job_id)
+            yield "data: " + json.dumps(payload, ensure_ascii=False) + "\n\n"
+            if job_id and payload["status"] in ("completed", "cancelled", "error"):
+                return
+            time.sleep(min_interval)
+
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # Called by the server when the stream ends or the client disconnects
+    response.call_on_close(release)
+    return response
+
+
+@bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Return recent clustering jobs, newest first."""
+    limit = min(request.args.get('limit', 20, type=int), 200)
+    return jsonify({"success": True, "jobs": [_status_payload(j) for j in _job_queue.list_jobs(limit)]})
+
+
+@bp.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    job = _job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "聚类任务未找到"}), 404
+    payload = _status_payload(job)
+    payload["success"] = True
+    return jsonify(payload)
 
 
 @bp.route('/list', methods=['GET'])
+@conditional_get()
 def cluster_list():
     """Return all clusters for current active history."""
     db = get_db()
@@ -274,9 +434,7 @@ def cluster_list():
         ).fetchall()
     else:
         # Get current active history
-        current = db.execute(
-            "SELECT id FROM cluster_history WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
-        ).fetchone()
+        current = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'])
 
         if current:
             rows = db.execute(
@@ -305,6 +463,7 @@ def cluster_list():
 
 
 @bp.route('/<int:cluster_id>', methods=['GET'])
+@conditional_get()
 def cluster_detail(cluster_id):
     """Return steps in a cluster."""
     db = get_db()
@@ -316,9 +475,7 @@ def cluster_detail(cluster_id):
             (cluster_id, history_id)
         ).fetchone()
     else:
-        current = db.execute(
-            "SELECT id FROM cluster_history WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
-        ).fetchone()
+        current = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'])
         hid = current['id'] if current else None
 
         if hid:
@@ -383,6 +540,7 @@ def cluster_detail(cluster_id):
 # ---- History endpoints ----
 
 @bp.route('/history', methods=['GET'])
+@conditional_get(history_scoped=False)
 def cluster_history_list():
     """Return all clustering history records."""
     db = get_db()
@@ -402,6 +560,7 @@ def cluster_history_list():
             "noise_count": r['noise_count'],
             "elapsed_seconds": r['elapsed_seconds'],
             "is_current": bool(r['is_current']),
+            "stale": bool(r['stale']),
         }
         for r in rows
     ]
@@ -452,7 +611,10 @@ def delete_history(history_id):
     db.execute("DELETE FROM cluster_results WHERE history_id = ?", (history_id,))
     db.execute("DELETE FROM cluster_info WHERE history_id = ?", (history_id,))
     db.execute("DELETE FROM cluster_history WHERE id = ?", (history_id,))
+    bump_data_version(db)
     db.commit()
+    ClusterStore.invalidate_samples(history_id)
+    ClusterStore.invalidate_current_history()
 
     logger.info("Deleted cluster history record #%d", history_id)
     return jsonify({"success": True})
@@ -468,7 +630,9 @@ def activate_history(history_id):
 
     db.execute("UPDATE cluster_history SET is_current = 0")
     db.execute("UPDATE cluster_history SET is_current = 1 WHERE id = ?", (history_id,))
+    bump_data_version(db)
     db.commit()
+    ClusterStore.invalidate_current_history()
 
     logger.info("Activated cluster history record #%d", history_id)
     return jsonify({"success": True})
@@ -536,13 +700,12 @@ def compare_history():
 
 
 @bp.route('/current-summary', methods=['GET'])
+@conditional_get()
 def current_summary():
     """Return summary of the current active clustering result for the main page panel."""
     db = get_db()
 
-    current = db.execute(
-        "SELECT * FROM cluster_history WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
-    ).fetchone()
+    current = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'])
 
     if not current:
         return jsonify({"success": True, "summary": None, "top_clusters": []})
@@ -566,6 +729,7 @@ def current_summary():
             "total_clusters": current['total_clusters'],
             "noise_count": current['noise_count'],
             "elapsed_seconds": current['elapsed_seconds'],
+            "stale": bool(current['stale']),
         },
         "top_clusters": [dict(c) for c in top_clusters],
     })
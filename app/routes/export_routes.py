@@ -2,9 +2,9 @@ import io
 import zipfile
 import logging
 
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from app.database import get_db
-from app.exporter.xlsx_exporter import XlsxExporter
+from app.clustering.cluster_store import ClusterStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +14,12 @@ bp = Blueprint('export_api', __name__, url_prefix='/api/export')
 @bp.route('/', methods=['POST'])
 def export_results():
     """Export clustering results as a zip containing xlsx files."""
+    from app.exporter.xlsx_exporter import XlsxExporter
+
     db = get_db()
 
     # Find current active history
-    current_history = db.execute(
-        "SELECT id FROM cluster_history WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
-    ).fetchone()
+    current_history = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'])
     history_id = current_history['id'] if current_history else None
 
     if history_id is not None:
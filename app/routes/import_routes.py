@@ -1,14 +1,11 @@
 import os
-import json
 import logging
 import tempfile
-from datetime import datetime
 
 from flask import Blueprint, request, jsonify, current_app
 from app.database import get_db
-from app.importer.column_mapper import ColumnMapper
-from app.importer.xlsx_reader import XlsxReader
-from app.importer.data_validator import DataValidator
+from app.importer.case_store import CaseStore
+from app.clustering.cluster_store import ClusterStore
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +18,8 @@ _upload_session = {}
 @bp.route('/upload', methods=['POST'])
 def upload_xlsx():
     """Receive xlsx file, detect column mapping, return for confirmation."""
+    from app.importer.column_mapper import ColumnMapper
+
     if 'file' not in request.files:
         return jsonify({"success": False, "error": "未提供文件"}), 400
 
@@ -62,6 +61,9 @@ def upload_xlsx():
 @bp.route('/confirm', methods=['POST'])
 def confirm_import():
     """Execute import with confirmed column mapping."""
+    from app.importer.xlsx_reader import XlsxReader
+    from app.importer.data_validator import DataValidator
+
     if 'filepath' not in _upload_session:
         return jsonify({"success": False, "error": "未上传文件，请先上传"}), 400
 
@@ -85,36 +87,7 @@ def confirm_import():
                 "warnings": result.warnings
             }), 400
 
-        db = get_db()
-        now = datetime.now().isoformat()
-        cases_imported = 0
-        steps_imported = 0
-
-        for case, steps in result.valid_cases:
-            # Delete existing case and its steps (incremental import)
-            db.execute("DELETE FROM test_steps WHERE case_id = ?", (case.id,))
-            db.execute("DELETE FROM test_cases WHERE id = ?", (case.id,))
-
-            db.execute(
-                "INSERT INTO test_cases (id, title, extra_fields, source_file, import_time) VALUES (?, ?, ?, ?, ?)",
-                (case.id, case.title, json.dumps(case.extra_fields, ensure_ascii=False), filename, now)
-            )
-            cases_imported += 1
-
-            for step in steps:
-                db.execute(
-                    "INSERT INTO test_steps (case_id, step_no, operation, extra_fields) VALUES (?, ?, ?, ?)",
-                    (case.id, step.step_no, step.operation,
-                     json.dumps(step.extra_fields, ensure_ascii=False))
-                )
-                steps_imported += 1
-
-        # Clear stale cluster results (without history)
-        db.execute("DELETE FROM cluster_results WHERE history_id IS NULL")
-        db.execute("DELETE FROM cluster_info WHERE history_id IS NULL")
-        db.commit()
-
-        logger.info("Import completed: %s, cases=%d, steps=%d", filename, cases_imported, steps_imported)
+        cases_imported, steps_imported = CaseStore.save_cases(get_db(), result.valid_cases, filename)
 
         _upload_session.clear()
 
@@ -132,21 +105,21 @@ def confirm_import():
 
 @bp.route('/status', methods=['GET'])
 def import_status():
-    """Return current DB statistics."""
+    """Return current DB statistics; cluster_count is that of the current clustering result."""
     try:
         db = get_db()
-        case_count = db.execute("SELECT COUNT(*) as cnt FROM test_cases").fetchone()['cnt']
-        step_count = db.execute("SELECT COUNT(*) as cnt FROM test_steps").fetchone()['cnt']
-        last_import = db.execute(
-            "SELECT import_time FROM test_cases ORDER BY import_time DESC LIMIT 1"
+        totals = db.execute(
+            "SELECT COALESCE(SUM(case_count), 0) as case_count, COALESCE(SUM(step_count), 0) as step_count, "
+            "MAX(last_import_time) as last_import_time FROM source_stats"
         ).fetchone()
-        cluster_count = db.execute("SELECT COUNT(*) as cnt FROM cluster_info").fetchone()['cnt']
+        current = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'])
+        cluster_count = current['total_clusters'] if current else 0
 
         return jsonify({
             "success": True,
-            "case_count": case_count,
-            "step_count": step_count,
-            "last_import_time": last_import['import_time'] if last_import else None,
+            "case_count": totals['case_count'],
+            "step_count": totals['step_count'],
+            "last_import_time": totals['last_import_time'] or None,
             "cluster_count": cluster_count
         })
     except Exception as e:
@@ -160,9 +133,8 @@ def list_sources():
     try:
         db = get_db()
         rows = db.execute(
-            "SELECT source_file as filename, COUNT(*) as case_count "
-            "FROM test_cases WHERE source_file IS NOT NULL "
-            "GROUP BY source_file ORDER BY source_file"
+            "SELECT source_file as filename, case_count "
+            "FROM source_stats WHERE source_file != '' ORDER BY source_file"
         ).fetchall()
 
         sources = [{"filename": r['filename'], "case_count": r['case_count']} for r in rows]
@@ -176,32 +148,10 @@ def list_sources():
 def delete_by_source(filename):
     """Delete all cases imported from a specific source file."""
     db = get_db()
-
-    # Get all case IDs for this source
-    case_rows = db.execute(
-        "SELECT id FROM test_cases WHERE source_file = ?", (filename,)
-    ).fetchall()
-
-    if not case_rows:
+    if not db.execute("SELECT 1 FROM test_cases WHERE source_file = ? LIMIT 1", (filename,)).fetchone():
         return jsonify({"success": False, "error": f"未找到来源文件: {filename}"}), 404
 
-    case_ids = [r['id'] for r in case_rows]
-    total_steps = 0
-
-    for case_id in case_ids:
-        step_ids = [r['id'] for r in db.execute("SELECT id FROM test_steps WHERE case_id = ?", (case_id,)).fetchall()]
-        if step_ids:
-            placeholders = ','.join('?' * len(step_ids))
-            db.execute(f"DELETE FROM cluster_results WHERE step_id IN ({placeholders})", step_ids)
-        db.execute("DELETE FROM test_steps WHERE case_id = ?", (case_id,))
-        total_steps += len(step_ids)
-
-    db.execute("DELETE FROM test_cases WHERE source_file = ?", (filename,))
-    db.commit()
-
-    logger.info("Deleted %d cases from source %s", len(case_ids), filename)
-    return jsonify({
-        "success": True,
-        "deleted_cases": len(case_ids),
-        "deleted_steps": total_steps
-    })
+    result = CaseStore.delete_source(db, filename)
+
+    logger.info("Deleted %d cases from source %s", result['deleted_cases'], filename)
+    return jsonify({"success": True, **result})
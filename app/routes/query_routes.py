@@ -1,46 +1,159 @@
 import json
+import base64
 import logging
 
-from flask import Blueprint, request, jsonify
-from app.database import get_db
+from flask import Blueprint, request, jsonify, current_app
+from app.database import get_db, bump_data_version
+from app.clustering.cluster_store import ClusterStore
+from app.importer.case_store import CaseStore
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('query_api', __name__, url_prefix='/api/cases')
 
+# The trigram full-text indexes only match queries of at least three characters;
+# shorter queries fall back to a LIKE scan
+FTS_MIN_CHARS = 3
+
+
+def _fts_phrase(q):
+    """Quote a search string as a single FTS5 phrase (matched as a literal substring)."""
+    return '"' + q.replace('"', '""') + '"'
+
+
+# Sort columns that may hold NULL; SQLite orders NULL before every value
+_NULLABLE_SORTS = {'source_file', 'import_time'}
+
+
+def _encode_cursor(sort, order_dir, row, direction):
+    """Opaque token for the position just past `row` in the given sort order."""
+    payload = {"s": sort, "o": order_dir, "v": row[sort], "id": row['id'], "d": direction}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token, sort, order_dir):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        valid = (payload['s'] == sort and payload['o'] == order_dir
+                 and payload['d'] in ('next', 'prev') and 'v' in payload and 'id' in payload)
+    except (ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise ValueError("无效的分页游标，请从第一页重新浏览")
+    return payload
+
+
+def _keyset_segments(sort, sort_col, value, case_id, op):
+    """WHERE clauses selecting the rows after (value, case_id) when scanning with `op` ('>' or '<').
+
+    Returns them in scan order. A nullable column needs two: the NULL block
+    and the non-NULL rows are each a single range seek on the (column, id)
+    index, where one OR-ed condition would make SQLite scan from the start.
+    """
+    if sort == 'id':
+        return [(f"tc.id {op} ?", [case_id])]
+    if value is not None:
+        segments = [(f"({sort_col}, tc.id) {op} (?, ?)", [value, case_id])]
+        if sort in _NULLABLE_SORTS and op == '<':
+            segments.append((f"{sort_col} IS NULL", []))
+        return segments
+    segments = [(f"{sort_col} IS NULL AND tc.id {op} ?", [case_id])]
+    if op == '>':
+        segments.append((f"{sort_col} IS NOT NULL", []))
+    return segments
+
+
+def _fetch_page(db, conditions, params, sort, sort_col, order_dir, per_page, page, cursor):
+    """Fetch one page of test_cases rows ordered by (sort_col, id).
+
+    With a cursor the page is located by keyset (a range seek on the sort
+    index, independent of page depth); otherwise by LIMIT/OFFSET from `page`.
+    Returns (rows, next_cursor, prev_cursor); raises ValueError for a bad cursor.
+    """
+    scan_dir = order_dir
+    backward = False
+    offset = 0
+    segments = [(None, [])]
+    if cursor:
+        position = _decode_cursor(cursor, sort, order_dir)
+        backward = position['d'] == 'prev'
+        if backward:
+            scan_dir = 'ASC' if order_dir == 'DESC' else 'DESC'
+        segments = _keyset_segments(
+            sort, sort_col, position['v'], position['id'], '>' if scan_dir == 'ASC' else '<')
+    else:
+        offset = (page - 1) * per_page
+
+    order_by = f"tc.id {scan_dir}" if sort == 'id' else f"{sort_col} {scan_dir}, tc.id {scan_dir}"
+    rows = []
+    for segment, segment_params in segments:
+        where = list(conditions) + ([segment] if segment else [])
+        where_clause = "WHERE " + " AND ".join(where) if where else ""
+        rows += db.execute(
+            f"SELECT tc.* FROM test_cases tc {where_clause} ORDER BY {order_by} LIMIT ? OFFSET ?",
+            list(params) + segment_params + [per_page + 1 - len(rows), offset]
+        ).fetchall()
+        if len(rows) > per_page:
+            break
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(cursor) or offset > 0
+
+    next_cursor = _encode_cursor(sort, order_dir, rows[-1], 'next') if rows and has_next else None
+    prev_cursor = _encode_cursor(sort, order_dir, rows[0], 'prev') if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
+
 
 @bp.route('/search', methods=['GET'])
 def search_cases():
-    """Search cases by ID or title."""
+    """Search cases by ID or title.
+
+    Title results are ordered by id. Pass the returned next_cursor/prev_cursor
+    as `cursor` to page by keyset; `page` is still accepted.
+    """
     q = request.args.get('q', '').strip()
     mode = request.args.get('mode', 'title')
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
+    cursor = request.args.get('cursor', '').strip()
 
     if not q:
         return jsonify({"success": True, "cases": [], "total": 0})
 
     db = get_db()
-    offset = (page - 1) * per_page
+    next_cursor = prev_cursor = None
 
     if mode == 'id':
         rows = db.execute(
-            "SELECT tc.*, (SELECT COUNT(*) FROM test_steps WHERE case_id = tc.id) as step_count "
+            "SELECT tc.* "
             "FROM test_cases tc WHERE tc.id = ?",
             (q,)
         ).fetchall()
         total = len(rows)
     else:
+        if len(q) >= FTS_MIN_CHARS:
+            condition = "tc.rowid IN (SELECT rowid FROM test_cases_fts WHERE test_cases_fts MATCH ?)"
+            param = _fts_phrase(q)
+        else:
+            condition = "tc.title LIKE ?"
+            param = f"%{q}%"
         count_row = db.execute(
-            "SELECT COUNT(*) as cnt FROM test_cases WHERE title LIKE ?",
-            (f"%{q}%",)
+            f"SELECT COUNT(*) as cnt FROM test_cases tc WHERE {condition}",
+            (param,)
         ).fetchone()
         total = count_row['cnt']
-        rows = db.execute(
-            "SELECT tc.*, (SELECT COUNT(*) FROM test_steps WHERE case_id = tc.id) as step_count "
-            "FROM test_cases tc WHERE tc.title LIKE ? ORDER BY tc.id LIMIT ? OFFSET ?",
-            (f"%{q}%", per_page, offset)
-        ).fetchall()
+        try:
+            rows, next_cursor, prev_cursor = _fetch_page(
+                db, [condition], [param], 'id', 'tc.id', 'ASC', per_page, page, cursor)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
 
     cases = []
     for row in rows:
@@ -58,10 +171,73 @@ def search_cases():
             "step_count": row['step_count'],
         })
 
-    return jsonify({
+    result = {
         "success": True,
         "cases": cases,
         "total": total,
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    }
+    if not cursor:
+        result["page"] = page
+    return jsonify(result)
+
+
+@bp.route('/search-steps', methods=['GET'])
+def search_steps():
+    """Search step operation text, best matches first."""
+    q = request.args.get('q', '').strip()
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 20))
+
+    if not q:
+        return jsonify({"success": True, "steps": [], "total": 0})
+
+    db = get_db()
+    offset = (page - 1) * per_page
+
+    if len(q) >= FTS_MIN_CHARS:
+        total = db.execute(
+            "SELECT COUNT(*) as cnt FROM test_steps_fts WHERE test_steps_fts MATCH ?",
+            (_fts_phrase(q),)
+        ).fetchone()['cnt']
+        rows = db.execute(
+            "SELECT ts.id, ts.case_id, ts.step_no, ts.operation, tc.title as case_title "
+            "FROM test_steps_fts f "
+            "JOIN test_steps ts ON ts.id = f.rowid "
+            "JOIN test_cases tc ON tc.id = ts.case_id "
+            "WHERE test_steps_fts MATCH ? ORDER BY f.rank LIMIT ? OFFSET ?",
+            (_fts_phrase(q), per_page, offset)
+        ).fetchall()
+    else:
+        total = db.execute(
+            "SELECT COUNT(*) as cnt FROM test_steps WHERE operation LIKE ?",
+            (f"%{q}%",)
+        ).fetchone()['cnt']
+        # No relevance score without the index: shortest operations first
+        rows = db.execute(
+            "SELECT ts.id, ts.case_id, ts.step_no, ts.operation, tc.title as case_title "
+            "FROM test_steps ts JOIN test_cases tc ON tc.id = ts.case_id "
+            "WHERE ts.operation LIKE ? ORDER BY length(ts.operation), ts.id LIMIT ? OFFSET ?",
+            (f"%{q}%", per_page, offset)
+        ).fetchall()
+
+    steps = [
+        {
+            "step_id": r['id'],
+            "case_id": r['case_id'],
+            "case_title": r['case_title'],
+            "step_no": r['step_no'],
+            "operation": r['operation'],
+        }
+        for r in rows
+    ]
+
+    return jsonify({
+        "success": True,
+        "steps": steps,
+        "total": total,
         "page": page,
         "per_page": per_page,
     })
@@ -69,21 +245,44 @@ def search_cases():
 
 @bp.route('/browse', methods=['GET'])
 def browse_cases():
-    """Browse all cases with pagination, sorting, and filtering."""
+    """Browse all cases with pagination, sorting, and filtering.
+
+    Pages by keyset when given the next_cursor/prev_cursor of a previous
+    response as `cursor` (ties in the sort column broken by id); `page` is
+    kept for jumping to a page number.
+    """
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     sort = request.args.get('sort', 'id')
     order = request.args.get('order', 'asc')
     source = request.args.get('source', '').strip()
     keyword = request.args.get('keyword', '').strip()
+    cursor = request.args.get('cursor', '').strip()
+    facet_keys = [k.strip() for k in request.args.get('facets', '').split(',') if k.strip()]
 
     db = get_db()
-    offset = (page - 1) * per_page
+
+    # Extra field filters: field=<key>:<value>, repeatable; values of one key are OR-ed
+    field_filters = {}
+    for item in request.args.getlist('field'):
+        key, sep, value = item.partition(':')
+        if not sep or not key.strip():
+            return jsonify({"success": False, "error": f"无效的字段筛选: {item}"}), 400
+        field_filters.setdefault(key.strip(), []).append(value)
+    if field_filters or facet_keys:
+        faceted = {r['key'] for r in db.execute(
+            "SELECT key FROM extra_field_keys WHERE scope = 'case' AND faceted = 1"
+        ).fetchall()}
+        not_faceted = [k for k in list(field_filters) + facet_keys if k not in faceted]
+        if not_faceted:
+            return jsonify({"success": False, "error": f"字段未启用筛选: {', '.join(not_faceted)}"}), 400
 
     # Validate sort column
-    allowed_sorts = {'id': 'tc.id', 'title': 'tc.title', 'step_count': 'step_count',
+    allowed_sorts = {'id': 'tc.id', 'title': 'tc.title', 'step_count': 'tc.step_count',
                      'source_file': 'tc.source_file', 'import_time': 'tc.import_time'}
-    sort_col = allowed_sorts.get(sort, 'tc.id')
+    if sort not in allowed_sorts:
+        sort = 'id'
+    sort_col = allowed_sorts[sort]
     order_dir = 'DESC' if order.lower() == 'desc' else 'ASC'
 
     # Build WHERE clause
@@ -93,27 +292,34 @@ def browse_cases():
         conditions.append("tc.source_file = ?")
         params.append(source)
     if keyword:
-        conditions.append("tc.title LIKE ?")
-        params.append(f"%{keyword}%")
-
-    where_clause = ""
-    if conditions:
-        where_clause = "WHERE " + " AND ".join(conditions)
-
-    # Count total
-    count_sql = f"SELECT COUNT(*) as cnt FROM test_cases tc {where_clause}"
-    total = db.execute(count_sql, params).fetchone()['cnt']
+        if len(keyword) >= FTS_MIN_CHARS:
+            conditions.append("tc.rowid IN (SELECT rowid FROM test_cases_fts WHERE test_cases_fts MATCH ?)")
+            params.append(_fts_phrase(keyword))
+        else:
+            conditions.append("tc.title LIKE ?")
+            params.append(f"%{keyword}%")
+    base_conditions, base_params = list(conditions), list(params)
+    for key, values in field_filters.items():
+        condition, condition_params = _field_condition(key, values, correlated=bool(keyword))
+        conditions.append(condition)
+        params.extend(condition_params)
+
+    # Count total; without a keyword or field filter the per-source counters answer it
+    if keyword or field_filters:
+        count_sql = f"SELECT COUNT(*) as cnt FROM test_cases tc WHERE {' AND '.join(conditions)}"
+        total = db.execute(count_sql, params).fetchone()['cnt']
+    elif source:
+        row = db.execute("SELECT case_count FROM source_stats WHERE source_file = ?", (source,)).fetchone()
+        total = row['case_count'] if row else 0
+    else:
+        total = db.execute("SELECT COALESCE(SUM(case_count), 0) as cnt FROM source_stats").fetchone()['cnt']
 
     # Query data
-    query_sql = f"""
-        SELECT tc.*, (SELECT COUNT(*) FROM test_steps WHERE case_id = tc.id) as step_count
-        FROM test_cases tc
-        {where_clause}
-        ORDER BY {sort_col} {order_dir}
-        LIMIT ? OFFSET ?
-    """
-    query_params = params + [per_page, offset]
-    rows = db.execute(query_sql, query_params).fetchall()
+    try:
+        rows, next_cursor, prev_cursor = _fetch_page(
+            db, conditions, params, sort, sort_col, order_dir, per_page, page, cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
 
     cases = []
     for row in rows:
@@ -125,13 +331,66 @@ def browse_cases():
             "step_count": row['step_count'],
         })
 
-    return jsonify({
+    result = {
         "success": True,
         "cases": cases,
         "total": total,
-        "page": page,
         "per_page": per_page,
-    })
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    }
+    if not cursor:
+        result["page"] = page
+    if facet_keys:
+        result["facets"] = {
+            key: _facet_counts(db, key, base_conditions, base_params, field_filters, correlated=bool(keyword))
+            for key in facet_keys
+        }
+    return jsonify(result)
+
+
+def _field_condition(key, values, correlated=False):
+    """Restrict test_cases to those whose faceted field `key` has one of `values`.
+
+    The IN form reads the matching case ids straight off the primary key.
+    Next to the keyword's rowid IN list, though, SQLite would probe the
+    (source_file, id) index with every id x rowid pair, so with a keyword
+    the filter is a correlated EXISTS checked per candidate row instead.
+    """
+    placeholders = ','.join('?' * len(values))
+    if correlated:
+        return (f"EXISTS (SELECT 1 FROM case_field_values v WHERE v.key = ? AND v.value IN ({placeholders}) "
+                "AND v.case_id = tc.id)", [key] + list(values))
+    return (f"tc.id IN (SELECT case_id FROM case_field_values WHERE key = ? AND value IN ({placeholders}))",
+            [key] + list(values))
+
+
+def _facet_counts(db, key, conditions, params, field_filters, correlated=False, limit=50):
+    """Case counts per value of `key` under the other filters (a key's own filter is ignored,
+    so every value stays selectable)."""
+    conditions, params = list(conditions), list(params)
+    for other, values in field_filters.items():
+        if other != key:
+            condition, condition_params = _field_condition(other, values, correlated)
+            conditions.append(condition)
+            params.extend(condition_params)
+
+    if conditions:
+        # Filter the cases once, then count their values (a join would
+        # re-evaluate the case filters for every value row)
+        rows = db.execute(
+            "SELECT value, COUNT(*) as cnt FROM case_field_values "
+            f"WHERE key = ? AND case_id IN (SELECT tc.id FROM test_cases tc WHERE {' AND '.join(conditions)}) "
+            "GROUP BY value ORDER BY cnt DESC, value LIMIT ?",
+            [key] + params + [limit]
+        ).fetchall()
+    else:
+        rows = db.execute(
+            "SELECT value, COUNT(*) as cnt FROM case_field_values WHERE key = ? "
+            "GROUP BY value ORDER BY cnt DESC, value LIMIT ?",
+            (key, limit)
+        ).fetchall()
+    return [{"value": r['value'], "count": r['cnt']} for r in rows]
 
 
 @bp.route('/<path:case_id>', methods=['GET'])
@@ -151,9 +410,7 @@ def case_detail(case_id):
             pass
 
     # Get current active history_id for cluster results
-    current_history = db.execute(
-        "SELECT id FROM cluster_history WHERE is_current = 1 ORDER BY id DESC LIMIT 1"
-    ).fetchone()
+    current_history = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'])
     history_id = current_history['id'] if current_history else None
 
     if history_id:
@@ -173,6 +430,10 @@ def case_detail(case_id):
             (case_id,)
         ).fetchall()
 
+    # Siblings for every clustered step come from one sample lookup per case
+    samples = ClusterStore.get_cluster_samples(db, history_id, {sr['cluster_id'] for sr in step_rows},
+                                               current_app.config['DATABASE_PATH'])
+
     steps = []
     for sr in step_rows:
         step_extra = {}
@@ -184,35 +445,7 @@ def case_detail(case_id):
 
         siblings = []
         if sr['cluster_id'] is not None and sr['cluster_id'] >= 0:
-            if history_id:
-                sib_rows = db.execute(
-                    "SELECT ts.case_id, tc.title as case_title, ts.step_no, ts.operation "
-                    "FROM cluster_results cr "
-                    "JOIN test_steps ts ON cr.step_id = ts.id "
-                    "JOIN test_cases tc ON ts.case_id = tc.id "
-                    "WHERE cr.cluster_id = ? AND cr.step_id != ? AND cr.history_id = ? "
-                    "LIMIT 10",
-                    (sr['cluster_id'], sr['id'], history_id)
-                ).fetchall()
-            else:
-                sib_rows = db.execute(
-                    "SELECT ts.case_id, tc.title as case_title, ts.step_no, ts.operation "
-                    "FROM cluster_results cr "
-                    "JOIN test_steps ts ON cr.step_id = ts.id "
-                    "JOIN test_cases tc ON ts.case_id = tc.id "
-                    "WHERE cr.cluster_id = ? AND cr.step_id != ? "
-                    "LIMIT 10",
-                    (sr['cluster_id'], sr['id'])
-                ).fetchall()
-            siblings = [
-                {
-                    "case_id": s['case_id'],
-                    "case_title": s['case_title'],
-                    "step_no": s['step_no'],
-                    "operation": s['operation'],
-                }
-                for s in sib_rows
-            ]
+            siblings = ClusterStore.siblings_from_samples(samples[sr['cluster_id']], sr['id'])
 
         steps.append({
             "id": sr['id'],
@@ -239,39 +472,58 @@ def case_detail(case_id):
 
 @bp.route('/columns', methods=['GET'])
 def available_columns():
-    """Return all extra_fields keys found across cases and steps."""
+    """Return all extra_fields keys found across cases and steps, and the faceted case keys."""
     db = get_db()
-
-    case_keys = set()
-    step_keys = set()
-
-    case_rows = db.execute(
-        "SELECT DISTINCT extra_fields FROM test_cases WHERE extra_fields IS NOT NULL AND extra_fields != '{}'"
+    rows = db.execute(
+        "SELECT scope, key, faceted FROM extra_field_keys WHERE row_count > 0 ORDER BY key"
     ).fetchall()
-    for row in case_rows:
-        try:
-            d = json.loads(row['extra_fields'])
-            case_keys.update(d.keys())
-        except (json.JSONDecodeError, TypeError):
-            pass
-
-    step_rows = db.execute(
-        "SELECT DISTINCT extra_fields FROM test_steps WHERE extra_fields IS NOT NULL AND extra_fields != '{}'"
-    ).fetchall()
-    for row in step_rows:
-        try:
-            d = json.loads(row['extra_fields'])
-            step_keys.update(d.keys())
-        except (json.JSONDecodeError, TypeError):
-            pass
 
     return jsonify({
         "success": True,
-        "case_columns": sorted(case_keys),
-        "step_columns": sorted(step_keys),
+        "case_columns": [r['key'] for r in rows if r['scope'] == 'case'],
+        "step_columns": [r['key'] for r in rows if r['scope'] == 'step'],
+        "facet_columns": [r['key'] for r in rows if r['scope'] == 'case' and r['faceted']],
     })
 
 
+@bp.route('/facets', methods=['POST'])
+def set_facet():
+    """Enable or disable filtering and facet counts on a case extra field.
+
+    Enabling copies the key's values into case_field_values; from then on the
+    import triggers keep it current. Disabling drops them.
+    """
+    data = request.get_json(silent=True) or {}
+    key = (data.get('key') or '').strip()
+    enabled = bool(data.get('enabled', True))
+
+    db = get_db()
+    row = db.execute(
+        "SELECT faceted FROM extra_field_keys WHERE scope = 'case' AND key = ?", (key,)
+    ).fetchone()
+    if not row:
+        return jsonify({"success": False, "error": f"未找到用例字段: {key}"}), 404
+
+    db.execute("DELETE FROM case_field_values WHERE key = ?", (key,))
+    if enabled:
+        db.execute(
+            "INSERT OR IGNORE INTO case_field_values (key, value, case_id) "
+            "SELECT j.key, j.value, tc.id FROM test_cases tc, "
+            "json_each(CASE WHEN json_valid(tc.extra_fields) THEN tc.extra_fields ELSE '{}' END) j "
+            "WHERE j.key = ?",
+            (key,)
+        )
+    db.execute(
+        "UPDATE extra_field_keys SET faceted = ? WHERE scope = 'case' AND key = ?",
+        (1 if enabled else 0, key)
+    )
+    db.commit()
+
+    values = db.execute("SELECT COUNT(*) as cnt FROM case_field_values WHERE key = ?", (key,)).fetchone()['cnt']
+    logger.info("Facet %s %s (%d values)", key, "enabled" if enabled else "disabled", values)
+    return jsonify({"success": True, "key": key, "enabled": enabled, "value_count": values})
+
+
 # ---- Delete endpoints ----
 
 @bp.route('/<path:case_id>', methods=['DELETE'])
@@ -283,21 +535,10 @@ def delete_case(case_id):
     if not case:
         return jsonify({"success": False, "error": "用例未找到"}), 404
 
-    # Get step IDs for cascade cleanup
-    step_ids = [r['id'] for r in db.execute("SELECT id FROM test_steps WHERE case_id = ?", (case_id,)).fetchall()]
-
-    # Delete cluster results for these steps
-    if step_ids:
-        placeholders = ','.join('?' * len(step_ids))
-        db.execute(f"DELETE FROM cluster_results WHERE step_id IN ({placeholders})", step_ids)
-
-    # Delete steps and case (cascade should handle steps, but be explicit)
-    db.execute("DELETE FROM test_steps WHERE case_id = ?", (case_id,))
-    db.execute("DELETE FROM test_cases WHERE id = ?", (case_id,))
-    db.commit()
+    result = CaseStore.delete_cases(db, [case_id])
 
-    logger.info("Deleted case %s with %d steps", case_id, len(step_ids))
-    return jsonify({"success": True, "deleted_steps": len(step_ids)})
+    logger.info("Deleted case %s with %d steps", case_id, result['deleted_steps'])
+    return jsonify({"success": True, **result})
 
 
 @bp.route('/batch-delete', methods=['POST'])
@@ -309,21 +550,12 @@ def batch_delete_cases():
     if not case_ids:
         return jsonify({"success": False, "error": "未提供要删除的用例"}), 400
 
-    db = get_db()
-    total_steps = 0
-
-    for case_id in case_ids:
-        step_ids = [r['id'] for r in db.execute("SELECT id FROM test_steps WHERE case_id = ?", (case_id,)).fetchall()]
-        if step_ids:
-            placeholders = ','.join('?' * len(step_ids))
-            db.execute(f"DELETE FROM cluster_results WHERE step_id IN ({placeholders})", step_ids)
-        db.execute("DELETE FROM test_steps WHERE case_id = ?", (case_id,))
-        db.execute("DELETE FROM test_cases WHERE id = ?", (case_id,))
-        total_steps += len(step_ids)
+    result = CaseStore.delete_cases(get_db(), case_ids)
 
-    db.commit()
-    logger.info("Batch deleted %d cases with %d steps", len(case_ids), total_steps)
-    return jsonify({"success": True, "deleted_cases": len(case_ids), "deleted_steps": total_steps})
+    logger.info("Batch deleted %d cases with %d steps (%d cluster results, stale histories %s)",
+                result['deleted_cases'], result['deleted_steps'], result['deleted_results'],
+                result['stale_histories'])
+    return jsonify({"success": True, **result})
 
 
 @bp.route('/all', methods=['DELETE'])
@@ -331,12 +563,21 @@ def clear_all_data():
     """Clear all cases, steps, and cluster results."""
     db = get_db()
 
-    db.execute("DELETE FROM cluster_results")
+    deleted_results = db.execute("DELETE FROM cluster_results").rowcount
     db.execute("DELETE FROM cluster_info")
-    db.execute("DELETE FROM cluster_history")
-    db.execute("DELETE FROM test_steps")
-    db.execute("DELETE FROM test_cases")
+    deleted_histories = db.execute("DELETE FROM cluster_history").rowcount
+    deleted_steps = db.execute("DELETE FROM test_steps").rowcount
+    deleted_cases = db.execute("DELETE FROM test_cases").rowcount
+    bump_data_version(db)
     db.commit()
+    ClusterStore.invalidate_samples()
+    ClusterStore.invalidate_current_history()
 
     logger.info("Cleared all data from database")
-    return jsonify({"success": True})
+    return jsonify({
+        "success": True,
+        "deleted_cases": deleted_cases,
+        "deleted_steps": deleted_steps,
+        "deleted_results": deleted_results,
+        "deleted_histories": deleted_histories,
+    })
@@ -0,0 +1,122 @@
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request, current_app, make_response
+from app.config import Config
+from app.database import get_db, get_data_version
+from app.clustering.cluster_store import ClusterStore
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """LRU of serialized response bodies, bounded by their total size in bytes.
+
+    Keys carry the data version, so entries of an older version are never
+    served again and simply age out.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> body bytes, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def configure(self, max_bytes):
+        """Set the size limit, dropping least recently used entries beyond it."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+cache = ResponseCache(max_bytes=Config.RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+
+
+def init_response_cache(app):
+    """Size the response cache from the app config."""
+    cache.configure(app.config['RESPONSE_CACHE_MAX_MB'] * 1024 * 1024)
+
+
+def conditional_get(history_scoped=True):
+    """Serve a GET endpoint with a strong ETag and a cache of its serialized responses.
+
+    The ETag is the data version plus, for history_scoped endpoints, the
+    requested history_id or else the current history's id. It is known
+    before the view runs: a matching If-None-Match gets a 304 and a cached
+    body is served as is, without querying or serializing anything. Only
+    200 responses are cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            db = get_db()
+            version = get_data_version(db)
+            etag = str(version)
+            if history_scoped:
+                history_id = request.args.get('history_id', type=int)
+                if not history_id:
+                    current = ClusterStore.get_current_history(db, current_app.config['DATABASE_PATH'],
+                                                               data_version=version)
+                    history_id = current['id'] if current else 0
+                etag = f"{etag}-{history_id}"
+
+            if request.if_none_match.contains(etag):
+                cache.count_not_modified()
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.cache_control.no_cache = True
+                return response
+
+            # Same arguments in another order are the same response
+            query = tuple(sorted(request.args.items(multi=True)))
+            key = (current_app.config['DATABASE_PATH'], request.path, query, etag)
+            body = cache.get(key)
+            if body is not None:
+                response = Response(body, mimetype='application/json')
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                cache.put(key, response.get_data())
+            response.set_etag(etag)
+            # Browsers keep the body but revalidate it on every use
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -1,13 +1,23 @@
 import logging
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.database import get_db, get_setting, set_setting
+from app.clustering.resource_governor import available_cpus
 
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('settings_api', __name__, url_prefix='/api/settings')
 
-SETTING_KEYS = ['model_type', 'model_path', 'api_url', 'api_key', 'api_model_name']
+SETTING_KEYS = ['model_type', 'model_path', 'api_url', 'api_key', 'api_model_name', 'preload_model',
+                'tfidf_max_features', 'reduce_method', 'reduce_dim',
+                'embedding_precision', 'out_of_core', 'cpu_threads', 'cpu_reserve_cores', 'cpu_auto_tune']
+
+
+def _preload_enabled():
+    value = get_setting('preload_model', '')
+    if value == '':
+        return bool(current_app.config.get('PRELOAD_MODEL', False))
+    return value == '1'
 
 
 @bp.route('/', methods=['GET'])
@@ -18,7 +28,10 @@ def get_settings():
         settings[key] = get_setting(key, '')
     if not settings.get('model_type'):
         settings['model_type'] = 'builtin'
-    return jsonify({"success": True, "settings": settings})
+    settings['preload_model'] = _preload_enabled()
+    settings['out_of_core'] = settings['out_of_core'] == '1'
+    settings['cpu_auto_tune'] = settings['cpu_auto_tune'] == '1'
+    return jsonify({"success": True, "settings": settings, "cpu_count": available_cpus()})
 
 
 @bp.route('/', methods=['PUT'])
@@ -28,42 +41,56 @@ def update_settings():
 
     for key in SETTING_KEYS:
         if key in data:
-            set_setting(key, data[key])
+            value = data[key]
+            if key in ('preload_model', 'out_of_core', 'cpu_auto_tune'):
+                value = '1' if value in (True, '1', 'true') else '0'
+            set_setting(key, value)
 
-    # Release current model so it reloads with new config
-    from app.clustering.model_manager import ModelManager
-    ModelManager.release()
+    # Models are cached per config, so switching back to a previous model reuses it
+    from app.clustering.model_manager import build_model_config
+    from app.routes.cluster_routes import preload_model
+
+    if _preload_enabled():
+        settings = {key: get_setting(key, '') for key in SETTING_KEYS}
+        preload_model(build_model_config(settings, current_app.config['BUILTIN_MODEL_PATH']))
 
     logger.info("Settings updated: model_type=%s", data.get('model_type', ''))
     return jsonify({"success": True})
 
 
+@bp.route('/model-status', methods=['GET'])
+def model_status():
+    """Return readiness of the background model preload in the process clustering runs in."""
+    from app.routes.cluster_routes import model_status as clustering_model_status
+    status = clustering_model_status()
+    status['preload_enabled'] = _preload_enabled()
+    return jsonify({"success": True, **status})
+
+
+@bp.route('/db-status', methods=['GET'])
+def db_status():
+    """Return database connection pool and response cache statistics."""
+    from app.database import pool
+    from app.routes.response_cache import cache
+    return jsonify({"success": True, **pool.stats(), "response_cache": cache.stats()})
+
+
 @bp.route('/test-model', methods=['POST'])
 def test_model():
-    """Test model connection with a sample text."""
+    """Test model connection with a sample text, in the process clustering runs in."""
     data = request.get_json() or {}
 
     try:
-        from app.clustering.model_manager import ModelManager
-        from flask import current_app
-
-        model_config = {
-            "model_type": data.get("model_type", "builtin"),
-            "model_path": data.get("model_path", ""),
-            "api_url": data.get("api_url", ""),
-            "api_key": data.get("api_key", ""),
-            "api_model_name": data.get("api_model_name", ""),
-            "builtin_model_path": current_app.config['BUILTIN_MODEL_PATH'],
-        }
-
-        model = ModelManager.create_model(model_config)
-        result = model.encode(["This is a test sentence."])
-        dim = result.shape[1] if len(result.shape) > 1 else len(result[0])
+        from app.clustering.model_manager import build_model_config
+        from app.routes.cluster_routes import test_model as clustering_test_model
+
+        model_config = build_model_config(data, current_app.config['BUILTIN_MODEL_PATH'])
+        result = clustering_test_model(model_config)
 
         return jsonify({
             "success": True,
-            "dimension": int(dim),
-            "model_name": model.model_name,
+            "dimension": result["dimension"],
+            "model_name": result["model_name"],
         })
     except Exception as e:
         logger.error("Model test failed: %s", e, exc_info=True)
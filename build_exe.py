@@ -36,6 +36,7 @@ def main():
         "--add-data", f"app/templates{os.pathsep}app/templates",
         "--add-data", f"static{os.pathsep}static",
         "--hidden-import", "sentence_transformers",
+        "--hidden-import", "waitress",
         "--hidden-import", "sklearn",
         "--hidden-import", "sklearn.utils._cython_blas",
         "--hidden-import", "sklearn.neighbors._typedefs",
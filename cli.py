@@ -0,0 +1,192 @@
+"""Headless import -> cluster -> export pipeline for batch jobs.
+
+Runs the same importer, clustering engine and exporter as the web UI directly
+on a database, without starting the Flask app, the job queue or a worker process:
+
+    python cli.py nightly_suite.xlsx --threshold 0.8 --model tfidf --output-dir out/
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+# Ensure the project root is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import Config
+from app.database import connect, init_schema
+from app.importer.column_mapper import ColumnMapper
+from app.importer.xlsx_reader import XlsxReader
+from app.importer.data_validator import DataValidator
+from app.importer.case_store import CaseStore
+from app.clustering.cluster_store import ClusterStore
+from app.exporter.xlsx_exporter import XlsxExporter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FILES = (
+    ("聚类总览.xlsx", "export_overview"),
+    ("簇详情.xlsx", "export_cluster_details"),
+    ("用例聚类视图.xlsx", "export_case_cluster_view"),
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="测试用例步骤聚类：导入 xlsx、执行聚类并导出结果，无需启动 Web 服务")
+    parser.add_argument("inputs", nargs="*", metavar="XLSX",
+                        help="要导入的 xlsx 文件；不指定时直接对数据库中已有的用例聚类")
+    parser.add_argument("--db", default=Config.DATABASE_PATH,
+                        help="数据库文件路径 (默认与 Web 服务相同: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=Config.DEFAULT_SIMILARITY_THRESHOLD,
+                        help="相似度阈值 0.50~0.95 (默认 %(default)s)")
+    parser.add_argument("--model", choices=("builtin", "local", "api", "tfidf"),
+                        help="语义模型来源 (默认使用数据库中保存的设置)")
+    parser.add_argument("--model-path", help="--model local 时的本地模型目录")
+    parser.add_argument("--output-dir", help="导出聚类结果 xlsx 的目录；不指定则不导出")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="聚类线程数 (默认 0 = 使用全部 CPU)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出详细日志")
+    return parser.parse_args(argv)
+
+
+def import_file(db, filepath):
+    """Import one xlsx with auto-detected column mapping. Returns (cases, steps)."""
+    filename = os.path.basename(filepath)
+    mapping, unmatched = ColumnMapper(filepath).auto_detect()
+    if unmatched:
+        raise ValueError(f"{filename}: 无法识别必需列 {', '.join(unmatched)}")
+
+    result = DataValidator().validate(XlsxReader(filepath, mapping).read_all())
+    for warning in result.warnings:
+        print(f"  警告: {warning}")
+    if result.errors:
+        raise ValueError(f"{filename}: 数据校验失败\n  " + "\n  ".join(result.errors))
+
+    return CaseStore.save_cases(db, result.valid_cases, filename)
+
+
+class ProgressPrinter:
+    """Clustering progress callback that prints a line per phase and whole percent."""
+
+    def __init__(self):
+        self._last = None
+
+    def __call__(self, phase, phase_name, phase_index, phase_progress, overall_progress, detail):
+        key = (phase, int(overall_progress))
+        if key == self._last:
+            return
+        self._last = key
+        stage = f"[{phase_index}/5 {phase_name}] " if phase_name else ""
+        print(f"{stage}{int(overall_progress):3d}%  {detail}", flush=True)
+
+
+def run_clustering(db, args):
+    """Cluster every step in the database and save the result as the current history record."""
+    from app.clustering.cluster_engine import ClusterEngine
+    from app.clustering.model_manager import ModelManager, build_model_config
+    from app.clustering.resource_governor import ResourceGovernor
+
+    rows = db.execute("SELECT id, operation FROM test_steps ORDER BY id").fetchall()
+    if not rows:
+        raise ValueError("未找到测试步骤，请先导入数据。")
+    step_ids = [r['id'] for r in rows]
+    step_texts = [r['operation'] for r in rows]
+
+    settings = {r['key']: r['value'] for r in db.execute("SELECT key, value FROM settings").fetchall()}
+    if args.model:
+        settings["model_type"] = args.model
+    if args.model_path:
+        settings["model_path"] = args.model_path
+    model_config = build_model_config(settings, Config.BUILTIN_MODEL_PATH)
+
+    # TF-IDF vocabulary and memory-mapped embeddings live next to the database,
+    # as data/tfidf and data/embeddings do for the default data/testcase.db
+    data_dir = os.path.dirname(os.path.abspath(args.db))
+    ModelManager.configure(
+        max_models=1,
+        tfidf_state_dir=os.path.join(data_dir, "tfidf"),
+        tfidf_refit_drift=Config.TFIDF_REFIT_DRIFT,
+    )
+    # A batch job has the machine to itself: no cores reserved for request handling
+    governor = ResourceGovernor(threads=args.threads, reserve_cores=0)
+
+    start_time = time.time()
+    progress = ProgressPrinter()
+    with ModelManager.use_model(model_config) as model:
+        result = ClusterEngine().run(
+            step_ids, step_texts,
+            similarity_threshold=args.threshold,
+            model=model,
+            progress_callback=progress,
+            reduce_method=settings.get("reduce_method") or None,
+            reduce_dim=int(settings.get("reduce_dim") or 256),
+            precision=settings.get("embedding_precision") or "float32",
+            out_of_core_dir=os.path.join(data_dir, "embeddings") if settings.get("out_of_core") == "1" else None,
+            resource_governor=governor,
+        )
+
+    progress("saving", "结果保存", 5, 60, 96, "保存聚类结果...")
+    history_id = ClusterStore.save_results(
+        db, step_ids, result["labels"], result["cluster_labels"], args.threshold,
+        model_type=model_config["model_type"],
+        model_name=model.model_name,
+        elapsed_seconds=time.time() - start_time,
+        progress_callback=progress,
+    )
+    progress("saving", "结果保存", 5, 100, 100, "聚类完成")
+    return history_id, result
+
+
+def export_results(db, history_id, output_dir):
+    """Write the three result workbooks the web export zips up. Returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    exporter = XlsxExporter(db, history_id=history_id)
+    paths = []
+    for filename, method in EXPORT_FILES:
+        path = os.path.join(output_dir, filename)
+        with open(path, "wb") as f:
+            f.write(getattr(exporter, method)())
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    if args.threshold < 0.5 or args.threshold > 0.95:
+        print("错误: 相似度阈值必须在 0.50 ~ 0.95 之间", file=sys.stderr)
+        return 2
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    db = connect(args.db)
+    try:
+        init_schema(db)
+
+        for filepath in args.inputs:
+            cases, steps = import_file(db, filepath)
+            print(f"导入 {filepath}: {cases} 条用例, {steps} 个步骤", flush=True)
+
+        history_id, result = run_clustering(db, args)
+        print(f"聚类完成: {result['total_clusters']} 个簇, {result['noise_count']} 个未归类步骤, "
+              f"历史记录 #{history_id}", flush=True)
+
+        if args.output_dir:
+            for path in export_results(db, history_id, args.output_dir):
+                print(f"导出 {path}", flush=True)
+    except Exception as e:
+        logger.debug("Pipeline failed", exc_info=True)
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,105 @@
 import os
 import sys
+import time
+import socket
+import argparse
 import webbrowser
 import threading
 import logging
+import multiprocessing
 
 # Ensure the project root is on the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_app
+from app.factory import create_app
 from app.config import Config
 
 logger = logging.getLogger(__name__)
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="测试用例步骤聚类分析工具")
+    parser.add_argument("--headless", action="store_true",
+                        help="以服务方式运行：使用 waitress 多线程 WSGI 服务器，不打开浏览器")
+    parser.add_argument("--host", default=None,
+                        help=f"监听地址 (默认 {Config.SERVER_HOST}，团队共享时可用 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"监听端口 (默认 {Config.SERVER_PORT})")
+    parser.add_argument("--threads", type=int, default=None,
+                        help=f"waitress 工作线程数 (默认 {Config.SERVER_THREADS})")
+    parser.add_argument("--connection-limit", type=int, default=None,
+                        help=f"waitress 最大并发连接数 (默认 {Config.SERVER_CONNECTION_LIMIT})")
+    parser.add_argument("--no-browser", action="store_true",
+                        help="启动后不自动打开浏览器")
+    return parser.parse_args(argv)
+
+
+def open_browser_when_ready(host, port, url, timeout=15):
+    """Open the browser as soon as the server accepts connections."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1" if host == "0.0.0.0" else host, port), timeout=0.5).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    webbrowser.open(url)
+
+
+def serve(app, host, port, threads, connection_limit):
+    """Serve the app with waitress, a multi-threaded production WSGI server."""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.error("Headless mode requires waitress; install it with: pip install waitress")
+        sys.exit("无服务器模式需要 waitress，请执行: pip install waitress")
+
+    logger.info("Starting waitress at http://%s:%d (threads=%d, connection_limit=%d)",
+                host, port, threads, connection_limit)
+    waitress_serve(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        connection_limit=connection_limit,
+        ident="testcase_cluster_tool",
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
     os.makedirs(os.path.join(Config.BASE_DIR, "data"), exist_ok=True)
     os.makedirs(os.path.join(Config.BASE_DIR, "log"), exist_ok=True)
 
     app = create_app()
 
-    host = "127.0.0.1"
-    port = 5000
+    host = args.host or app.config["SERVER_HOST"]
+    port = args.port or app.config["SERVER_PORT"]
     url = f"http://{host}:{port}"
 
-    threading.Timer(1.5, lambda: webbrowser.open(url)).start()
+    if not (args.headless or args.no_browser):
+        threading.Thread(target=open_browser_when_ready, args=(host, port, url), daemon=True).start()
 
-    logger.info("Starting server at %s", url)
     print(f"Server running at {url}")
     print("Press Ctrl+C to stop.")
 
+    if args.headless:
+        threads = args.threads or app.config["SERVER_THREADS"]
+        # Open progress streams each hold a waitress thread; keep half for other requests
+        app.config["CLUSTER_EVENTS_MAX_STREAMS"] = max(1, min(app.config["CLUSTER_EVENTS_MAX_STREAMS"], threads // 2))
+        serve(
+            app, host, port,
+            threads=threads,
+            connection_limit=args.connection_limit or app.config["SERVER_CONNECTION_LIMIT"],
+        )
+        return
+
+    logger.info("Starting server at %s", url)
     app.run(host=host, port=port, debug=False)
 
 
 if __name__ == "__main__":
+    # Clustering jobs run in spawned worker processes; needed for the PyInstaller build
+    multiprocessing.freeze_support()
     main()
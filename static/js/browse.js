@@ -1,6 +1,8 @@
 let currentSort = 'id';
 let currentOrder = 'asc';
 let currentPage = 1;
+let facetKeys = [];
+let facetSelections = {};
 
 async function loadBrowseStats() {
     try {
@@ -34,6 +36,68 @@ async function loadSourceFilters() {
     }
 }
 
+async function loadFacetFields() {
+    try {
+        const data = await apiFetch('/api/cases/columns');
+        facetKeys = data.facet_columns || [];
+        const menu = document.getElementById('facet-field-options');
+        if (!data.case_columns || data.case_columns.length === 0) return;
+        menu.innerHTML = data.case_columns.map(key =>
+            `<div class="form-check">
+                <input class="form-check-input" type="checkbox" id="facet-opt-${key}" ${facetKeys.includes(key) ? 'checked' : ''}
+                       onchange="toggleFacetField('${key}', this.checked)">
+                <label class="form-check-label" for="facet-opt-${key}">${key}</label>
+            </div>`
+        ).join('');
+    } catch (e) {
+        // Ignore
+    }
+}
+
+async function toggleFacetField(key, enabled) {
+    try {
+        await apiFetch('/api/cases/facets', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ key, enabled })
+        });
+        if (!enabled) delete facetSelections[key];
+        await loadFacetFields();
+        loadBrowseData(1);
+    } catch (e) {
+        showAlert(e.message);
+    }
+}
+
+function selectFacet(key, value) {
+    if (value) {
+        facetSelections[key] = value;
+    } else {
+        delete facetSelections[key];
+    }
+    loadBrowseData(1);
+}
+
+function renderFacets(facets) {
+    const container = document.getElementById('facet-filters');
+    if (!facets || facetKeys.length === 0) {
+        container.classList.add('d-none');
+        return;
+    }
+    container.innerHTML = facetKeys.map(key => {
+        const options = (facets[key] || []).map(f =>
+            `<option value="${f.value}" ${facetSelections[key] === f.value ? 'selected' : ''}>${f.value} (${f.count})</option>`
+        ).join('');
+        return `<div class="col-auto">
+                <label class="form-label mb-0 me-1">${key}:</label>
+                <select class="form-select form-select-sm d-inline-block w-auto" onchange="selectFacet('${key}', this.value)">
+                    <option value="">全部</option>${options}
+                </select>
+            </div>`;
+    }).join('');
+    container.classList.remove('d-none');
+}
+
 function toggleSort(field) {
     if (currentSort === field) {
         currentOrder = currentOrder === 'asc' ? 'desc' : 'asc';
@@ -44,7 +108,8 @@ function toggleSort(field) {
     loadBrowseData(currentPage);
 }
 
-async function loadBrowseData(page) {
+// Previous/next move by keyset cursor; page numbers jump by offset
+async function loadBrowseData(page, cursor) {
     currentPage = page;
     const source = document.getElementById('filter-source').value;
     const keyword = document.getElementById('filter-keyword').value.trim();
@@ -56,6 +121,9 @@ async function loadBrowseData(page) {
     });
     if (source) params.set('source', source);
     if (keyword) params.set('keyword', keyword);
+    if (cursor) params.set('cursor', cursor);
+    if (facetKeys.length > 0) params.set('facets', facetKeys.join(','));
+    Object.entries(facetSelections).forEach(([key, value]) => params.append('field', `${key}:${value}`));
 
     try {
         const data = await apiFetch(`/api/cases/browse?${params}`);
@@ -64,6 +132,7 @@ async function loadBrowseData(page) {
         const emptyEl = document.getElementById('browse-empty');
         const tableEl = document.getElementById('browse-table');
         const pagination = document.getElementById('browse-pagination');
+        renderFacets(data.facets);
 
         if (!data.cases || data.cases.length === 0) {
             tbody.innerHTML = '';
@@ -103,7 +172,8 @@ async function loadBrowseData(page) {
         const btns = document.getElementById('browse-page-buttons');
         let paginationHtml = '';
         if (page > 1) {
-            paginationHtml += `<li class="page-item"><a class="page-link" href="javascript:loadBrowseData(${page - 1})">上一页</a></li>`;
+            const prev = data.prev_cursor ? `${page - 1}, '${data.prev_cursor}'` : `${page - 1}`;
+            paginationHtml += `<li class="page-item"><a class="page-link" href="javascript:loadBrowseData(${prev})">上一页</a></li>`;
         }
         const start = Math.max(1, page - 2);
         const end = Math.min(totalPages, page + 2);
@@ -112,7 +182,8 @@ async function loadBrowseData(page) {
                 <a class="page-link" href="javascript:loadBrowseData(${i})">${i}</a></li>`;
         }
         if (page < totalPages) {
-            paginationHtml += `<li class="page-item"><a class="page-link" href="javascript:loadBrowseData(${page + 1})">下一页</a></li>`;
+            const next = data.next_cursor ? `${page + 1}, '${data.next_cursor}'` : `${page + 1}`;
+            paginationHtml += `<li class="page-item"><a class="page-link" href="javascript:loadBrowseData(${next})">下一页</a></li>`;
         }
         btns.innerHTML = paginationHtml;
 
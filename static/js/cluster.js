@@ -1,4 +1,6 @@
 let clusterPollingTimer = null;
+let clusterEventSource = null;
+let clusterJobId = null;  // job whose progress is shown; null = latest
 
 async function loadModelInfo() {
     try {
@@ -32,11 +34,15 @@ async function loadClusterStatus() {
             el.innerHTML = `<span class="badge bg-success">聚类完成</span> ` +
                 `${data.result.total_clusters} 个簇, ${data.result.noise_count} 个独立步骤 ` +
                 `(阈值: ${data.result.threshold})`;
-        } else if (data.status === 'running') {
+        } else if (data.status === 'running' || data.status === 'queued') {
             el.innerHTML = '<span class="badge bg-warning text-dark">执行中...</span>';
-            startPolling();
+            clusterJobId = data.job_id;
+            document.getElementById('btn-cluster-cancel').classList.remove('d-none');
+            watchClusterJob();
         } else if (data.status === 'error') {
             el.innerHTML = `<span class="badge bg-danger">错误</span> ${data.error}`;
+        } else if (data.status === 'cancelled') {
+            el.innerHTML = '<span class="badge bg-secondary">已取消</span>';
         } else {
             const listData = await apiFetch('/api/cluster/list');
             if (listData.clusters && listData.clusters.length > 0) {
@@ -54,29 +60,85 @@ async function loadClusterStatus() {
 async function runClustering() {
     const threshold = parseFloat(document.getElementById('threshold-slider').value);
 
+    // Further runs can be queued while one is in progress; the button is only
+    // disabled while the request is in flight.
     document.getElementById('btn-cluster').disabled = true;
-    document.getElementById('cluster-progress').classList.remove('d-none');
-    document.getElementById('cluster-progress-text').textContent = '启动中...';
-    document.getElementById('cluster-progress-bar').style.width = '0%';
-    document.getElementById('cluster-progress-bar').textContent = '0%';
     hideAlert();
 
     try {
-        await apiFetch('/api/cluster/run', {
+        const data = await apiFetch('/api/cluster/run', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ similarity_threshold: threshold })
         });
-        startPolling();
+        clusterJobId = data.job_id;
+        document.getElementById('btn-cluster-cancel').classList.remove('d-none');
+        document.getElementById('btn-cluster-cancel').disabled = false;
+        document.getElementById('cluster-progress').classList.remove('d-none');
+        document.getElementById('cluster-phase-text').textContent = '';
+        document.getElementById('cluster-progress-text').textContent =
+            data.queue_position ? `排队中 (第 ${data.queue_position} 位)` : '启动中...';
+        document.getElementById('cluster-progress-bar').style.width = '0%';
+        document.getElementById('cluster-progress-bar').textContent = '0%';
+        watchClusterJob();
     } catch (e) {
         showAlert(e.message);
+    } finally {
         document.getElementById('btn-cluster').disabled = false;
-        document.getElementById('cluster-progress').classList.add('d-none');
     }
 }
 
-function startPolling() {
+async function cancelClustering() {
+    const btn = document.getElementById('btn-cluster-cancel');
+    btn.disabled = true;
+    try {
+        await apiFetch('/api/cluster/cancel', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ job_id: clusterJobId })
+        });
+        document.getElementById('cluster-progress-text').textContent = '正在取消...';
+    } catch (e) {
+        showAlert(e.message);
+        btn.disabled = false;
+    }
+}
+
+function finishClusteringUi(data) {
+    stopWatching();
+    clusterJobId = null;
+    document.getElementById('cluster-progress').classList.add('d-none');
+    document.getElementById('btn-cluster-cancel').classList.add('d-none');
+
+    // Follow the next queued job, if any
+    if (data && (data.queued_jobs > 0 || data.running_jobs > 0)) {
+        setTimeout(loadClusterStatus, 1000);
+    }
+}
+
+function stopWatching() {
+    if (clusterEventSource) clusterEventSource.close();
+    clusterEventSource = null;
     if (clusterPollingTimer) clearInterval(clusterPollingTimer);
+    clusterPollingTimer = null;
+}
+
+// Follow the tracked job: pushed progress events when the browser supports
+// EventSource, one-second polling of /api/cluster/status otherwise or if the
+// event stream fails.
+function watchClusterJob() {
+    stopWatching();
+    if (window.EventSource) {
+        const url = clusterJobId ? `/api/cluster/events?job_id=${clusterJobId}` : '/api/cluster/events';
+        clusterEventSource = new EventSource(url);
+        clusterEventSource.onmessage = (e) => handleClusterStatus(JSON.parse(e.data));
+        clusterEventSource.onerror = () => {
+            if (!clusterEventSource) return;
+            stopWatching();
+            clusterPollingTimer = setInterval(pollClusterStatus, 1000);
+        };
+        return;
+    }
     clusterPollingTimer = setInterval(pollClusterStatus, 1000);
 }
 
@@ -92,60 +154,77 @@ function formatElapsed(seconds) {
 
 async function pollClusterStatus() {
     try {
-        const data = await apiFetch('/api/cluster/status');
+        const url = clusterJobId ? `/api/cluster/status?job_id=${clusterJobId}` : '/api/cluster/status';
+        handleClusterStatus(await apiFetch(url));
+    } catch (e) {
+        // Network error, keep polling
+    }
+}
 
-        if (data.status === 'running') {
-            document.getElementById('cluster-progress').classList.remove('d-none');
+function handleClusterStatus(data) {
+    if (data.status === 'queued') {
+        document.getElementById('cluster-progress').classList.remove('d-none');
+        document.getElementById('cluster-phase-text').textContent = '';
+        document.getElementById('cluster-progress-text').textContent = `排队中 (第 ${data.queue_position} 位)`;
 
-            // Update phase text
-            const phaseText = document.getElementById('cluster-phase-text');
-            if (data.phase_name) {
-                phaseText.textContent = `${data.phase_name} (${data.phase_index || 0}/${data.total_phases || 5})`;
-            }
+    } else if (data.status === 'running') {
+        document.getElementById('cluster-progress').classList.remove('d-none');
 
-            // Update elapsed time
-            const elapsedEl = document.getElementById('cluster-elapsed');
-            if (data.elapsed_seconds !== undefined) {
-                elapsedEl.textContent = formatElapsed(data.elapsed_seconds);
-            }
+        // Update phase text
+        const phaseText = document.getElementById('cluster-phase-text');
+        if (data.phase_name) {
+            phaseText.textContent = `${data.phase_name} (${data.phase_index || 0}/${data.total_phases || 5})`;
+        }
 
-            // Update progress bar
-            const bar = document.getElementById('cluster-progress-bar');
-            const pct = data.overall_progress || 0;
-            bar.style.width = `${pct}%`;
-            bar.textContent = `${pct}%`;
+        // Update elapsed time
+        const elapsedEl = document.getElementById('cluster-elapsed');
+        if (data.elapsed_seconds !== undefined) {
+            elapsedEl.textContent = formatElapsed(data.elapsed_seconds);
+        }
 
-            // Update detail text
-            document.getElementById('cluster-progress-text').textContent = data.detail || data.progress || '处理中...';
+        // Update progress bar
+        const bar = document.getElementById('cluster-progress-bar');
+        const pct = data.overall_progress || 0;
+        bar.style.width = `${pct}%`;
+        bar.textContent = `${pct}%`;
 
-        } else if (data.status === 'completed') {
-            clearInterval(clusterPollingTimer);
-            clusterPollingTimer = null;
-            document.getElementById('cluster-progress').classList.add('d-none');
-            document.getElementById('btn-cluster').disabled = false;
+        // Update detail text
+        document.getElementById('cluster-progress-text').textContent = data.detail || data.progress || '处理中...';
 
-            const r = data.result;
-            document.getElementById('cluster-status').innerHTML =
-                `<span class="badge bg-success">聚类完成</span> ` +
-                `${r.total_clusters} 个簇, ${r.noise_count} 个独立步骤 ` +
-                `(阈值: ${r.threshold})`;
+    } else if (data.status === 'completed') {
+        finishClusteringUi(data);
 
-            showAlert(`聚类完成: 共 ${r.total_clusters} 个簇`, 'success');
+        const r = data.result;
+        document.getElementById('cluster-status').innerHTML =
+            `<span class="badge bg-success">聚类完成</span> ` +
+            `${r.total_clusters} 个簇, ${r.noise_count} 个独立步骤 ` +
+            `(阈值: ${r.threshold})`;
 
-            // Reload results panel
-            if (typeof loadClusterResultsPanel === 'function') {
-                loadClusterResultsPanel();
-            }
+        let message = `聚类完成: 共 ${r.total_clusters} 个簇`;
+        if (r.reduction) {
+            const d = r.reduction;
+            message += ` (降维 ${d.from_dim}→${d.to_dim}, 保留方差 ${(d.variance_retained * 100).toFixed(1)}%` +
+                (d.cluster_agreement !== null ? `, 与全维度一致性 ARI ${d.cluster_agreement}` : '') + ')';
+        }
+        if (r.quantization) {
+            const q = r.quantization;
+            message += ` (${q.precision} 存储 ${q.float32_mb}MB→${q.stored_mb}MB, 最大相似度误差 ${q.max_abs_error}` +
+                (q.cluster_agreement !== null ? `, 与 float32 一致性 ARI ${q.cluster_agreement}` : '') + ')';
+        }
+        showAlert(message, 'success');
 
-        } else if (data.status === 'error') {
-            clearInterval(clusterPollingTimer);
-            clusterPollingTimer = null;
-            document.getElementById('cluster-progress').classList.add('d-none');
-            document.getElementById('btn-cluster').disabled = false;
-            showAlert(`聚类错误: ${data.error}`);
+        // Reload results panel
+        if (typeof loadClusterResultsPanel === 'function') {
+            loadClusterResultsPanel();
         }
-    } catch (e) {
-        // Network error, keep polling
+
+    } else if (data.status === 'error') {
+        finishClusteringUi(data);
+        showAlert(`聚类错误: ${data.error}`);
+    } else if (data.status === 'cancelled') {
+        finishClusteringUi(data);
+        document.getElementById('cluster-status').innerHTML = '<span class="badge bg-secondary">已取消</span>';
+        showAlert('聚类已取消', 'warning');
     }
 }
 
@@ -17,7 +17,8 @@ async function loadHistory() {
 
         tbody.innerHTML = data.records.map(r => {
             const elapsed = formatHistoryElapsed(r.elapsed_seconds);
-            const isCurrent = r.is_current ? '<span class="badge bg-success">当前</span>' : '';
+            const isCurrent = (r.is_current ? '<span class="badge bg-success">当前</span>' : '')
+                + (r.stale ? ' <span class="badge bg-warning text-dark" title="聚类后删除过用例，簇的步骤数与用例数统计已不准确">数据已变更</span>' : '');
             return `<tr>
                 <td><input type="checkbox" class="history-checkbox" value="${r.id}" onchange="updateCompareButton()"></td>
                 <td>${r.id}</td>
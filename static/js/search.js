@@ -82,6 +82,11 @@ async function searchCases() {
     if (!q) return;
 
     const mode = document.querySelector('input[name="search-mode"]:checked').value;
+    if (mode === 'step') {
+        searchSteps(q);
+        return;
+    }
+    document.getElementById('case-list-step-header').textContent = '步骤数';
 
     try {
         const data = await apiFetch(`/api/cases/search?q=${encodeURIComponent(q)}&mode=${mode}`);
@@ -123,6 +128,40 @@ async function searchCases() {
     }
 }
 
+async function searchSteps(q) {
+    try {
+        const data = await apiFetch(`/api/cases/search-steps?q=${encodeURIComponent(q)}&per_page=50`);
+
+        document.getElementById('search-results').classList.remove('d-none');
+        document.getElementById('case-detail-section').classList.add('d-none');
+        document.getElementById('case-list-section').classList.remove('d-none');
+        document.getElementById('case-list-step-header').textContent = '匹配步骤';
+        document.getElementById('result-count').textContent = data.total;
+
+        const tbody = document.getElementById('case-list-body');
+        if (data.steps.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="5" class="text-center text-muted">未找到匹配结果</td></tr>';
+            return;
+        }
+
+        // Best matches first; a case may appear once per matching step
+        tbody.innerHTML = data.steps.map(s =>
+            `<tr>
+                <td><input type="checkbox" class="case-select-check" value="${s.case_id}" onchange="updateBatchDeleteButton()"></td>
+                <td><code>${s.case_id}</code></td>
+                <td>${s.case_title}</td>
+                <td><span class="badge bg-secondary me-1">${s.step_no}</span>${s.operation}</td>
+                <td>
+                    <button class="btn btn-sm btn-outline-primary" onclick="loadCaseDetail('${s.case_id}')">查看</button>
+                </td>
+            </tr>`
+        ).join('');
+        document.getElementById('btn-batch-delete').classList.remove('d-none');
+    } catch (e) {
+        showAlert(e.message);
+    }
+}
+
 async function loadCaseDetail(caseId) {
     try {
         const data = await apiFetch(`/api/cases/${encodeURIComponent(caseId)}`);
@@ -2,6 +2,7 @@ function toggleModelFields() {
     const modelType = document.querySelector('input[name="model_type"]:checked').value;
     document.getElementById('local-fields').classList.toggle('d-none', modelType !== 'local');
     document.getElementById('api-fields').classList.toggle('d-none', modelType !== 'api');
+    document.getElementById('tfidf-fields').classList.toggle('d-none', modelType !== 'tfidf');
 }
 
 async function loadSettings() {
@@ -17,8 +18,19 @@ async function loadSettings() {
         document.getElementById('api-url').value = s.api_url || '';
         document.getElementById('api-key').value = s.api_key || '';
         document.getElementById('api-model-name').value = s.api_model_name || '';
+        document.getElementById('tfidf-max-features').value = s.tfidf_max_features || '';
+        document.getElementById('reduce-method').value = s.reduce_method || '';
+        document.getElementById('reduce-dim').value = s.reduce_dim || '';
+        document.getElementById('embedding-precision').value = s.embedding_precision || 'float32';
+        document.getElementById('out-of-core').checked = !!s.out_of_core;
+        document.getElementById('cpu-threads').value = s.cpu_threads || '';
+        document.getElementById('cpu-reserve-cores').value = s.cpu_reserve_cores || '';
+        document.getElementById('cpu-auto-tune').checked = !!s.cpu_auto_tune;
+        document.getElementById('cpu-count').textContent = data.cpu_count || '-';
+        document.getElementById('preload-model').checked = !!s.preload_model;
 
         toggleModelFields();
+        loadModelStatus();
     } catch (e) {
         showAlert('加载设置失败: ' + e.message);
     }
@@ -32,6 +44,15 @@ async function saveSettings() {
         api_url: document.getElementById('api-url').value,
         api_key: document.getElementById('api-key').value,
         api_model_name: document.getElementById('api-model-name').value,
+        tfidf_max_features: document.getElementById('tfidf-max-features').value,
+        reduce_method: document.getElementById('reduce-method').value,
+        reduce_dim: document.getElementById('reduce-dim').value,
+        embedding_precision: document.getElementById('embedding-precision').value,
+        out_of_core: document.getElementById('out-of-core').checked,
+        cpu_threads: document.getElementById('cpu-threads').value,
+        cpu_reserve_cores: document.getElementById('cpu-reserve-cores').value,
+        cpu_auto_tune: document.getElementById('cpu-auto-tune').checked,
+        preload_model: document.getElementById('preload-model').checked,
     };
 
     try {
@@ -41,6 +62,7 @@ async function saveSettings() {
             body: JSON.stringify(settings)
         });
         showAlert('设置保存成功', 'success');
+        loadModelStatus();
     } catch (e) {
         showAlert('保存设置失败: ' + e.message);
     }
@@ -54,6 +76,7 @@ async function testModel() {
         api_url: document.getElementById('api-url').value,
         api_key: document.getElementById('api-key').value,
         api_model_name: document.getElementById('api-model-name').value,
+        tfidf_max_features: document.getElementById('tfidf-max-features').value,
     };
 
     const resultEl = document.getElementById('test-result');
@@ -74,3 +97,30 @@ async function testModel() {
         resultEl.className = 'mt-3 alert alert-danger';
     }
 }
+
+let modelStatusTimer = null;
+
+async function loadModelStatus() {
+    const el = document.getElementById('model-status');
+    try {
+        const data = await apiFetch('/api/settings/model-status');
+        if (data.status === 'loading') {
+            el.textContent = '加载中...';
+            el.className = 'badge bg-warning text-dark';
+        } else if (data.status === 'ready') {
+            el.textContent = `已就绪 (${data.model_name}, ${data.load_seconds}秒)`;
+            el.className = 'badge bg-success';
+        } else if (data.status === 'error') {
+            el.textContent = `加载失败: ${data.error}`;
+            el.className = 'badge bg-danger';
+        } else {
+            el.textContent = '未加载';
+            el.className = 'badge bg-secondary';
+        }
+
+        if (modelStatusTimer) clearTimeout(modelStatusTimer);
+        modelStatusTimer = data.status === 'loading' ? setTimeout(loadModelStatus, 2000) : null;
+    } catch (e) {
+        el.textContent = '-';
+    }
+}
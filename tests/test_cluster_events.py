@@ -0,0 +1,90 @@
+"""Open /api/cluster/events streams must not starve other requests of server threads."""
+import os
+import sys
+import http.client
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.factory import create_app
+
+waitress_server = pytest.importorskip("waitress.server")
+
+SERVER_THREADS = 3
+MAX_STREAMS = 2
+
+
+@pytest.fixture
+def server(tmp_path):
+    app = create_app({
+        'DATABASE_PATH': str(tmp_path / "data" / "test.db"),
+        'CHECKPOINT_DIR': str(tmp_path / "checkpoints"),
+        'TFIDF_STATE_DIR': str(tmp_path / "tfidf"),
+        'EMBEDDING_STORE_DIR': str(tmp_path / "embeddings"),
+        'LOG_DIR': str(tmp_path / "log"),
+        'CLUSTER_WORKER_PROCESS': False,
+        'CLUSTER_EVENTS_MAX_STREAMS': MAX_STREAMS,
+        'CLUSTER_EVENTS_KEEPALIVE': 0.2,
+        'TESTING': True,
+    })
+    srv = waitress_server.create_server(app, host="127.0.0.1", port=0, threads=SERVER_THREADS)
+    stop = threading.Event()
+
+    def serve():
+        # srv.run() without end; poll a stop flag so the sockets close in this thread
+        while not stop.is_set():
+            srv.asyncore.loop(timeout=0.05, map=srv._map, count=1)
+        srv.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield srv.effective_port
+    # Let streams notice their closed connections and end before the loop stops
+    srv.task_dispatcher.shutdown(timeout=10)
+    stop.set()
+    thread.join(timeout=10)
+
+
+def open_stream(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", "/api/cluster/events")
+    return conn, conn.getresponse()
+
+
+def test_requests_succeed_while_streams_are_open(server):
+    streams = [open_stream(server) for _ in range(MAX_STREAMS)]
+    for _, response in streams:
+        assert response.status == 200
+        assert response.readline().startswith(b"data: ")
+
+    # Past the limit a stream is refused with the URL to poll instead
+    conn, response = open_stream(server)
+    assert response.status == 503
+    assert b"/api/cluster/status" in response.read()
+    conn.close()
+
+    # A waitress thread is still free for ordinary requests
+    conn = http.client.HTTPConnection("127.0.0.1", server, timeout=5)
+    conn.request("GET", "/api/import/status")
+    response = conn.getresponse()
+    assert response.status == 200
+    assert b'"success":true' in response.read().replace(b" ", b"")
+    conn.close()
+
+    # Closing a stream frees its slot once the server notices the disconnect
+    streams.pop()[0].close()
+    deadline = time.time() + 10
+    while True:
+        conn, response = open_stream(server)
+        status = response.status
+        conn.close()
+        if status == 200 or time.time() > deadline:
+            break
+        time.sleep(0.2)
+    assert status == 200
+
+    for conn, _ in streams:
+        conn.close()
@@ -0,0 +1,155 @@
+"""Endpoint queries must seek the history-scoped composite indexes, not scan their tables.
+
+Each test calls an endpoint, records the statements it runs (with their
+bound values) through the connection's trace callback, and checks
+EXPLAIN QUERY PLAN of the ones that read the table under test.
+"""
+import os
+import sys
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import database
+from app.database import connect, init_schema
+from app.factory import create_app
+
+CASES = 40
+STEPS_PER_CASE = 4
+CLUSTERS = 8
+
+
+def populate(db):
+    """Cases with steps and two clustering histories over them, the second current."""
+    for c in range(CASES):
+        case_id = f"TC{c:04d}"
+        db.execute("INSERT INTO test_cases (id, title, source_file, import_time) VALUES (?, ?, ?, ?)",
+                   (case_id, f"用例 {c}", f"suite{c % 3}.xlsx", f"2026-01-01T00:00:{c % 60:02d}"))
+        for n in range(1, STEPS_PER_CASE + 1):
+            db.execute("INSERT INTO test_steps (case_id, step_no, operation) VALUES (?, ?, ?)",
+                       (case_id, n, f"操作步骤 {c}-{n}"))
+    step_ids = [r[0] for r in db.execute("SELECT id FROM test_steps ORDER BY id")]
+    for history_id, current in ((1, 0), (2, 1)):
+        db.execute("INSERT INTO cluster_history (id, run_time, model_type, total_steps, total_clusters, "
+                   "noise_count, is_current) VALUES (?, '2026-01-01T00:00:00', 'tfidf', ?, ?, 0, ?)",
+                   (history_id, len(step_ids), CLUSTERS, current))
+        for cluster_id in range(CLUSTERS):
+            members = step_ids[cluster_id::CLUSTERS]
+            db.execute("INSERT INTO cluster_info (cluster_id, label, step_count, case_count, threshold, history_id) "
+                       "VALUES (?, ?, ?, ?, 0.8, ?)",
+                       (cluster_id, f"簇 {cluster_id}", len(members), len(members), history_id))
+            db.executemany("INSERT INTO cluster_results (step_id, cluster_id, cluster_label, similarity_threshold, "
+                           "history_id) VALUES (?, ?, ?, 0.8, ?)",
+                           [(step_id, cluster_id, f"簇 {cluster_id}", history_id) for step_id in members])
+    db.commit()
+
+
+@pytest.fixture
+def endpoint(tmp_path, monkeypatch):
+    """endpoint(url) -> the statements it ran, its JSON in endpoint.last_json;
+    endpoint.plan(sql) -> EXPLAIN QUERY PLAN details."""
+    db_path = str(tmp_path / "data" / "test.db")
+    os.makedirs(os.path.dirname(db_path))
+    db = connect(db_path)
+    init_schema(db)
+    populate(db)
+    db.close()
+
+    app = create_app({
+        'DATABASE_PATH': db_path,
+        'CHECKPOINT_DIR': str(tmp_path / "checkpoints"),
+        'TFIDF_STATE_DIR': str(tmp_path / "tfidf"),
+        'EMBEDDING_STORE_DIR': str(tmp_path / "embeddings"),
+        'LOG_DIR': str(tmp_path / "log"),
+        'CLUSTER_WORKER_PROCESS': False,
+        'TESTING': True,
+    })
+    client = app.test_client()
+    statements = []
+    acquire = database.pool.acquire
+
+    def traced_acquire(path):
+        conn = acquire(path)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(database.pool, "acquire", traced_acquire)
+
+    def call(url):
+        statements.clear()
+        response = client.get(url)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        call.last_json = response.get_json()
+        return list(statements)
+
+    plan_db = sqlite3.connect(db_path)
+    call.plan = lambda sql: [row[3] for row in plan_db.execute("EXPLAIN QUERY PLAN " + sql)]
+    yield call
+    plan_db.close()
+    database.pool.close_all()
+
+
+def plans(endpoint, statements, marker):
+    """Query plans of the SELECTs containing marker; at least one must have run."""
+    selected = [s for s in statements if s.lstrip().upper().startswith(("SELECT", "WITH")) and marker in s]
+    assert selected, f"no statement containing {marker!r} ran: {statements}"
+    return [endpoint.plan(s) for s in selected]
+
+
+def scanned(plan):
+    """Tables (or their aliases) the plan reads by a full scan, in rowid or index order."""
+    return {detail.split()[1] for detail in plan if detail.startswith("SCAN ")}
+
+
+def test_cluster_list_seeks_history_size_index(endpoint):
+    for url in ("/api/cluster/list", "/api/cluster/list?history_id=1"):
+        for plan in plans(endpoint, endpoint(url), "FROM cluster_info"):
+            assert any("USING INDEX idx_cluster_info_history_size (history_id=?)" in d for d in plan), plan
+            assert not any("TEMP B-TREE" in d for d in plan), plan
+            assert "cluster_info" not in scanned(plan), plan
+
+
+def test_current_summary_reads_top_clusters_in_index_order(endpoint):
+    for plan in plans(endpoint, endpoint("/api/cluster/current-summary"), "FROM cluster_info"):
+        assert any("USING INDEX idx_cluster_info_history_size (history_id=?)" in d for d in plan), plan
+        assert not any("TEMP B-TREE" in d for d in plan), plan
+
+
+def test_cluster_detail_seeks_history_cluster_index(endpoint):
+    for plan in plans(endpoint, endpoint("/api/cluster/3"), "FROM cluster_results cr"):
+        assert any("cr USING COVERING INDEX idx_cluster_results_history_cluster (history_id=? AND cluster_id=?)"
+                   in d for d in plan), plan
+        assert not scanned(plan) & {"cr", "ts", "tc"}, plan
+
+
+def test_case_detail_seeks_case_step_and_history_step_indexes(endpoint):
+    statements = endpoint("/api/cases/TC0005")
+    for plan in plans(endpoint, statements, "FROM test_steps ts"):
+        assert any("ts USING INDEX idx_test_steps_case_step (case_id=?)" in d for d in plan), plan
+        assert any("cr USING COVERING INDEX idx_cluster_results_history_step (history_id=? AND step_id=?)"
+                   in d for d in plan), plan
+        assert not any("TEMP B-TREE" in d for d in plan), plan
+        assert not scanned(plan) & {"ts", "cr"}, plan
+
+
+def test_case_detail_siblings_seek_history_cluster_index(endpoint):
+    for plan in plans(endpoint, endpoint("/api/cases/TC0005"), "FROM wanted w"):
+        assert any("USING COVERING INDEX idx_cluster_results_history_cluster (history_id=? AND cluster_id=?"
+                   in d for d in plan), plan
+        assert not scanned(plan) & {"cr", "last", "ts", "tc"}, plan
+
+
+def test_step_count_sort_reads_sort_index(endpoint):
+    url = "/api/cases/browse?sort=step_count&order=desc&per_page=5"
+    statements = endpoint(url)
+    for plan in plans(endpoint, statements, "ORDER BY tc.step_count"):
+        assert any("tc USING INDEX idx_test_cases_step_count" in d for d in plan), plan
+        assert not any("TEMP B-TREE" in d for d in plan), plan
+
+    # The next page seeks past the cursor in the same index
+    statements = endpoint(url + "&cursor=" + endpoint.last_json["next_cursor"])
+    for plan in plans(endpoint, statements, "ORDER BY tc.step_count"):
+        assert any("SEARCH tc USING INDEX idx_test_cases_step_count" in d for d in plan), plan
+        assert not any("TEMP B-TREE" in d for d in plan), plan
@@ -0,0 +1,53 @@
+"""Starting the web app must not import the heavy libraries only imports, exports and clustering use."""
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("numpy", "sklearn", "openpyxl", "requests")
+
+# Run in a fresh interpreter: modules imported by other tests would hide a regression here
+SCRIPT = textwrap.dedent("""
+    import os
+    import sys
+    import tempfile
+
+    sys.path.insert(0, {root!r})
+    heavy = {heavy!r}
+
+    def loaded():
+        return ",".join(m for m in heavy if m in sys.modules)
+
+    from app.factory import create_app
+    print("import:" + loaded())
+
+    tmp = tempfile.mkdtemp()
+    app = create_app({{
+        'DATABASE_PATH': os.path.join(tmp, 'data', 'test.db'),
+        'CHECKPOINT_DIR': os.path.join(tmp, 'checkpoints'),
+        'TFIDF_STATE_DIR': os.path.join(tmp, 'tfidf'),
+        'EMBEDDING_STORE_DIR': os.path.join(tmp, 'embeddings'),
+        'LOG_DIR': os.path.join(tmp, 'log'),
+        'CLUSTER_WORKER_PROCESS': False,
+        'TESTING': True,
+    }})
+    print("create_app:" + loaded())
+
+    assert app.test_client().get('/').status_code == 200
+    print("first page:" + loaded())
+""")
+
+
+def test_startup_does_not_import_heavy_modules():
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(root=ROOT, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    expected = ("import", "create_app", "first page")
+    stages = dict(line.split(":", 1) for line in result.stdout.splitlines() if line.split(":", 1)[0] in expected)
+    assert set(stages) == set(expected), result.stdout
+    for stage, modules in stages.items():
+        assert modules == "", f"{modules} imported by {stage}"